@@ -0,0 +1,78 @@
+"""
+Compare checking basic auth credentials by decoding the header, with comparing
+against the expected credentials, encoded ahead of time.
+"""
+
+import binascii
+from base64 import b64decode, b64encode
+from functools import partial
+
+from .utils import setup_django, timeit
+
+ITERATIONS = 200_000
+
+
+def main() -> None:
+    with setup_django():
+        from django.http import HttpRequest
+        from django.test import RequestFactory
+        from django.utils.crypto import constant_time_compare
+
+        from macau.redirects.utils import check_basic_auth_token, get_basic_auth_token
+
+        def decode_and_compare(
+            request: HttpRequest, username: str, password: str
+        ) -> bool:
+            # How credentials used to be checked
+            for authentication in request.headers.get("Authorization", "").split(","):
+                authentication_tuple = authentication.split(" ", 1)
+                if len(authentication_tuple) != 2:
+                    continue
+                if "basic" != authentication_tuple[0].lower():
+                    continue
+                try:
+                    provided_credentials = b64decode(
+                        authentication_tuple[1].strip()
+                    ).split(b":", 1)
+                except (UnicodeDecodeError, binascii.Error):
+                    continue
+                if len(provided_credentials) != 2:
+                    continue
+                username_valid = constant_time_compare(
+                    provided_credentials[0], username
+                )
+                password_valid = constant_time_compare(
+                    provided_credentials[1], password
+                )
+                if username_valid and password_valid:
+                    return True
+            return False
+
+        factory = RequestFactory()
+        credentials = b64encode(b"username:password").decode()
+        wrong_credentials = b64encode(b"username:wrong").decode()
+        token = get_basic_auth_token("username", "password")
+
+        headers = {
+            "Single credential": f"Basic {credentials}",
+            "Multiple credentials": f"Basic {wrong_credentials}, Basic {credentials}",
+            "Wrong credentials": f"Basic {wrong_credentials}",
+        }
+
+        for name, header in headers.items():
+            request = factory.get("/", headers={"Authorization": header})
+            print(f"{name}:")  # noqa: T201
+            timeit(
+                "  Decode and compare",
+                partial(decode_and_compare, request, "username", "password"),
+                ITERATIONS,
+            )
+            timeit(
+                "  Precomputed token",
+                partial(check_basic_auth_token, request, token),
+                ITERATIONS,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Compare redirect throughput with and without persistent database connections.
+
+The redirect cache is disabled, so every request queries the database.
+"""
+
+from .utils import call_wsgi, setup_django, timeit
+
+ITERATIONS = 5000
+
+
+def main() -> None:
+    with setup_django(REDIRECT_CACHE_SIZE="0", REDIRECT_SLUG_FILTER="false"):
+        from django.core.wsgi import get_wsgi_application
+        from django.db import connection
+
+        from macau.redirects.models import Redirect
+
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        connection.close()
+
+        application = get_wsgi_application()
+
+        for conn_max_age in [0, 600]:
+            connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+            connection.close()
+
+            timeit(
+                f"CONN_MAX_AGE={conn_max_age}",
+                lambda: call_wsgi(application, "/test"),
+                ITERATIONS,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Compare matching a path against prefix redirects with a trie, with checking
+each prefix in turn, as the number of prefixes grows.
+"""
+
+from functools import partial
+
+from .utils import setup_django, timeit
+
+ITERATIONS = 20000
+
+
+def main() -> None:
+    with setup_django():
+        from macau.redirects.prefixes import PrefixTrie
+
+        def linear_match(prefixes: list[str], path: str) -> str | None:
+            for prefix in prefixes:
+                if path.startswith(prefix.removesuffix("*")):
+                    return prefix
+            return None
+
+        path = "docs/guide/getting-started/install"
+
+        for count in [10, 1000, 100_000]:
+            prefixes = [f"section-{i}/*" for i in range(count)] + ["docs/*"]
+            trie: PrefixTrie[str] = PrefixTrie()
+            for prefix in prefixes:
+                trie.add(prefix, prefix)
+
+            print(f"{count:,} prefixes:")  # noqa: T201
+            iterations = max(ITERATIONS // count, 10)
+            timeit("  Linear", partial(linear_match, prefixes, path), iterations)
+            timeit("  Trie", partial(trie.match, path), ITERATIONS)
+
+
+if __name__ == "__main__":
+    main()
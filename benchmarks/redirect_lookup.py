@@ -0,0 +1,67 @@
+"""
+Compare ways of looking up a redirect from the database, by CPU time and
+memory allocated per lookup.
+
+This is the work done for every redirect which isn't already cached.
+"""
+
+import tracemalloc
+from collections.abc import Callable
+
+from .utils import setup_django, timeit
+
+ITERATIONS = 20000
+
+
+def allocated(func: Callable[[], object]) -> int:
+    """
+    Measure the peak memory allocated while calling `func`.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    with setup_django():
+        from macau.redirects.cache import (
+            LOOKUP_FIELDS,
+            CachedRedirect,
+            lookup_redirect,
+        )
+        from macau.redirects.models import Redirect
+
+        Redirect.objects.create(slug="test", destination="https://example.com")
+
+        def model_instance() -> CachedRedirect:
+            redirect = Redirect.objects.get(slug="test", host="", is_enabled=True)
+            return CachedRedirect.from_row(
+                *(getattr(redirect, field) for field in LOOKUP_FIELDS)
+            )
+
+        def values_list() -> CachedRedirect:
+            return CachedRedirect.from_row(
+                *Redirect.objects.filter(slug="test", host="", is_enabled=True)
+                .values_list(*LOOKUP_FIELDS)
+                .get()
+            )
+
+        lookups: dict[str, Callable[[], object]] = {
+            "Model instance": model_instance,
+            "values_list": values_list,
+            "RedirectLookup": lambda: lookup_redirect("test"),
+        }
+
+        for name, lookup in lookups.items():
+            timeit(name, lookup, ITERATIONS)
+
+        for name, lookup in lookups.items():
+            print(f"{name:<40} {allocated(lookup):>12,} bytes allocated")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
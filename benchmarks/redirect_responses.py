@@ -0,0 +1,35 @@
+"""
+Compare building a redirect response for each request (as for prefix
+redirects), with copying one prepared when the redirect was cached.
+"""
+
+from functools import partial
+
+from .utils import setup_django, timeit
+
+ITERATIONS = 200_000
+DESTINATION = "https://example.com/some/long/path?with=query"
+
+
+def main() -> None:
+    with setup_django():
+        from macau.redirects.responses import (
+            RedirectResponseTemplate,
+            build_redirect_response,
+        )
+
+        template = RedirectResponseTemplate(DESTINATION, False)
+
+        timeit(
+            "Build", partial(build_redirect_response, DESTINATION, False), ITERATIONS
+        )
+        timeit(
+            "Prepare template",
+            partial(RedirectResponseTemplate, DESTINATION, False),
+            ITERATIONS,
+        )
+        timeit("Template", template.render, ITERATIONS)
+
+
+if __name__ == "__main__":
+    main()
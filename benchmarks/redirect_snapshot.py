@@ -0,0 +1,62 @@
+"""
+Compare looking up redirects in a compiled snapshot, with the database and
+per-process cache.
+
+Also compares the size of the snapshot (shared between workers) with the
+memory each worker would need to cache every redirect.
+"""
+
+import os
+import tempfile
+import tracemalloc
+from functools import partial
+
+from .utils import setup_django, timeit
+
+REDIRECTS = 100_000
+ITERATIONS = 50_000
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "redirects.snapshot")
+
+        with setup_django(REDIRECT_SNAPSHOT_PATH=path):
+            from django.core.management import call_command
+
+            from macau.redirects.cache import (
+                RedirectCache,
+                lookup_redirect,
+                redirect_snapshot,
+            )
+            from macau.redirects.models import Redirect
+
+            Redirect.objects.bulk_create(
+                Redirect(slug=f"slug-{i}", destination=f"https://example.com/{i}")
+                for i in range(REDIRECTS)
+            )
+            call_command("compile_redirects", verbosity=0)
+
+            redirect_snapshot.refresh()
+            snapshot = redirect_snapshot.snapshot
+            assert snapshot is not None
+
+            slug = f"slug-{REDIRECTS // 3}"
+            timeit("Database", partial(lookup_redirect, slug), ITERATIONS)
+            timeit("Snapshot", partial(snapshot.get, slug), ITERATIONS)
+
+            tracemalloc.start()
+            cache: RedirectCache = RedirectCache(maxsize=REDIRECTS, ttl=300)
+            for i in range(REDIRECTS):
+                cache.set(f"slug-{i}", lookup_redirect(f"slug-{i}"))
+            cache_size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            timeit("Cache", partial(cache.get, slug), ITERATIONS)
+
+            print(f"{'Snapshot size':<40} {os.path.getsize(path):>12,} bytes")  # noqa: T201
+            print(f"{'Cache size (per worker)':<40} {cache_size:>12,} bytes")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
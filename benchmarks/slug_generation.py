@@ -0,0 +1,77 @@
+"""
+Measure how quickly redirects with generated slugs can be created, as the
+table grows.
+
+Compares generating slugs from reserved blocks with picking random slugs and
+checking for collisions. Pass the number of redirects to create, eg
+`python -m benchmarks.slug_generation 1000000`.
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+
+from .utils import setup_django
+
+BATCH_SIZE = 1000
+REPORT_EVERY = 100_000
+
+
+def main(total: int) -> None:
+    with setup_django():
+        from django.conf import settings
+
+        from macau.redirects.models import Redirect
+        from macau.redirects.slugs import slug_generator
+
+        def random_slugs(count: int) -> list[str]:
+            slugs: set[str] = set()
+            while len(slugs) < count:
+                candidates = {
+                    "".join(
+                        random.choices(  # noqa: S311
+                            settings.REDIRECT_SLUG_ALPHABET,
+                            k=settings.REDIRECT_SLUG_LENGTH,
+                        )
+                    )
+                    for _ in range(count - len(slugs))
+                }
+                slugs |= candidates - set(
+                    Redirect.objects.filter(slug__in=candidates).values_list(
+                        "slug", flat=True
+                    )
+                )
+            return list(slugs)
+
+        strategies: dict[str, Callable[[int], list[str]]] = {
+            "Reserved blocks": slug_generator.generate,
+            "Random with collision check": random_slugs,
+        }
+
+        for name, generate in strategies.items():
+            Redirect.objects.all().delete()
+            print(f"{name}:")  # noqa: T201
+
+            start = segment_start = time.perf_counter()
+            for created in range(BATCH_SIZE, total + 1, BATCH_SIZE):
+                Redirect.objects.bulk_create(
+                    [
+                        Redirect(slug=slug, destination="https://example.com")
+                        for slug in generate(BATCH_SIZE)
+                    ]
+                )
+
+                if created % REPORT_EVERY == 0:
+                    now = time.perf_counter()
+                    print(  # noqa: T201
+                        f"  {created:>10,} rows {REPORT_EVERY / (now - segment_start):>10,.0f}/s"
+                    )
+                    segment_start = now
+
+            elapsed = time.perf_counter() - start
+            print(f"  {'total':>15} {total / elapsed:>10,.0f}/s")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,82 @@
+"""
+Helpers for running benchmarks against a throwaway SQLite database.
+
+Run benchmarks from the project root, eg `python -m benchmarks.db_connections`.
+"""
+
+import os
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+
+@contextmanager
+def setup_django(**environ: str) -> Iterator[None]:
+    """
+    Configure Django with a fresh, migrated database.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ.update(
+            {
+                "DATABASE_URL": f"sqlite:///{tmpdir}/db.sqlite3",
+                "SECRET_KEY": "benchmark",
+                "DEBUG": "false",
+                "REDIRECT_CACHE_INVALIDATION": "false",
+                **environ,
+            }
+        )
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "macau.settings")
+
+        import django
+        from django.core.management import call_command
+
+        django.setup()
+        call_command("migrate", verbosity=0)
+
+        yield
+
+
+def wsgi_environ(path: str, **extra: str) -> dict:
+    environ = {
+        "PATH_INFO": path,
+        "REQUEST_METHOD": "GET",
+        "wsgi.input": BytesIO(),
+        **extra,
+    }
+    setup_testing_defaults(environ)
+    return environ
+
+
+def call_wsgi(application: Callable, path: str, **extra: str) -> str:
+    status = ""
+
+    def start_response(response_status: str, headers: list) -> None:
+        nonlocal status
+        status = response_status
+
+    response = application(wsgi_environ(path, **extra), start_response)
+    try:
+        b"".join(response)
+    finally:
+        # Fires `request_finished`, which closes old database connections
+        if hasattr(response, "close"):
+            response.close()
+
+    return status
+
+
+def timeit(name: str, func: Callable[[], object], iterations: int) -> float:
+    # Warm up
+    func()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+
+    per_call = elapsed / iterations * 1_000_000
+    print(f"{name:<40} {iterations / elapsed:>12,.0f}/s {per_call:>10.1f}µs")  # noqa: T201
+    return elapsed
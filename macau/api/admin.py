@@ -0,0 +1,33 @@
+from django.contrib import admin, messages
+from django.forms import ModelForm
+from django.http import HttpRequest
+
+from macau.core.admin import admin_site
+
+from .models import APIToken
+
+
+@admin.register(APIToken, site=admin_site)
+class APITokenAdmin(admin.ModelAdmin):
+    list_display = ["name", "user", "created_at"]
+    list_filter = ["user"]
+    search_fields = ["name"]
+
+    def get_readonly_fields(
+        self, request: HttpRequest, obj: APIToken | None = None
+    ) -> list:
+        # Tokens can't be moved between users
+        if obj:
+            return ["user", "created_at"]
+        return ["created_at"]
+
+    def save_model(
+        self, request: HttpRequest, obj: APIToken, form: ModelForm, change: bool
+    ) -> None:
+        if not change:
+            key = obj.set_new_key()
+            messages.success(
+                request,
+                f"The token is {key}. Make a note of it, since it won't be shown again.",
+            )
+        super().save_model(request, obj, form, change)
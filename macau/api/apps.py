@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class APIConfig(AppConfig):
+    name = "macau.api"
+    label = "api"
+    verbose_name = "API"
+
+    def ready(self) -> None:
+        from . import admin  # noqa: F401
@@ -0,0 +1,40 @@
+import secrets
+from hashlib import sha256
+
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class APIToken(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="api_tokens",
+        verbose_name=_("user"),
+    )
+    name = models.CharField(_("name"), max_length=64)
+
+    # Only a hash is stored, so tokens can't be recovered from the database
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("API token")
+        verbose_name_plural = _("API tokens")
+
+    def __str__(self) -> str:
+        return self.name
+
+    @staticmethod
+    def hash_key(key: str) -> str:
+        return sha256(key.encode()).hexdigest()
+
+    def set_new_key(self) -> str:
+        """
+        Generate a new key for this token, returning it.
+        """
+        key = secrets.token_urlsafe(32)
+        self.key_hash = self.hash_key(key)
+        return key
@@ -0,0 +1,259 @@
+from typing import Any
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+
+from macau.redirects.cache import redirect_cache
+from macau.redirects.models import Redirect
+
+from .models import APIToken
+
+
+class APITestCase(TestCase):
+    user: User
+    key: str
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+        token = APIToken(user=cls.user, name="Test")
+        cls.key = token.set_new_key()
+        token.save()
+
+    def post(self, url_name: str, data: Any, key: str | None = None) -> Any:
+        return self.client.post(
+            reverse(url_name),
+            data,
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {key or self.key}"},
+        )
+
+
+class APIAuthenticationTestCase(APITestCase):
+    def test_valid_token(self) -> None:
+        response = self.post("api:redirects-lookup", {"slugs": []})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_token(self) -> None:
+        response = self.post("api:redirects-lookup", {"slugs": []}, key="invalid")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.headers["WWW-Authenticate"], "Bearer")
+
+    def test_missing_token(self) -> None:
+        response = self.client.post(
+            reverse("api:redirects-lookup"), {}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_inactive_user(self) -> None:
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.post("api:redirects-lookup", {"slugs": []})
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_not_stored(self) -> None:
+        self.assertFalse(APIToken.objects.filter(key_hash=self.key).exists())
+
+    def test_invalid_json(self) -> None:
+        for data in ["not json", "[]"]:
+            with self.subTest(data=data):
+                response = self.post("api:redirects-lookup", data)
+                self.assertEqual(response.status_code, 400)
+
+    def test_get(self) -> None:
+        response = self.client.get(
+            reverse("api:redirects-lookup"),
+            headers={"Authorization": f"Bearer {self.key}"},
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_permissions(self) -> None:
+        user = User.objects.create_user("limited")
+        user.user_permissions.add(Permission.objects.get(codename="view_redirect"))
+        token = APIToken(user=user, name="Limited")
+        key = token.set_new_key()
+        token.save()
+
+        response = self.post("api:redirects-lookup", {"slugs": []}, key=key)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.post(
+            "api:redirects-batch",
+            {"create": [{"slug": "test", "destination": "https://example.com"}]},
+            key=key,
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Redirect.objects.exists())
+
+
+class RedirectLookupViewTestCase(APITestCase):
+    def test_lookup(self) -> None:
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        Redirect.objects.create(slug="other", destination="https://example.com/2")
+
+        with self.assertNumQueries(2):
+            response = self.post("api:redirects-lookup", {"slugs": ["test", "missing"]})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data["redirects"].keys()), ["test"])
+        self.assertEqual(
+            data["redirects"]["test"]["destination"], "https://example.com"
+        )
+        self.assertEqual(data["missing"], ["missing"])
+
+    def test_invalid_slugs(self) -> None:
+        response = self.post("api:redirects-lookup", {"slugs": "test"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many(self) -> None:
+        response = self.post("api:redirects-lookup", {"slugs": ["test"] * 1001})
+        self.assertEqual(response.status_code, 400)
+
+
+class RedirectBatchViewTestCase(APITestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+
+    def test_batch(self) -> None:
+        Redirect.objects.create(slug="existing", destination="https://example.com")
+        Redirect.objects.create(slug="deleted", destination="https://example.com")
+
+        response = self.post(
+            "api:redirects-batch",
+            {
+                "create": [
+                    {"slug": f"new-{i}", "destination": "https://example.com/new"}
+                    for i in range(10)
+                ],
+                "update": [{"slug": "existing", "is_permanent": True}],
+                "delete": ["deleted", "missing"],
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "created": 10,
+                "updated": 1,
+                "deleted": 1,
+                "slugs": [f"new-{i}" for i in range(10)],
+            },
+        )
+
+        self.assertEqual(Redirect.objects.filter(slug__startswith="new-").count(), 10)
+        self.assertTrue(Redirect.objects.get(slug="existing").is_permanent)
+        self.assertFalse(Redirect.objects.filter(slug="deleted").exists())
+
+    def test_query_count(self) -> None:
+        # Queries don't grow with the number of redirects created
+        for count in [1, 50]:
+            with self.subTest(count=count), self.assertNumQueries(5):
+                response = self.post(
+                    "api:redirects-batch",
+                    {
+                        "create": [
+                            {
+                                "slug": f"new-{count}-{i}",
+                                "destination": "https://example.com",
+                            }
+                            for i in range(count)
+                        ]
+                    },
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_invalid(self) -> None:
+        Redirect.objects.create(slug="existing", destination="https://example.com")
+
+        response = self.post(
+            "api:redirects-batch",
+            {
+                "create": [
+                    {"slug": "valid", "destination": "https://example.com"},
+                    {"slug": "existing", "destination": "https://example.com"},
+                    {"slug": "bad-url", "destination": "not a url"},
+                    {"slug": 1, "destination": "https://example.com"},
+                    {"slug": "extra", "destination": "https://example.com", "x": 1},
+                ],
+                "update": [
+                    {"slug": "missing", "destination": "https://example.com"},
+                    {"slug": "existing", "basic_auth_username": "user"},
+                ],
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [
+                (error["operation"], error["index"], list(error["errors"].keys()))
+                for error in response.json()["errors"]
+            ],
+            [
+                ("create", 1, ["slug"]),
+                ("create", 2, ["destination"]),
+                ("create", 3, ["slug"]),
+                ("create", 4, ["x"]),
+                ("update", 0, ["slug"]),
+                ("update", 1, ["basic_auth_username"]),
+            ],
+        )
+
+        # Nothing was changed
+        self.assertEqual(
+            list(Redirect.objects.values_list("slug", flat=True)), ["existing"]
+        )
+        self.assertEqual(Redirect.objects.get(slug="existing").basic_auth_username, "")
+
+    def test_generate_slugs(self) -> None:
+        response = self.post(
+            "api:redirects-batch",
+            {"create": [{"destination": "https://example.com"}] * 5},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        slugs = response.json()["slugs"]
+        self.assertEqual(len(set(slugs)), 5)
+        self.assertEqual(Redirect.objects.filter(slug__in=slugs).count(), 5)
+
+    def test_duplicate_create(self) -> None:
+        response = self.post(
+            "api:redirects-batch",
+            {
+                "create": [
+                    {"slug": "test", "destination": "https://example.com"},
+                    {"slug": "test", "destination": "https://example.com"},
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Redirect.objects.exists())
+
+    def test_invalidates_cache(self) -> None:
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        self.client.get("/test")
+        self.assertIsNotNone(redirect_cache.get("test"))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.post(
+                "api:redirects-batch",
+                {"update": [{"slug": "test", "destination": "https://example.com/2"}]},
+            )
+        self.assertEqual(response.status_code, 200)
+
+        # Invalidating before the commit could cache the old destination again
+        self.assertIsNotNone(redirect_cache.get("test"))
+        for callback in callbacks:
+            callback()
+
+        self.assertIsNone(redirect_cache.get("test"))
+        self.assertEqual(
+            self.client.get("/test").headers["Location"], "https://example.com/2"
+        )
+
+    def test_too_many(self) -> None:
+        response = self.post("api:redirects-batch", {"delete": ["test"] * 1001})
+        self.assertEqual(response.status_code, 400)
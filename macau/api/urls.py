@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import views
+
+app_name = "api"
+
+urlpatterns = [
+    path(
+        "redirects/lookup/",
+        views.RedirectLookupView.as_view(),
+        name="redirects-lookup",
+    ),
+    path(
+        "redirects/batch/",
+        views.RedirectBatchView.as_view(),
+        name="redirects-batch",
+    ),
+]
@@ -0,0 +1,287 @@
+import json
+from functools import partial
+from typing import Any
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import HttpRequest, HttpResponseBase, JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from macau.redirects.exports import get_export_fields
+from macau.redirects.imports import IMPORT_FIELDS, UPDATE_FIELDS, build_redirect
+from macau.redirects.models import Redirect
+from macau.redirects.signals import invalidate_saved_redirects
+from macau.redirects.slugs import slug_generator
+
+from .models import APIToken
+
+
+class APIError(Exception):
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class APIView(View):
+    """
+    Base view for the JSON API, authenticated with a bearer token.
+
+    Requests are JSON objects, sent with `POST`.
+    """
+
+    http_method_names = ["post"]
+
+    # Maximum number of items in a single request
+    MAX_BATCH_SIZE = 1000
+
+    data: dict[str, Any]
+
+    def get_token(self, request: HttpRequest) -> APIToken | None:
+        scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not key.strip():
+            return None
+
+        return (
+            APIToken.objects.select_related("user")
+            .filter(key_hash=APIToken.hash_key(key.strip()), user__is_active=True)
+            .first()
+        )
+
+    def check_permissions(self, request: HttpRequest, *permissions: str) -> None:
+        if not request.user.has_perms(permissions):
+            raise APIError("Permission denied", status=403)
+
+    def get_host(self) -> str:
+        """
+        Get the host whose redirects are being managed, or `""` for redirects
+        served on every host.
+        """
+        host = self.data.get("host", "")
+        if not isinstance(host, str):
+            raise APIError("host must be a string")
+        return host.lower()
+
+    def get_list(self, key: str, item_type: type) -> list:
+        value = self.data.get(key, [])
+        if not isinstance(value, list) or not all(
+            isinstance(item, item_type) for item in value
+        ):
+            raise APIError(f"{key} must be a list of {item_type.__name__}")
+        return value
+
+    @method_decorator(csrf_exempt)
+    def dispatch(
+        self, request: HttpRequest, *args: Any, **kwargs: Any
+    ) -> HttpResponseBase:
+        if (
+            request.method is None
+            or request.method.lower() not in self.http_method_names
+        ):
+            return self.http_method_not_allowed(request, *args, **kwargs)
+
+        token = self.get_token(request)
+        if token is None:
+            return JsonResponse(
+                {"error": "Invalid token"},
+                status=401,
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        request.user = token.user
+
+        try:
+            self.data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+        if not isinstance(self.data, dict):
+            return JsonResponse({"error": "Expected a JSON object"}, status=400)
+
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except APIError as e:
+            return JsonResponse({"error": e.message}, status=e.status)
+
+
+class RedirectLookupView(APIView):
+    """
+    Look up many redirects on a host by slug.
+    """
+
+    def post(self, request: HttpRequest) -> JsonResponse:
+        self.check_permissions(request, "redirects.view_redirect")
+
+        slugs = self.get_list("slugs", str)
+        if len(slugs) > self.MAX_BATCH_SIZE:
+            raise APIError(f"At most {self.MAX_BATCH_SIZE} slugs can be looked up")
+
+        redirects = {
+            redirect["slug"]: redirect
+            for redirect in Redirect.objects.filter(
+                slug__in=slugs, host=self.get_host()
+            ).values(*get_export_fields())
+        }
+
+        return JsonResponse(
+            {
+                "redirects": redirects,
+                "missing": [slug for slug in slugs if slug not in redirects],
+            }
+        )
+
+
+class RedirectBatchView(APIView):
+    """
+    Create, update and delete many redirects, in a single transaction.
+
+    Redirects are identified by their slug and host. Records without a host,
+    and deleted slugs, use the request's host.
+
+    If any item is invalid, nothing is changed, and the errors for each item
+    are returned.
+    """
+
+    OPERATION_PERMISSIONS = {
+        "create": "redirects.add_redirect",
+        "update": "redirects.change_redirect",
+        "delete": "redirects.delete_redirect",
+    }
+
+    def _get_slugs(self, records: list[dict[str, Any]]) -> list[str]:
+        return [
+            record["slug"] for record in records if isinstance(record.get("slug"), str)
+        ]
+
+    def _get_key(self, record: dict[str, Any]) -> tuple[str, str]:
+        return record["slug"], record["host"].lower()
+
+    def _validate_fields(self, record: dict[str, Any]) -> None:
+        if unknown_fields := record.keys() - set(IMPORT_FIELDS):
+            raise ValidationError(
+                dict.fromkeys(sorted(unknown_fields), "Unknown field")
+            )
+        if not isinstance(record.get("slug"), str):
+            raise ValidationError({"slug": "This field is required."})
+        if not isinstance(record["host"], str):
+            raise ValidationError({"host": "Enter a valid hostname."})
+
+    def _create(self, records: list[dict[str, Any]], errors: list) -> list[Redirect]:
+        existing_keys = set(
+            Redirect.objects.filter(slug__in=self._get_slugs(records)).values_list(
+                "slug", "host"
+            )
+        )
+
+        redirects = []
+        for index, record in enumerate(records):
+            try:
+                self._validate_fields(record)
+                if self._get_key(record) in existing_keys:
+                    raise ValidationError(
+                        {"slug": "Redirect with this slug and host already exists."}
+                    )
+                redirects.append(build_redirect(record))
+                existing_keys.add(self._get_key(record))
+            except ValidationError as e:
+                errors.append(
+                    {"operation": "create", "index": index, "errors": e.message_dict}
+                )
+
+        return redirects
+
+    def _update(self, records: list[dict[str, Any]], errors: list) -> list[Redirect]:
+        # Lock the rows, so concurrent updates aren't lost
+        existing = {
+            (redirect.slug, redirect.host): redirect
+            for redirect in Redirect.objects.select_for_update().filter(
+                slug__in=self._get_slugs(records)
+            )
+        }
+        now = timezone.now()
+
+        redirects = []
+        for index, record in enumerate(records):
+            try:
+                self._validate_fields(record)
+                if (redirect := existing.get(self._get_key(record))) is None:
+                    raise ValidationError({"slug": "Redirect does not exist."})
+                for field, value in record.items():
+                    setattr(redirect, field, value)
+                redirect.modified_at = now
+                redirect.full_clean(validate_unique=False, validate_constraints=False)
+                redirects.append(redirect)
+            except ValidationError as e:
+                errors.append(
+                    {"operation": "update", "index": index, "errors": e.message_dict}
+                )
+
+        return redirects
+
+    def post(self, request: HttpRequest) -> JsonResponse:
+        operations = {
+            "create": self.get_list("create", dict),
+            "update": self.get_list("update", dict),
+            "delete": self.get_list("delete", str),
+        }
+
+        if sum(map(len, operations.values())) > self.MAX_BATCH_SIZE:
+            raise APIError(f"At most {self.MAX_BATCH_SIZE} items can be changed")
+
+        host = self.get_host()
+        for record in operations["create"] + operations["update"]:
+            record.setdefault("host", host)
+
+        self.check_permissions(
+            request,
+            *(
+                self.OPERATION_PERMISSIONS[operation]
+                for operation, items in operations.items()
+                if items
+            ),
+        )
+
+        # Generate slugs outside the transaction, so blocks of them can be
+        # reserved for later requests
+        if records_without_slug := [
+            record for record in operations["create"] if "slug" not in record
+        ]:
+            for record, slug in zip(
+                records_without_slug,
+                slug_generator.generate(len(records_without_slug)),
+                strict=True,
+            ):
+                record["slug"] = slug
+
+        errors: list[dict] = []
+
+        with transaction.atomic():
+            created = self._create(operations["create"], errors)
+            updated = self._update(operations["update"], errors)
+
+            if errors:
+                transaction.set_rollback(True)
+                return JsonResponse({"errors": errors}, status=400)
+
+            Redirect.objects.bulk_create(created)
+            Redirect.objects.bulk_update(updated, UPDATE_FIELDS)
+            transaction.on_commit(
+                partial(invalidate_saved_redirects, created + updated)
+            )
+
+            # Deletion sends signals for each redirect, which invalidates them
+            deleted, _ = Redirect.objects.filter(
+                slug__in=operations["delete"], host=host
+            ).delete()
+
+        return JsonResponse(
+            {
+                "created": len(created),
+                "updated": len(updated),
+                "deleted": deleted,
+                "slugs": [redirect.slug for redirect in created],
+            }
+        )
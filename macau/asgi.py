@@ -0,0 +1,14 @@
+import os
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from granian.utils.proxies import wrap_asgi_with_proxy_headers
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "macau.settings")
+
+# Use the async views
+os.environ.setdefault("GRANIAN_INTERFACE", "asgi")
+
+application = wrap_asgi_with_proxy_headers(
+    get_asgi_application(), trusted_hosts=settings.TRUSTED_PROXY_HOSTS
+)
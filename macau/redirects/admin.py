@@ -1,45 +1,99 @@
 from copy import deepcopy
+from typing import Any
 
-from django import forms
 from django.contrib import admin
-from django.http import HttpRequest
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from django.forms import ModelForm
+from django.http import HttpRequest, StreamingHttpResponse
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.text import Truncator
 from import_export.admin import ImportExportActionModelAdmin
 from import_export.resources import ModelResource
+from import_export.results import Result
+from tablib import Dataset
 
 from macau.core.admin import admin_site
 
-from .models import Redirect
+from .exports import EXPORT_CONTENT_TYPES, iter_export
+from .imports import IMPORT_FIELDS, upsert_redirects
+from .models import PREFIX_SUFFIX, Redirect
+from .pagination import EstimatedCountPaginator, RedirectChangeList
+from .qrcodes import QRCodeOptions, iter_qrcode_zip
+from .search import search_redirects
+from .slugs import generate_slug
 
 
-class RedirectAdminForm(forms.ModelForm):
-    def clean(self) -> dict:
-        cleaned_data: dict = super().clean()  # type: ignore[assignment]
+class RedirectResource(ModelResource):
+    class Meta:
+        model = Redirect
+        # IDs are specific to each database
+        exclude = ["id"]
+        import_id_fields = ["slug", "host"]
+        clean_model_instances = True
 
-        if (
-            cleaned_data["basic_auth_username"]
-            and not cleaned_data["basic_auth_password"]
-        ):
-            raise forms.ValidationError(
-                {
-                    "basic_auth_username": "Password must be specified (or only specified) when using basic auth"
-                }
-            )
+    def before_import(self, dataset: Dataset, **kwargs: Any) -> None:
+        # Files without hosts are for redirects served on every host
+        if dataset.headers and "host" not in dataset.headers:
+            dataset.append_col([""] * len(dataset), header="host")
 
-        return cleaned_data
 
+class BulkRedirectResource(RedirectResource):
+    """
+    Import redirects using the same bulk upsert as `import_redirects`.
+
+    Existing redirects aren't looked up first, so every row is reported as new.
+    """
 
-class RedirectResource(ModelResource):
     class Meta:
-        model = Redirect
+        name = "Bulk upsert (faster, but changes aren't previewed)"
+        fields = IMPORT_FIELDS
+        use_bulk = True
+        batch_size = 1000
+        force_init_instance = True
+        skip_diff = True
+
+    def validate_instance(
+        self,
+        instance: Redirect,
+        import_validation_errors: dict | None = None,
+        validate_unique: bool = True,
+    ) -> None:
+        # Existing redirects are updated, rather than conflicting, so neither
+        # uniqueness nor the unique constraint are checked
+        errors = dict(import_validation_errors or {})
+        try:
+            instance.full_clean(
+                exclude=errors.keys(), validate_unique=False, validate_constraints=False
+            )
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+
+        if errors:
+            raise ValidationError(errors)
+
+    def bulk_create(
+        self,
+        using_transactions: bool,
+        dry_run: bool,
+        raise_errors: bool,
+        batch_size: int | None = None,
+        result: Result | None = None,
+    ) -> None:
+        if self.create_instances and (using_transactions or not dry_run):
+            try:
+                with transaction.atomic():
+                    upsert_redirects(self.create_instances)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.create_instances.clear()
 
 
 @admin.register(Redirect, site=admin_site)
 class RedirectAdmin(ImportExportActionModelAdmin):
-    form = RedirectAdminForm
-
     resource_classes = [RedirectResource]
     show_change_form_export = False
 
@@ -51,13 +105,32 @@ class RedirectAdmin(ImportExportActionModelAdmin):
     ]
     search_fields = ["slug", "destination"]
     list_filter = ["is_permanent", "is_enabled"]
-    ordering = ["slug"]
+    ordering = ["slug", "host"]
+
+    paginator = EstimatedCountPaginator
+    # Counted by `RedirectChangeList`, without an exact count of every redirect
+    show_full_result_count = False
 
     readonly_fields = ["created_at", "modified_at", "view_qrcode"]
 
+    actions = [
+        "download_qrcodes_svg",
+        "download_qrcodes_png",
+        "stream_export_csv",
+        "stream_export_json",
+        "stream_export_jsonl",
+    ]
+
+    # Include a quiet zone, since these are likely to be printed
+    download_qrcode_options = QRCodeOptions(scale=10, border=4)
+
     fieldsets_dict = {
-        None: {"fields": ("slug", "is_enabled")},
+        None: {"fields": ("slug", "host", "is_enabled")},
         "Response": {"fields": ("destination", "is_permanent")},
+        "Schedule": {
+            "classes": ["collapse"],
+            "fields": ("active_from", "expires_at"),
+        },
         "Authentication": {
             "classes": ["collapse"],
             "fields": ("basic_auth_username", "basic_auth_password"),
@@ -72,11 +145,115 @@ class RedirectAdmin(ImportExportActionModelAdmin):
 
     @admin.display(description="QR Code")
     def view_qrcode(self, obj: Redirect) -> str:
+        # Prefixes don't have a single URL to encode
+        if obj.is_prefix:
+            return "-"
         return format_html(
             "<img src='{}' class='redirect-qrcode' />",
             reverse("redirects:qrcode-png", args=[obj.slug]),
         )
 
+    def _download_qrcodes(
+        self, request: HttpRequest, queryset: QuerySet[Redirect], image_format: str
+    ) -> StreamingHttpResponse:
+        rows = (
+            queryset.exclude(slug__endswith=PREFIX_SUFFIX)
+            .order_by()
+            .values_list("slug", "host")
+            .iterator(chunk_size=1000)
+        )
+
+        # Redirects restricted to a host are named (and served) under it
+        names = (f"{host}/{slug}" if host else slug for slug, host in rows)
+
+        def get_data(name: str) -> str:
+            host, _, slug = name.rpartition("/")
+            path = reverse("redirects:redirect", args=[slug])
+            if host:
+                return f"{request.scheme}://{host}{path}"
+            return request.build_absolute_uri(path)
+
+        return StreamingHttpResponse(
+            iter_qrcode_zip(
+                names, get_data, image_format, self.download_qrcode_options
+            ),
+            content_type="application/zip",
+            headers={
+                "Content-Disposition": f'attachment; filename="qrcodes-{image_format}.zip"'
+            },
+        )
+
+    @admin.action(description="Download QR codes for selected redirects (SVG)")
+    def download_qrcodes_svg(
+        self, request: HttpRequest, queryset: QuerySet[Redirect]
+    ) -> StreamingHttpResponse:
+        return self._download_qrcodes(request, queryset, "svg")
+
+    @admin.action(description="Download QR codes for selected redirects (PNG)")
+    def download_qrcodes_png(
+        self, request: HttpRequest, queryset: QuerySet[Redirect]
+    ) -> StreamingHttpResponse:
+        return self._download_qrcodes(request, queryset, "png")
+
+    def _stream_export(
+        self, queryset: QuerySet[Redirect], export_format: str
+    ) -> StreamingHttpResponse:
+        return StreamingHttpResponse(
+            iter_export(queryset.order_by("slug"), export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+            headers={
+                "Content-Disposition": f'attachment; filename="redirects.{export_format}"'
+            },
+        )
+
+    @admin.action(description="Export selected redirects (CSV, streamed)")
+    def stream_export_csv(
+        self, request: HttpRequest, queryset: QuerySet[Redirect]
+    ) -> StreamingHttpResponse:
+        return self._stream_export(queryset, "csv")
+
+    @admin.action(description="Export selected redirects (JSON, streamed)")
+    def stream_export_json(
+        self, request: HttpRequest, queryset: QuerySet[Redirect]
+    ) -> StreamingHttpResponse:
+        return self._stream_export(queryset, "json")
+
+    @admin.action(description="Export selected redirects (JSONL, streamed)")
+    def stream_export_jsonl(
+        self, request: HttpRequest, queryset: QuerySet[Redirect]
+    ) -> StreamingHttpResponse:
+        return self._stream_export(queryset, "jsonl")
+
+    def get_changelist(self, request: HttpRequest, **kwargs: Any) -> type:
+        return RedirectChangeList
+
+    def get_search_results(
+        self, request: HttpRequest, queryset: QuerySet[Redirect], search_term: str
+    ) -> tuple[QuerySet[Redirect], bool]:
+        if not search_term.strip():
+            return queryset, False
+        return search_redirects(queryset, search_term), False
+
+    def get_form(
+        self,
+        request: HttpRequest,
+        obj: Redirect | None = None,
+        change: bool = False,
+        **kwargs: Any,
+    ) -> type[ModelForm]:
+        form: type[ModelForm] = super().get_form(request, obj, change, **kwargs)
+        if obj is None:
+            form.base_fields["slug"].required = False
+            form.base_fields["slug"].help_text = "Leave blank to generate one"
+        return form
+
+    def save_model(
+        self, request: HttpRequest, obj: Redirect, form: ModelForm, change: bool
+    ) -> None:
+        if not obj.slug:
+            obj.slug = generate_slug()
+        super().save_model(request, obj, form, change)
+
     def get_fieldsets(self, request: HttpRequest, obj: Redirect | None = None) -> list:
         if not obj:
             add_fieldsets: dict = deepcopy(self.fieldsets_dict)
@@ -89,3 +266,9 @@ class RedirectAdmin(ImportExportActionModelAdmin):
 
             return list(add_fieldsets.items())
         return list(self.fieldsets_dict.items())
+
+    def get_import_resource_classes(self, request: HttpRequest) -> list:
+        return [RedirectResource, BulkRedirectResource]
+
+    def get_export_resource_classes(self, request: HttpRequest) -> list:
+        return [RedirectResource]
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RedirectsConfig(AppConfig):
@@ -7,4 +8,7 @@ class RedirectsConfig(AppConfig):
     verbose_name = "Redirects"
 
     def ready(self) -> None:
-        from . import admin  # noqa: F401
+        from . import admin, signals  # noqa: F401
+        from .search import ensure_search_index
+
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,78 @@
+import math
+import sys
+from hashlib import blake2b
+
+
+def hash_positions(item: str, count: int, size: int) -> list[int]:
+    """
+    Derive `count` positions in `[0, size)` for `item`.
+    """
+    # Double hashing (Kirsch-Mitzenmacher), deriving k positions from 1 hash
+    digest = blake2b(item.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % size for i in range(count)]
+
+
+class BloomFilter:
+    """
+    A compact, probabilistic set of strings.
+
+    Membership checks may return false positives (at roughly `error_rate` once
+    `capacity` items are added), but never false negatives. Items can't be
+    removed.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+
+        self.num_bits = max(
+            math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8
+        )
+        self.num_hashes = max(round(self.num_bits / self.capacity * math.log(2)), 1)
+
+        self._bits = bytearray(math.ceil(self.num_bits / 8))
+        self.count = 0
+
+    def _positions(self, item: str) -> list[int]:
+        return hash_positions(item, self.num_hashes, self.num_bits)
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: object) -> bool:
+        if not isinstance(item, str):
+            return False
+
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def is_full(self) -> bool:
+        return self.count > self.capacity
+
+    @property
+    def false_positive_rate(self) -> float:
+        """
+        The expected false-positive rate, given the items added so far.
+        """
+        return float(
+            (1 - math.exp(-self.num_hashes * self.count / self.num_bits))
+            ** self.num_hashes
+        )
+
+    @property
+    def memory_footprint(self) -> int:
+        """
+        The size of the filter, in bytes.
+        """
+        return sys.getsizeof(self._bits)
@@ -0,0 +1,502 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import UTC, datetime
+from threading import Lock, Thread
+from typing import Generic, NamedTuple, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, router
+from django.http import Http404
+
+from .bloom import BloomFilter
+from .invalidation import ensure_listening, register
+from .models import Redirect
+from .responses import RedirectResponseTemplate
+from .snapshot import SnapshotReader
+from .utils import get_basic_auth_token
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CachedRedirect(NamedTuple):
+    destination: str
+    is_permanent: bool
+
+    # Expected basic auth credentials (see `get_basic_auth_token`), if required
+    basic_auth_token: str
+
+    # The only host the redirect is served on, if restricted
+    host: str = ""
+
+    # When the redirect is served from and until (as UNIX timestamps), if
+    # it's scheduled
+    active_from: float | None = None
+    expires_at: float | None = None
+
+    # The redirect's response, prepared once it's cached
+    response_template: RedirectResponseTemplate | None = None
+
+    @classmethod
+    def from_row(
+        cls,
+        destination: str,
+        is_permanent: bool,
+        basic_auth_username: str,
+        basic_auth_password: str,
+        host: str,
+        active_from: datetime | None,
+        expires_at: datetime | None,
+    ) -> "CachedRedirect":
+        """
+        Create from the values of `LOOKUP_FIELDS`.
+        """
+        return cls(
+            destination,
+            # SQLite stores booleans as integers
+            bool(is_permanent),
+            get_basic_auth_token(basic_auth_username, basic_auth_password)
+            if basic_auth_password
+            else "",
+            host,
+            _to_timestamp(active_from),
+            _to_timestamp(expires_at),
+        )
+
+    def is_active(self, now: float) -> bool:
+        return (self.active_from is None or self.active_from <= now) and (
+            self.expires_at is None or now < self.expires_at
+        )
+
+    def get_ttl(self, now: float) -> float | None:
+        """
+        How long the redirect can be cached for, so it's looked up again once
+        it becomes active or expires.
+        """
+        boundaries = [
+            boundary - now
+            for boundary in [self.active_from, self.expires_at]
+            if boundary is not None and boundary > now
+        ]
+        return min(boundaries, default=None)
+
+
+def _to_timestamp(value: datetime | None) -> float | None:
+    if value is None:
+        return None
+
+    # Raw queries on SQLite return naive datetimes, in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.timestamp()
+
+
+class SlugRedirects(dict[str, CachedRedirect]):
+    """
+    The enabled redirects for a slug, keyed by the host they're restricted to
+    (or `""`, if they're served on every host).
+    """
+
+    def resolve(self, host: str, now: float) -> CachedRedirect | None:
+        """
+        Get the active redirect to serve on `host`. Redirects restricted to the
+        host take priority.
+        """
+        for redirect in [self.get(host) if host else None, self.get("")]:
+            if redirect is not None and redirect.is_active(now):
+                return redirect
+        return None
+
+    def get_ttl(self, now: float) -> float | None:
+        """
+        How long the redirects can be cached for (see `CachedRedirect.get_ttl`).
+        """
+        ttls = [redirect.get_ttl(now) for redirect in self.values()]
+        return min((ttl for ttl in ttls if ttl is not None), default=None)
+
+    def prepare_responses(self) -> None:
+        for host, redirect in self.items():
+            self[host] = redirect._replace(
+                response_template=RedirectResponseTemplate(
+                    redirect.destination, redirect.is_permanent
+                )
+            )
+
+
+# Columns needed to create a `CachedRedirect`
+LOOKUP_FIELDS = [
+    "destination",
+    "is_permanent",
+    "basic_auth_username",
+    "basic_auth_password",
+    "host",
+    "active_from",
+    "expires_at",
+]
+
+
+class RedirectLookup:
+    """
+    Fetch just the columns needed to serve a slug's enabled redirects.
+
+    Building the query with the ORM, and a model instance from the result,
+    takes far longer than running the query itself. Instead, the query is
+    compiled once per database, and rows become `CachedRedirect`s directly.
+    """
+
+    def __init__(self) -> None:
+        self._queries: dict[str, str] = {}
+
+    def get_query(self, using: str) -> str:
+        if (sql := self._queries.get(using)) is None:
+            queryset = (
+                Redirect.objects.using(using)
+                .filter(slug="", is_enabled=True)
+                .values_list(*LOOKUP_FIELDS)
+            )
+            sql, params = queryset.query.sql_with_params()
+
+            # The slug must be the only parameter, so it can be swapped in
+            if params != ("",):
+                raise ValueError(f"Unexpected lookup parameters: {params!r}")
+
+            self._queries[using] = sql
+
+        return sql
+
+    def __call__(self, slug: str) -> SlugRedirects | None:
+        using = router.db_for_read(Redirect)
+        with connections[using].cursor() as cursor:
+            cursor.execute(self.get_query(using), [slug])
+            rows = cursor.fetchall()
+
+        if not rows:
+            return None
+
+        return SlugRedirects(
+            (redirect.host, redirect)
+            for redirect in (CachedRedirect.from_row(*row) for row in rows)
+        )
+
+
+class RedirectCache(Generic[T]):
+    """
+    A bounded, per-process LRU cache of data about redirects, keyed by slug.
+
+    Entries are evicted once they're older than `ttl` seconds (or their own
+    `ttl`, if shorter), or when the cache is full and they're the least recently
+    used.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, slug: str) -> T | None:
+        with self._lock:
+            try:
+                expires_at, value = self._entries[slug]
+            except KeyError:
+                return None
+
+            if expires_at <= time.monotonic():
+                del self._entries[slug]
+                return None
+
+            self._entries.move_to_end(slug)
+            return value
+
+    def set(self, slug: str, value: T, ttl: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        with self._lock:
+            self._entries[slug] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(slug)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, slug: str) -> None:
+        with self._lock:
+            self._entries.pop(slug, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SlugFilter:
+    """
+    A per-process filter of enabled slugs, used to reject unknown slugs without
+    querying the database.
+
+    Until the filter has been built (or after it's cleared), every slug is
+    assumed to exist. Building it scans every enabled slug, so it's built in the
+    background, at most once every `MIN_REBUILD_INTERVAL` seconds.
+    """
+
+    # Rebuild once this proportion of the filter is removed slugs
+    MAX_REMOVED_RATIO = 0.25
+
+    # Leave room for redirects created after a rebuild
+    HEADROOM = 1.25
+
+    MIN_REBUILD_INTERVAL = 10.0
+
+    def __init__(
+        self, error_rate: float, enabled: bool = True, background: bool = True
+    ) -> None:
+        self.error_rate = error_rate
+        self.enabled = enabled
+        self.background = background
+        self._bloom: BloomFilter | None = None
+        self._lock = Lock()
+        self._generation = 0
+        self._rebuilding = False
+        self._last_rebuild_at = -math.inf
+        self._pending: list[str] = []
+        self._removed = 0
+
+    def __contains__(self, slug: object) -> bool:
+        bloom = self._bloom
+        return bloom is None or slug in bloom
+
+    @property
+    def is_ready(self) -> bool:
+        return self._bloom is not None
+
+    @property
+    def bloom(self) -> BloomFilter | None:
+        return self._bloom
+
+    def add(self, slug: str) -> None:
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(slug)
+                if self._bloom.is_full:
+                    self._bloom = None
+            if self._rebuilding:
+                self._pending.append(slug)
+
+    def discard(self, slug: str) -> None:
+        # Bloom filters can't remove items, so just track how stale the filter is
+        with self._lock:
+            self._removed += 1
+            if (
+                self._bloom is not None
+                and self._removed > len(self._bloom) * self.MAX_REMOVED_RATIO
+            ):
+                self._bloom = None
+
+    def invalidate(self, slug: str) -> None:
+        # The slug may have just been created elsewhere
+        self.add(slug)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._generation += 1
+
+    def schedule_rebuild(self) -> None:
+        """
+        Rebuild the filter, unless it was rebuilt recently.
+        """
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._rebuilding
+                or now - self._last_rebuild_at < self.MIN_REBUILD_INTERVAL
+            ):
+                return
+            self._last_rebuild_at = now
+
+        if self.background:
+            Thread(
+                target=self._rebuild_in_background,
+                name=f"{self.__class__.__name__}Rebuild",
+                daemon=True,
+            ).start()
+        else:
+            self.rebuild()
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Unable to build slug filter")
+        finally:
+            connection.close()
+
+    def rebuild(self) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            self._pending = []
+            generation = self._generation
+
+        bloom = None
+        try:
+            slugs = Redirect.objects.filter(is_enabled=True).values_list(
+                "slug", flat=True
+            )
+            bloom = BloomFilter(
+                math.ceil(slugs.count() * self.HEADROOM) + 1024, self.error_rate
+            )
+            for slug in slugs.iterator():
+                bloom.add(slug)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+                # If the filter was cleared whilst building, it may already be stale
+                if bloom is not None and generation == self._generation:
+                    for slug in self._pending:
+                        bloom.add(slug)
+                    self._bloom = bloom
+                    self._removed = 0
+
+                    logger.info(
+                        "Built slug filter with %d slugs (%d bytes, %.4f%% false positives)",
+                        len(bloom),
+                        bloom.memory_footprint,
+                        bloom.false_positive_rate * 100,
+                    )
+
+                self._pending = []
+
+
+redirect_cache: RedirectCache[SlugRedirects] = RedirectCache(
+    maxsize=settings.REDIRECT_CACHE_SIZE, ttl=settings.REDIRECT_CACHE_TTL
+)
+register(redirect_cache)
+
+slug_filter = SlugFilter(
+    error_rate=settings.REDIRECT_SLUG_FILTER_ERROR_RATE,
+    enabled=settings.REDIRECT_SLUG_FILTER,
+    # Tests need the filter built before the response
+    background=not settings.TEST,
+)
+register(slug_filter)
+
+redirect_snapshot = SnapshotReader(
+    path=settings.REDIRECT_SNAPSHOT_PATH,
+    check_interval=settings.REDIRECT_SNAPSHOT_CHECK_INTERVAL,
+    # Tests need the snapshot checked before the response
+    background=not settings.TEST,
+)
+register(redirect_snapshot)
+
+lookup_redirect = RedirectLookup()
+
+
+def _get_cached_redirects(slug: str) -> SlugRedirects | None:
+    ensure_listening()
+
+    if (redirects := redirect_cache.get(slug)) is not None:
+        return redirects
+
+    if slug not in slug_filter:
+        raise Http404
+
+    return None
+
+
+def _get_snapshot_redirects(slug: str) -> SlugRedirects | None:
+    """
+    Look up a slug's redirects in the compiled snapshot, if it's usable.
+
+    Returns `None` if the redirects need looking up in the database.
+    """
+    if (snapshot := redirect_snapshot.get_snapshot(slug)) is None:
+        return None
+
+    if not (records := snapshot.get(slug)):
+        # The snapshot contains every enabled redirect
+        raise Http404
+
+    return SlugRedirects(
+        (record.host, CachedRedirect(*record)) for record in records
+    )
+
+
+def _resolve(redirects: SlugRedirects, host: str) -> CachedRedirect:
+    # Scheduled redirects are checked against the cached times, rather than
+    # waiting for `expire_redirects` to disable them
+    if (redirect := redirects.resolve(host, time.time())) is None:
+        raise Http404
+    return redirect
+
+
+def _cache_redirects(slug: str, redirects: SlugRedirects) -> None:
+    # Responses are prepared once per cached redirect, rather than per request
+    redirects.prepare_responses()
+    redirect_cache.set(slug, redirects, ttl=redirects.get_ttl(time.time()))
+
+
+def _redirect_not_found() -> Http404:
+    # Unknown slugs are likely to be requested again, so make sure the filter
+    # will be available to reject them.
+    if not slug_filter.is_ready:
+        slug_filter.schedule_rebuild()
+    return Http404()
+
+
+def get_redirect(slug: str, host: str = "") -> CachedRedirect:
+    """
+    Get the enabled and active redirect for a slug on `host` (or only
+    redirects served on every host, if blank), using the cache or compiled
+    snapshot if possible.
+    """
+    if (redirects := _get_cached_redirects(slug)) is not None:
+        return _resolve(redirects, host)
+
+    if redirect_snapshot.needs_refresh:
+        redirect_snapshot.refresh()
+
+    if (redirects := _get_snapshot_redirects(slug)) is not None:
+        return _resolve(redirects, host)
+
+    if (redirects := lookup_redirect(slug)) is None:
+        raise _redirect_not_found()
+
+    _cache_redirects(slug, redirects)
+    return _resolve(redirects, host)
+
+
+async def aget_redirect(slug: str, host: str = "") -> CachedRedirect:
+    """
+    Async version of `get_redirect`.
+    """
+    if (redirects := _get_cached_redirects(slug)) is not None:
+        return _resolve(redirects, host)
+
+    if redirect_snapshot.needs_refresh:
+        await sync_to_async(redirect_snapshot.refresh)()
+
+    if (redirects := _get_snapshot_redirects(slug)) is not None:
+        return _resolve(redirects, host)
+
+    if (redirects := await sync_to_async(lookup_redirect)(slug)) is None:
+        raise await sync_to_async(_redirect_not_found)()
+
+    _cache_redirects(slug, redirects)
+    return _resolve(redirects, host)
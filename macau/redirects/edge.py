@@ -0,0 +1,328 @@
+"""
+Export redirects as maps for reverse proxies, so they can be served at the edge
+without reaching Macau.
+
+Only enabled redirects without basic auth, a host or a schedule are exported,
+and only for slugs which have no host-specific redirects.
+Macau still serves everything else, so proxies should pass requests which don't
+match through.
+
+Each proxy sends the same `X-Robots-Tag` and `Cache-Control` headers with
+redirects as Macau does.
+
+- nginx: Include the map (in the `http` block), then in the `server` block:
+
+      add_header X-Robots-Tag $macau_redirect_robots_tag;
+      add_header Cache-Control $macau_redirect_cache_control;
+      if ($macau_permanent_redirect) { return 308 $macau_permanent_redirect; }
+      if ($macau_temporary_redirect) { return 307 $macau_temporary_redirect; }
+
+  The headers are only added (when their value isn't empty) to redirects.
+  nginx matches map keys case-insensitively, so each value starts with the
+  path, which is compared case-sensitively. Slugs which only differ from an
+  earlier one by case would conflict, so they're left out.
+
+  Large maps may need a larger `map_hash_max_size` and `map_hash_bucket_size`.
+- HAProxy: Values are the status code, then the destination:
+
+      http-request set-var(txn.macau) path,map(/etc/haproxy/macau.map)
+      http-request redirect code 308 location %[var(txn.macau),bytes(4)] if { var(txn.macau) -m beg 308 }
+      http-request redirect code 307 location %[var(txn.macau),bytes(4)] if { var(txn.macau) -m beg 307 }
+      http-after-response set-header X-Robots-Tag noindex if { var(txn.macau) -m beg 30 }
+      http-after-response set-header Cache-Control "max-age=0, no-cache, no-store, must-revalidate, private" if { var(txn.macau) -m beg 30 }
+
+- Caddy: `import` the file in a site block.
+"""
+
+import filecmp
+import logging
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+from collections.abc import Iterator
+from threading import Lock, Timer
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import QuerySet
+from django.db.models.functions import Lower
+
+from .models import PREFIX_SUFFIX, Redirect
+
+logger = logging.getLogger(__name__)
+
+EDGE_MAP_FORMATS = ["nginx", "haproxy", "caddy"]
+
+# Characters which can't be safely written to every format, eg because they
+# would be interpreted as variables
+UNSAFE_CHARACTERS = re.compile(r'[\s"\\${}\x00-\x1f\x7f]')
+
+HEADER = "# Generated by Macau (`./manage.py export_edge_map`). Don't edit.\n"
+
+# Matches `add_never_cache_headers`
+CACHE_CONTROL = "max-age=0, no-cache, no-store, must-revalidate, private"
+
+
+class EdgeMapStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.skipped: list[str] = []
+
+
+class EdgeMapResult(NamedTuple):
+    written: int
+    skipped: int
+    changed: bool
+
+
+def get_edge_queryset() -> QuerySet[Redirect]:
+    """
+    Redirects which can be served by a proxy.
+    """
+    return (
+        Redirect.objects.filter(
+            is_enabled=True,
+            basic_auth_password="",
+            host="",
+            active_from=None,
+            expires_at=None,
+        )
+        .exclude(slug__endswith=PREFIX_SUFFIX)
+        # Host-specific redirects take priority, and proxies don't match on host
+        .exclude(slug__in=Redirect.objects.exclude(host="").values("slug"))
+        .order_by("slug")
+    )
+
+
+def _iter_rows(
+    queryset: QuerySet[Redirect],
+    chunk_size: int,
+    stats: EdgeMapStats,
+    case_insensitive: bool = False,
+) -> Iterator[tuple[str, str, bool]]:
+    if case_insensitive:
+        # Slugs which only differ by case are next to each other
+        queryset = queryset.order_by(Lower("slug"), "slug")
+
+    previous_slug = None
+    for slug, destination, is_permanent in queryset.values_list(
+        "slug", "destination", "is_permanent"
+    ).iterator(chunk_size=chunk_size):
+        if UNSAFE_CHARACTERS.search(slug) or UNSAFE_CHARACTERS.search(destination):
+            stats.skipped.append(slug)
+            continue
+
+        if case_insensitive:
+            if slug.lower() == previous_slug:
+                stats.skipped.append(slug)
+                continue
+            previous_slug = slug.lower()
+
+        stats.count += 1
+        yield slug, destination, is_permanent
+
+
+def _paths(slug: str) -> tuple[str, str]:
+    # Slugs are served with an optional trailing slash
+    return f"/{slug}", f"/{slug}/"
+
+
+def iter_edge_map(
+    queryset: QuerySet[Redirect],
+    map_format: str,
+    chunk_size: int = 2000,
+    stats: EdgeMapStats | None = None,
+) -> Iterator[str]:
+    """
+    Render redirects as a map for a proxy, yielding the output in chunks.
+
+    Redirects which can't be safely written are left out, and their slugs
+    recorded in `stats`.
+    """
+    if map_format not in EDGE_MAP_FORMATS:
+        raise ValueError(f"Unknown format {map_format!r}")
+
+    if stats is None:
+        stats = EdgeMapStats()
+
+    buffer: list[str] = [HEADER]
+
+    match map_format:
+        case "nginx":
+            buffer.append("map $uri $macau_redirect {\n")
+            for slug, destination, is_permanent in _iter_rows(
+                queryset, chunk_size, stats, case_insensitive=True
+            ):
+                code = 308 if is_permanent else 307
+                buffer.extend(
+                    f'    "{path}" "{path} {code} {destination}";\n'
+                    for path in _paths(slug)
+                )
+                if len(buffer) >= chunk_size:
+                    yield "".join(buffer)
+                    buffer.clear()
+            buffer.append("}\n")
+
+            # Keys match case-insensitively, so check the path matches exactly.
+            # `return` needs a literal status code, so each gets its own map.
+            for code, variable in [
+                (308, "macau_permanent_redirect"),
+                (307, "macau_temporary_redirect"),
+            ]:
+                buffer.append(
+                    f'map "$uri $macau_redirect" ${variable} {{\n'
+                    f'    "~^(\\S+) \\1 {code} (.+)$" $2;\n'
+                    "}\n"
+                )
+
+            # Empty headers aren't added, so these are only sent with redirects
+            for header, variable in [
+                ("noindex", "macau_redirect_robots_tag"),
+                (CACHE_CONTROL, "macau_redirect_cache_control"),
+            ]:
+                buffer.append(
+                    "map $macau_permanent_redirect$macau_temporary_redirect "
+                    f'${variable} {{\n    "~." "{header}";\n}}\n'
+                )
+
+        case "haproxy":
+            for slug, destination, is_permanent in _iter_rows(
+                queryset, chunk_size, stats
+            ):
+                code = 308 if is_permanent else 307
+                buffer.extend(f"{path} {code} {destination}\n" for path in _paths(slug))
+                if len(buffer) >= chunk_size:
+                    yield "".join(buffer)
+                    buffer.clear()
+
+        case "caddy":
+            buffer.append("map {path} {macau_redirect} {macau_redirect_status} {\n")
+            for slug, destination, is_permanent in _iter_rows(
+                queryset, chunk_size, stats
+            ):
+                status = "permanent" if is_permanent else "temporary"
+                buffer.extend(
+                    f'    {path} "{destination}" {status}\n' for path in _paths(slug)
+                )
+                if len(buffer) >= chunk_size:
+                    yield "".join(buffer)
+                    buffer.clear()
+            buffer.append("}\n")
+
+            for status, code in [("permanent", 308), ("temporary", 307)]:
+                matcher = f"@macau_{status}_redirect"
+                buffer.append(
+                    f"{matcher} vars {{macau_redirect_status}} {status}\n"
+                    f"header {matcher} X-Robots-Tag noindex\n"
+                    f'header {matcher} Cache-Control "{CACHE_CONTROL}"\n'
+                    f"redir {matcher} {{macau_redirect}} {code}\n"
+                )
+
+    yield "".join(buffer)
+
+
+def write_edge_map(path: str, map_format: str, chunk_size: int = 2000) -> EdgeMapResult:
+    """
+    Write a map for a proxy to `path`.
+
+    The map is streamed to a temporary file alongside `path`, then renamed, so
+    proxies never see a partially written file. If nothing has changed, `path`
+    isn't touched.
+    """
+    stats = EdgeMapStats()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".map.tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(
+                iter_edge_map(get_edge_queryset(), map_format, chunk_size, stats)
+            )
+            f.flush()
+            os.fsync(f.fileno())
+
+        if os.path.exists(path) and filecmp.cmp(temp_path, path, shallow=False):
+            os.unlink(temp_path)
+            changed = False
+        else:
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+            changed = True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    return EdgeMapResult(
+        written=stats.count, skipped=len(stats.skipped), changed=changed
+    )
+
+
+class EdgeMapRegenerator:
+    """
+    Regenerate the edge map in the background, shortly after redirects change.
+
+    Changes within `DELAY` seconds are batched into a single regeneration. If
+    the map changed, `reload_command` is run, so the proxy picks it up.
+    """
+
+    DELAY = 1.0
+
+    def __init__(
+        self, path: str, map_format: str, enabled: bool, reload_command: str = ""
+    ) -> None:
+        self.path = path
+        self.map_format = map_format
+        self.enabled = enabled and bool(path)
+        self.reload_command = reload_command
+        self._timer: Timer | None = None
+        self._lock = Lock()
+
+    def schedule(self) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = Timer(self.DELAY, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self) -> None:
+        # Changes from now on need another regeneration
+        with self._lock:
+            self._timer = None
+
+        try:
+            self.regenerate()
+        except Exception:
+            logger.exception("Unable to regenerate edge map %s", self.path)
+        finally:
+            connection.close()
+
+    def regenerate(self) -> EdgeMapResult:
+        result = write_edge_map(self.path, self.map_format)
+        logger.info(
+            "Regenerated edge map %s with %d redirects (%d skipped)",
+            self.path,
+            result.written,
+            result.skipped,
+        )
+
+        if result.changed and self.reload_command:
+            subprocess.run(  # noqa: S603
+                shlex.split(self.reload_command), check=True, timeout=60
+            )
+
+        return result
+
+
+edge_map_regenerator = EdgeMapRegenerator(
+    path=settings.REDIRECT_EDGE_MAP_PATH,
+    map_format=settings.REDIRECT_EDGE_MAP_FORMAT,
+    enabled=settings.REDIRECT_EDGE_MAP_AUTO_REGENERATE,
+    reload_command=settings.REDIRECT_EDGE_MAP_RELOAD_COMMAND,
+)
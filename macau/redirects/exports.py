@@ -0,0 +1,104 @@
+import csv
+import json
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any
+
+from django.db.models import QuerySet
+
+from .models import Redirect
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "jsonl": "application/jsonl",
+}
+
+
+def get_export_fields() -> list[str]:
+    # IDs are specific to each database, so redirects are identified by their
+    # slug and host instead
+    return [
+        field.name for field in Redirect._meta.concrete_fields if not field.primary_key
+    ]
+
+
+class _Echo:
+    """
+    A file-like object which returns what's written, rather than storing it.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _to_csv(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    return _to_json(value)
+
+
+def iter_export(
+    queryset: QuerySet[Redirect], export_format: str, chunk_size: int = 2000
+) -> Iterator[str]:
+    """
+    Export redirects, yielding the output in chunks.
+
+    Rows are read with a server-side cursor (where supported) and never
+    converted to model instances, so memory use doesn't grow with the number
+    of redirects.
+    """
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise ValueError(f"Unknown format {export_format!r}")
+
+    fields = get_export_fields()
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+    buffer: list[str] = []
+
+    match export_format:
+        case "csv":
+            writer = csv.writer(_Echo())
+            yield writer.writerow(fields)
+
+            for row in rows:
+                buffer.append(writer.writerow([_to_csv(value) for value in row]))
+                if len(buffer) >= chunk_size:
+                    yield "".join(buffer)
+                    buffer.clear()
+
+        case "json" | "jsonl":
+            is_jsonl = export_format == "jsonl"
+            separator = "\n" if is_jsonl else ",\n"
+
+            if not is_jsonl:
+                yield "["
+
+            is_first = True
+            for row in rows:
+                record = json.dumps(
+                    {
+                        field: _to_json(value)
+                        for field, value in zip(fields, row, strict=True)
+                    }
+                )
+                if is_jsonl:
+                    buffer.append(record + separator)
+                else:
+                    buffer.append(record if is_first else separator + record)
+                    is_first = False
+
+                if len(buffer) >= chunk_size:
+                    yield "".join(buffer)
+                    buffer.clear()
+
+    yield "".join(buffer)
+
+    if export_format == "json":
+        yield "]"
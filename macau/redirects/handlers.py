@@ -0,0 +1,69 @@
+import re
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+WSGIApplication = Callable[[dict, Callable], Iterable[bytes]]
+
+
+class FastPathMiddlewareMixin:
+    """
+    Load `REDIRECT_FAST_PATH_MIDDLEWARE` rather than the full `MIDDLEWARE`.
+
+    Only synchronous middleware using `process_request` / `process_response` are
+    supported, since that's all redirects need.
+    """
+
+    _view_middleware: list
+    _template_response_middleware: list
+    _exception_middleware: list
+    _middleware_chain: Callable | None
+    _get_response: Callable
+
+    def load_middleware(self, is_async: bool = False) -> None:
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(settings.REDIRECT_FAST_PATH_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            handler = convert_exception_to_response(middleware(handler))
+
+        self._middleware_chain = handler
+
+
+class FastPathHandler(FastPathMiddlewareMixin, WSGIHandler):
+    pass
+
+
+class RedirectDispatcher:
+    """
+    Send public redirect (and QR code) requests through a slim handler, and
+    everything else through the full Django stack.
+    """
+
+    PATH_RE = re.compile(r"^/[-a-zA-Z0-9_]+(/|\.svg|\.png)?$")
+
+    # Other methods may need CSRF protection
+    METHODS = frozenset({"GET", "HEAD"})
+
+    def __init__(
+        self, application: WSGIApplication, fast_application: WSGIApplication
+    ) -> None:
+        self.application = application
+        self.fast_application = fast_application
+
+    def is_fast_path(self, environ: dict) -> bool:
+        return environ.get("REQUEST_METHOD") in self.METHODS and bool(
+            self.PATH_RE.match(environ.get("PATH_INFO", ""))
+        )
+
+    def __call__(self, environ: dict, start_response: Callable) -> Any:
+        if self.is_fast_path(environ):
+            return self.fast_application(environ, start_response)
+        return self.application(environ, start_response)
@@ -0,0 +1,201 @@
+import csv
+import json
+import time
+from collections.abc import Iterable, Iterator
+from functools import partial
+from itertools import islice
+from typing import IO, Any, NamedTuple
+
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Redirect
+from .signals import invalidate_saved_redirects
+
+IMPORT_FORMATS = ["csv", "json", "jsonl"]
+
+# Fields which can be imported. Everything else (eg `created_at`) is ignored.
+IMPORT_FIELDS = [
+    "slug",
+    "host",
+    "is_enabled",
+    "destination",
+    "is_permanent",
+    "basic_auth_username",
+    "basic_auth_password",
+    "active_from",
+    "expires_at",
+]
+
+# Fields identifying an existing redirect
+KEY_FIELDS = ["slug", "host"]
+
+# Fields overwritten when an existing redirect is imported
+UPDATE_FIELDS = [field for field in IMPORT_FIELDS if field not in KEY_FIELDS] + [
+    "modified_at"
+]
+
+
+class RejectedRow(NamedTuple):
+    row: int
+    errors: dict[str, list[str]]
+
+
+class ImportResult:
+    def __init__(self) -> None:
+        self.imported = 0
+        self.rejected: list[RejectedRow] = []
+        self.duration = 0.0
+
+    @property
+    def rate(self) -> float:
+        """
+        Rows processed per second.
+        """
+        total = self.imported + len(self.rejected)
+        return total / self.duration if self.duration else 0.0
+
+
+def iter_records(file: IO[str], import_format: str) -> Iterator[dict[str, Any]]:
+    """
+    Read records from a file.
+
+    CSV and JSONL are read incrementally. JSON arrays must be parsed all at
+    once, so prefer JSONL for large files.
+    """
+    match import_format:
+        case "csv":
+            yield from csv.DictReader(file)
+        case "jsonl":
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        case "json":
+            yield from json.load(file)
+        case _:
+            raise ValueError(f"Unknown format {import_format!r}")
+
+
+def build_redirect(record: Any) -> Redirect:
+    """
+    Create a validated (but unsaved) redirect from a record.
+
+    Uniqueness isn't checked, since existing redirects are updated.
+    """
+    # JSON records could be any value
+    if not isinstance(record, dict):
+        raise ValidationError({NON_FIELD_ERRORS: ["Expected an object."]})
+
+    values = {field: record[field] for field in IMPORT_FIELDS if field in record}
+
+    # CSV can't distinguish empty values from null
+    for field in ["active_from", "expires_at"]:
+        if values.get(field) == "":
+            values[field] = None
+
+    redirect = Redirect(**values)
+    redirect.full_clean(validate_unique=False, validate_constraints=False)
+    return redirect
+
+
+def _copy_upsert(redirects: list[Redirect]) -> None:
+    """
+    Upsert redirects by `COPY`ing them into a staging table, which is much
+    faster than a large `INSERT` on PostgreSQL.
+    """
+    opts = Redirect._meta
+    qn = connection.ops.quote_name
+
+    table = qn(opts.db_table)
+    staging_table = qn(f"{opts.db_table}_import")
+
+    # Fields have no custom column names, so they can be used directly
+    column_list = ", ".join(
+        qn(field) for field in [*IMPORT_FIELDS, "created_at", "modified_at"]
+    )
+    updates = ", ".join(
+        f"{qn(field)} = EXCLUDED.{qn(field)}" for field in UPDATE_FIELDS
+    )
+
+    now = timezone.now()
+
+    with connection.cursor() as cursor:
+        # `id` isn't copied, so must be generated in the staging table too
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} "
+            f"(LIKE {table} INCLUDING DEFAULTS INCLUDING IDENTITY) ON COMMIT DELETE ROWS"
+        )
+
+        with cursor.cursor.copy(
+            f"COPY {staging_table} ({column_list}) FROM STDIN"
+        ) as copy:
+            for redirect in redirects:
+                copy.write_row(
+                    [getattr(redirect, field) for field in IMPORT_FIELDS] + [now, now]
+                )
+
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging_table} "
+            f"ON CONFLICT ({', '.join(map(qn, KEY_FIELDS))}) DO UPDATE SET {updates}"
+        )
+
+
+def upsert_redirects(redirects: Iterable[Redirect]) -> int:
+    """
+    Create or update redirects in bulk, bypassing model signals.
+
+    Must be called inside a transaction. Returns the number of redirects written.
+    """
+    # A row can't be upserted twice in the same statement, so the last one wins
+    unique_redirects = list(
+        {(redirect.slug, redirect.host): redirect for redirect in redirects}.values()
+    )
+
+    if not unique_redirects:
+        return 0
+
+    if connection.vendor == "postgresql":
+        _copy_upsert(unique_redirects)
+    else:
+        Redirect.objects.bulk_create(
+            unique_redirects,
+            update_conflicts=True,
+            unique_fields=KEY_FIELDS,
+            update_fields=UPDATE_FIELDS,
+        )
+
+    transaction.on_commit(partial(invalidate_saved_redirects, unique_redirects))
+
+    return len(unique_redirects)
+
+
+def import_redirects(
+    records: Iterable[dict[str, Any]], batch_size: int = 1000
+) -> Iterator[ImportResult]:
+    """
+    Validate and upsert records in batches, each in its own transaction.
+
+    Invalid rows are rejected, without affecting the rest of their batch. The
+    (cumulative) result is yielded after each batch, so progress can be
+    reported.
+    """
+    result = ImportResult()
+    start = time.perf_counter()
+
+    rows = enumerate(records, start=1)
+
+    while batch := list(islice(rows, batch_size)):
+        redirects = []
+
+        for row, record in batch:
+            try:
+                redirects.append(build_redirect(record))
+            except ValidationError as e:
+                result.rejected.append(RejectedRow(row, e.message_dict))
+
+        with transaction.atomic():
+            result.imported += upsert_redirects(redirects)
+
+        result.duration = time.perf_counter() - start
+        yield result
@@ -0,0 +1,211 @@
+"""
+Propagate redirect changes between worker processes.
+
+Each worker keeps its own redirect cache, and model signals only fire in the
+process which made the change. To keep other workers up to date, a background
+thread watches the database for changes:
+
+- PostgreSQL: Writes send a `NOTIFY` containing the slug, which every worker
+  `LISTEN`s for.
+- SQLite: `PRAGMA data_version` is polled on a dedicated connection, and the
+  cache cleared whenever another connection commits a change.
+"""
+
+import logging
+import os
+import sqlite3
+from collections.abc import Sequence
+from threading import Event, Lock, Thread
+from typing import Protocol
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "macau_redirects"
+
+
+def notify_redirect_changed(slug: str = "") -> None:
+    """
+    Tell other workers a redirect has changed.
+
+    An empty slug means any redirect may have changed. The notification is only
+    delivered once the current transaction commits.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, slug])
+
+
+def notify_redirects_changed(slugs: Sequence[str]) -> None:
+    """
+    Tell other workers several redirects have changed, in a single query.
+    """
+    if slugs and connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, slug) FROM unnest(%s::text[]) AS slug",
+                [NOTIFY_CHANNEL, list(slugs)],
+            )
+
+
+class Invalidatable(Protocol):
+    def invalidate(self, slug: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class InvalidationListener(Thread):
+    def __init__(self, caches: Sequence[Invalidatable]) -> None:
+        super().__init__(name=self.__class__.__name__, daemon=True)
+        self.caches = caches
+        self.stopped = Event()
+
+    def invalidate(self, slug: str) -> None:
+        for cache in self.caches:
+            cache.invalidate(slug)
+
+    def clear(self) -> None:
+        for cache in self.caches:
+            cache.clear()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+class PostgresListener(InvalidationListener):
+    RETRY_INTERVAL = 5
+
+    def __init__(
+        self, caches: Sequence[Invalidatable], connection_params: dict
+    ) -> None:
+        super().__init__(caches)
+        self.connection_params = connection_params
+
+    def run(self) -> None:
+        import psycopg
+
+        while not self.stopped.is_set():
+            try:
+                with psycopg.connect(**self.connection_params, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+                    # Changes may have been missed whilst not listening
+                    self.clear()
+
+                    for notify in conn.notifies():
+                        if notify.payload:
+                            self.invalidate(notify.payload)
+                        else:
+                            self.clear()
+
+                        if self.stopped.is_set():
+                            break
+            except psycopg.Error:
+                logger.exception("Redirect invalidation listener disconnected")
+
+            # Without a listener, cached redirects can't be trusted
+            self.clear()
+            self.stopped.wait(self.RETRY_INTERVAL)
+
+
+class SqliteListener(InvalidationListener):
+    def __init__(
+        self, caches: Sequence[Invalidatable], database_path: str, interval: float
+    ) -> None:
+        super().__init__(caches)
+        self.database_path = database_path
+        self.interval = interval
+        self._data_version: int | None = None
+        self._conn: sqlite3.Connection | None = None
+
+    def poll(self) -> bool:
+        """
+        Clear the cache if the database has changed since the last poll.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+        changed = self._data_version is not None and data_version != self._data_version
+        self._data_version = data_version
+
+        if changed:
+            self.clear()
+
+        return changed
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except sqlite3.Error:
+                logger.exception("Failed to poll for redirect changes")
+                self.clear()
+                self._conn = None
+                self._data_version = None
+
+            self.stopped.wait(self.interval)
+
+        if self._conn is not None:
+            self._conn.close()
+
+
+# Caches which should be invalidated when redirects change
+registered_caches: list[Invalidatable] = []
+
+_listener: InvalidationListener | None = None
+_listener_pid: int | None = None
+_listener_lock = Lock()
+
+
+def get_listener(
+    caches: Sequence[Invalidatable],
+) -> InvalidationListener | None:
+    match connection.vendor:
+        case "postgresql":
+            connection_params = connection.get_connection_params()
+            connection_params.pop("cursor_factory", None)
+            connection_params.pop("context", None)
+            return PostgresListener(caches, connection_params)
+        case "sqlite":
+            return SqliteListener(
+                caches,
+                str(connection.settings_dict["NAME"]),
+                settings.REDIRECT_CACHE_POLL_INTERVAL,
+            )
+    return None
+
+
+def register(cache: Invalidatable) -> None:
+    registered_caches.append(cache)
+
+
+def ensure_listening() -> None:
+    """
+    Start the invalidation listener for this process, if it isn't running.
+    """
+    global _listener, _listener_pid
+
+    if not settings.REDIRECT_CACHE_INVALIDATION:
+        return
+
+    pid = os.getpid()
+
+    # Fast path, avoiding the lock
+    if _listener_pid == pid:
+        return
+
+    with _listener_lock:
+        # Threads don't survive a fork, so a new listener is needed per process
+        if _listener_pid == pid:
+            return
+
+        _listener = get_listener(registered_caches)
+
+        if _listener is not None:
+            _listener.start()
+
+        _listener_pid = pid
@@ -0,0 +1,47 @@
+import os
+import time
+from argparse import ArgumentParser
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from macau.redirects.cache import LOOKUP_FIELDS, CachedRedirect
+from macau.redirects.models import Redirect
+from macau.redirects.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Compile enabled redirects into a snapshot, shared between workers"
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="File to write to (default: REDIRECT_SNAPSHOT_PATH)",
+            default=settings.REDIRECT_SNAPSHOT_PATH,
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args: Any, output: str, chunk_size: int, **options: Any) -> None:
+        if not output:
+            raise CommandError("Set REDIRECT_SNAPSHOT_PATH, or pass --output")
+
+        # Redirects modified whilst compiling are treated as changed since
+        compiled_at = time.time()
+
+        rows = (
+            Redirect.objects.filter(is_enabled=True)
+            .values_list("slug", *LOOKUP_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+        count = write_snapshot(
+            output,
+            # Prepared responses aren't stored
+            ((slug, CachedRedirect.from_row(*values)[:-1]) for slug, *values in rows),
+            compiled_at,
+        )
+
+        self.stdout.write(
+            f"Compiled {count} redirects to {output} ({os.path.getsize(output)} bytes)"
+        )
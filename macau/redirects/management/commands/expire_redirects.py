@@ -0,0 +1,41 @@
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from macau.redirects.models import Redirect
+from macau.redirects.signals import invalidate_saved_redirects
+
+
+class Command(BaseCommand):
+    help = "Disable redirects which have expired"
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args: Any, batch_size: int, **options: Any) -> None:
+        # Redirects expiring whilst sweeping are left for the next run
+        now = timezone.now()
+        expired = Redirect.objects.filter(is_enabled=True, expires_at__lte=now)
+
+        count = 0
+        while True:
+            with transaction.atomic():
+                redirects = list(expired.only("slug", "host")[:batch_size])
+                if not redirects:
+                    break
+
+                # `modified_at` is updated, so compiled snapshots notice
+                Redirect.objects.filter(
+                    pk__in=[redirect.pk for redirect in redirects]
+                ).update(is_enabled=False, modified_at=timezone.now())
+
+                for redirect in redirects:
+                    redirect.is_enabled = False
+                invalidate_saved_redirects(redirects)
+
+            count += len(redirects)
+
+        self.stdout.write(f"Disabled {count} expired redirects")
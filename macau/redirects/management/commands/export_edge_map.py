@@ -0,0 +1,64 @@
+from argparse import ArgumentParser
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from macau.redirects.edge import (
+    EDGE_MAP_FORMATS,
+    EdgeMapStats,
+    get_edge_queryset,
+    iter_edge_map,
+    write_edge_map,
+)
+
+
+class Command(BaseCommand):
+    help = "Export redirects as a map for a reverse proxy, to serve them at the edge"
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--format",
+            choices=EDGE_MAP_FORMATS,
+            default=settings.REDIRECT_EDGE_MAP_FORMAT,
+            dest="map_format",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="File to write to, or - for stdout (default: REDIRECT_EDGE_MAP_PATH)",
+            default=settings.REDIRECT_EDGE_MAP_PATH,
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(
+        self,
+        *args: Any,
+        map_format: str,
+        output: str,
+        chunk_size: int,
+        **options: Any,
+    ) -> None:
+        if not output:
+            raise CommandError("Set REDIRECT_EDGE_MAP_PATH, or pass --output")
+
+        if output == "-":
+            stats = EdgeMapStats()
+            for chunk in iter_edge_map(
+                get_edge_queryset(), map_format, chunk_size, stats
+            ):
+                self.stdout.write(chunk, ending="")
+            self.stdout.flush()
+            skipped = len(stats.skipped)
+        else:
+            result = write_edge_map(output, map_format, chunk_size)
+            skipped = result.skipped
+            if result.changed:
+                self.stdout.write(f"Wrote {result.written} redirects to {output}")
+            else:
+                self.stdout.write(f"{output} is already up to date")
+
+        if skipped:
+            self.stderr.write(
+                f"Skipped {skipped} redirects which can't be written to a {map_format} map"
+            )
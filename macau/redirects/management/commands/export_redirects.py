@@ -0,0 +1,49 @@
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from macau.redirects.exports import EXPORT_CONTENT_TYPES, iter_export
+from macau.redirects.models import Redirect
+
+
+class Command(BaseCommand):
+    help = "Export redirects, without loading them all into memory"
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--format",
+            choices=list(EXPORT_CONTENT_TYPES.keys()),
+            default="csv",
+            dest="export_format",
+        )
+        parser.add_argument(
+            "--output", "-o", help="File to write to (default: stdout)", default="-"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--enabled-only", action="store_true", help="Only export enabled redirects"
+        )
+
+    def handle(
+        self,
+        *args: Any,
+        export_format: str,
+        output: str,
+        chunk_size: int,
+        enabled_only: bool,
+        **options: Any,
+    ) -> None:
+        queryset = Redirect.objects.order_by("slug")
+        if enabled_only:
+            queryset = queryset.filter(is_enabled=True)
+
+        chunks = iter_export(queryset, export_format, chunk_size=chunk_size)
+
+        if output == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            self.stdout.flush()
+        else:
+            with open(output, "w", newline="", encoding="utf-8") as f:
+                f.writelines(chunks)
@@ -0,0 +1,76 @@
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import IO, Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from macau.redirects.imports import (
+    IMPORT_FORMATS,
+    ImportResult,
+    import_redirects,
+    iter_records,
+)
+
+
+class Command(BaseCommand):
+    help = "Create or update redirects in bulk"
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("file", help="File to read from, or '-' for stdin")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            dest="import_format",
+            help="Format of the file (default: from its extension)",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(
+        self,
+        *args: Any,
+        file: str,
+        import_format: str | None,
+        batch_size: int,
+        **options: Any,
+    ) -> None:
+        if import_format is None:
+            import_format = Path(file).suffix.lstrip(".").lower()
+            if import_format not in IMPORT_FORMATS:
+                raise CommandError("Unable to detect format, use --format")
+
+        verbosity = options["verbosity"]
+
+        if file == "-":
+            self._import(sys.stdin, import_format, batch_size, verbosity)
+        else:
+            with open(file, newline="", encoding="utf-8") as f:
+                self._import(f, import_format, batch_size, verbosity)
+
+    def _import(
+        self, file: IO[str], import_format: str, batch_size: int, verbosity: int
+    ) -> None:
+        result = ImportResult()
+        reported_rejections = 0
+
+        for result in import_redirects(
+            iter_records(file, import_format), batch_size=batch_size
+        ):
+            for rejected_row in result.rejected[reported_rejections:]:
+                for field, errors in rejected_row.errors.items():
+                    self.stderr.write(
+                        f"Row {rejected_row.row}: {field}: {' '.join(errors)}"
+                    )
+            reported_rejections = len(result.rejected)
+
+            if verbosity > 1:
+                self.stdout.write(
+                    f"Imported {result.imported} redirects ({result.rate:.0f} rows/s)"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.imported} redirects in {result.duration:.2f}s "
+                f"({result.rate:.0f} rows/s), rejected {len(result.rejected)}"
+            )
+        )
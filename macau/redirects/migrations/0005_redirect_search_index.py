@@ -0,0 +1,89 @@
+from django.db import DatabaseError, migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+
+# The SQL is copied here, rather than imported from `macau.redirects.search`, so
+# later changes to the search index don't change what this migration does.
+
+TRIGRAM_INDEXES = {
+    "redirects_redirect_slug_trgm": "slug",
+    "redirects_redirect_destination_trgm": "destination",
+}
+
+SQLITE_TRIGGERS = {
+    "redirects_redirect_search_insert": """
+        CREATE TRIGGER redirects_redirect_search_insert AFTER INSERT ON redirects_redirect BEGIN
+            INSERT INTO redirects_redirect_search(rowid, slug, destination)
+            VALUES (new.rowid, new.slug, new.destination);
+        END
+    """,
+    "redirects_redirect_search_delete": """
+        CREATE TRIGGER redirects_redirect_search_delete AFTER DELETE ON redirects_redirect BEGIN
+            INSERT INTO redirects_redirect_search(redirects_redirect_search, rowid, slug, destination)
+            VALUES ('delete', old.rowid, old.slug, old.destination);
+        END
+    """,
+    "redirects_redirect_search_update": """
+        CREATE TRIGGER redirects_redirect_search_update AFTER UPDATE OF slug, destination ON redirects_redirect BEGIN
+            INSERT INTO redirects_redirect_search(redirects_redirect_search, rowid, slug, destination)
+            VALUES ('delete', old.rowid, old.slug, old.destination);
+            INSERT INTO redirects_redirect_search(rowid, slug, destination)
+            VALUES (new.rowid, new.slug, new.destination);
+        END
+    """,
+}
+
+
+def forwards(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        match connection.vendor:
+            case "postgresql":
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for name, column in TRIGRAM_INDEXES.items():
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {name} ON redirects_redirect "
+                        f"USING gin (UPPER({column}) gin_trgm_ops)"
+                    )
+
+            case "sqlite":
+                try:
+                    cursor.execute(
+                        "CREATE VIRTUAL TABLE IF NOT EXISTS redirects_redirect_search "
+                        "USING fts5(slug, destination, content='redirects_redirect', tokenize='trigram')"
+                    )
+                except DatabaseError:
+                    # Searching falls back to scanning the table
+                    return
+
+                for sql in SQLITE_TRIGGERS.values():
+                    cursor.execute(sql)
+
+                cursor.execute(
+                    "INSERT INTO redirects_redirect_search(redirects_redirect_search) "
+                    "VALUES ('rebuild')"
+                )
+
+
+def backwards(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        match connection.vendor:
+            case "postgresql":
+                for name in TRIGRAM_INDEXES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+            case "sqlite":
+                for name in SQLITE_TRIGGERS:
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute("DROP TABLE IF EXISTS redirects_redirect_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0004_slugcounter"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards, elidable=False),
+    ]
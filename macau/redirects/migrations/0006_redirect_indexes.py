@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0005_redirect_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_enabled", True)),
+                fields=[
+                    "slug",
+                    "destination",
+                    "is_permanent",
+                    "basic_auth_username",
+                    "basic_auth_password",
+                ],
+                name="redirect_enabled_lookup_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_enabled", False)),
+                fields=["slug"],
+                name="redirect_disabled_slug_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_permanent", True)),
+                fields=["slug"],
+                name="redirect_permanent_slug_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(fields=["created_at"], name="redirect_created_at_idx"),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0006_redirect_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(fields=["modified_at"], name="redirect_modified_at_idx"),
+        ),
+    ]
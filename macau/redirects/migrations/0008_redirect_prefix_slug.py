@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+from django.db import migrations
+
+import macau.redirects.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0007_redirect_modified_at_idx"),
+    ]
+
+    operations = [
+        # Only validation has changed, so the column doesn't need altering (which
+        # would rebuild the table on SQLite)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="redirect",
+                    name="slug",
+                    field=macau.redirects.models.RedirectSlugField(
+                        primary_key=True, serialize=False, verbose_name="slug"
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+import re
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0008_redirect_prefix_slug"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="redirect",
+            name="redirect_enabled_lookup_idx",
+        ),
+        migrations.AddField(
+            model_name="redirect",
+            name="host",
+            field=models.CharField(
+                blank=True,
+                help_text="Only serve this redirect on this host. Leave blank to serve it on every host.",
+                max_length=255,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        re.compile(
+                            "^[a-z0-9](?:[a-z0-9-]*[a-z0-9])?(?:\\.[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)*\\Z",
+                            2,
+                        ),
+                        "Enter a valid hostname, without a scheme or port.",
+                        "invalid",
+                    )
+                ],
+                verbose_name="host",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_enabled", True)),
+                fields=[
+                    "slug",
+                    "destination",
+                    "is_permanent",
+                    "basic_auth_username",
+                    "basic_auth_password",
+                    "host",
+                ],
+                name="redirect_enabled_lookup_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("host", ""), _negated=True),
+                fields=["host", "slug"],
+                name="redirect_host_slug_idx",
+            ),
+        ),
+    ]
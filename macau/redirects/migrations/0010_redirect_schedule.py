@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0009_redirect_host"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="redirect",
+            name="redirect_enabled_lookup_idx",
+        ),
+        migrations.AddField(
+            model_name="redirect",
+            name="active_from",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Don't serve this redirect before this time.",
+                null=True,
+                verbose_name="active from",
+            ),
+        ),
+        migrations.AddField(
+            model_name="redirect",
+            name="expires_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Stop serving this redirect at this time. Expired redirects are disabled by `./manage.py expire_redirects`.",
+                null=True,
+                verbose_name="expires at",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_enabled", True)),
+                fields=[
+                    "slug",
+                    "destination",
+                    "is_permanent",
+                    "basic_auth_username",
+                    "basic_auth_password",
+                    "host",
+                    "active_from",
+                    "expires_at",
+                ],
+                name="redirect_enabled_lookup_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", False), ("is_enabled", True)),
+                fields=["expires_at"],
+                name="redirect_expires_at_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+import macau.redirects.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0010_redirect_schedule"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="redirect",
+            name="redirect_enabled_lookup_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="redirect",
+            name="redirect_disabled_slug_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="redirect",
+            name="redirect_permanent_slug_idx",
+        ),
+        # The slug stops being the primary key before `id` replaces it, since a
+        # table can only have one
+        migrations.AlterField(
+            model_name="redirect",
+            name="slug",
+            field=macau.redirects.models.RedirectSlugField(
+                db_index=False, verbose_name="slug"
+            ),
+        ),
+        migrations.AddField(
+            model_name="redirect",
+            name="id",
+            field=models.BigAutoField(
+                auto_created=True,
+                primary_key=True,
+                serialize=False,
+                verbose_name="ID",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="redirect",
+            constraint=models.UniqueConstraint(
+                fields=("slug", "host"), name="redirect_slug_host_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_enabled", True)),
+                fields=[
+                    "slug",
+                    "host",
+                    "destination",
+                    "is_permanent",
+                    "basic_auth_username",
+                    "basic_auth_password",
+                    "active_from",
+                    "expires_at",
+                ],
+                name="redirect_enabled_lookup_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_enabled", False)),
+                fields=["slug", "host"],
+                name="redirect_disabled_slug_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="redirect",
+            index=models.Index(
+                condition=models.Q(("is_permanent", True)),
+                fields=["slug", "host"],
+                name="redirect_permanent_slug_idx",
+            ),
+        ),
+    ]
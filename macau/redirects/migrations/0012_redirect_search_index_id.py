@@ -0,0 +1,78 @@
+from django.db import DatabaseError, migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+
+# The SQLite search index was keyed by the implicit rowid, which `VACUUM` can
+# change, so is now keyed by `id` instead. PostgreSQL's indexes are unchanged.
+
+TRIGGERS = {
+    "redirects_redirect_search_insert": """
+        CREATE TRIGGER redirects_redirect_search_insert AFTER INSERT ON redirects_redirect BEGIN
+            INSERT INTO redirects_redirect_search(rowid, slug, destination)
+            VALUES (new.{key}, new.slug, new.destination);
+        END
+    """,
+    "redirects_redirect_search_delete": """
+        CREATE TRIGGER redirects_redirect_search_delete AFTER DELETE ON redirects_redirect BEGIN
+            INSERT INTO redirects_redirect_search(redirects_redirect_search, rowid, slug, destination)
+            VALUES ('delete', old.{key}, old.slug, old.destination);
+        END
+    """,
+    "redirects_redirect_search_update": """
+        CREATE TRIGGER redirects_redirect_search_update AFTER UPDATE OF slug, destination ON redirects_redirect BEGIN
+            INSERT INTO redirects_redirect_search(redirects_redirect_search, rowid, slug, destination)
+            VALUES ('delete', old.{key}, old.slug, old.destination);
+            INSERT INTO redirects_redirect_search(rowid, slug, destination)
+            VALUES (new.{key}, new.slug, new.destination);
+        END
+    """,
+}
+
+
+def _recreate_search_index(
+    schema_editor: BaseDatabaseSchemaEditor, content_rowid: str
+) -> None:
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute("DROP TABLE IF EXISTS redirects_redirect_search")
+
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE redirects_redirect_search USING fts5("
+                "slug, destination, content='redirects_redirect', "
+                f"content_rowid='{content_rowid}', tokenize='trigram')"
+            )
+        except DatabaseError:
+            # Searching falls back to scanning the table
+            return
+
+        for sql in TRIGGERS.values():
+            cursor.execute(sql.format(key=content_rowid))
+
+        cursor.execute(
+            "INSERT INTO redirects_redirect_search(redirects_redirect_search) "
+            "VALUES ('rebuild')"
+        )
+
+
+def forwards(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    _recreate_search_index(schema_editor, "id")
+
+
+def backwards(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    _recreate_search_index(schema_editor, "rowid")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("redirects", "0011_redirect_slug_host"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards, elidable=False),
+    ]
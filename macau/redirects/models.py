@@ -1,13 +1,89 @@
+import re
+from typing import Any
+
+from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator, validate_slug
 from django.db import models
 from django.urls import reverse
+from django.utils.regex_helper import _lazy_re_compile
 from django.utils.translation import gettext_lazy as _
 
+# Slugs ending with this are prefix redirects, matching every path under them
+PREFIX_SUFFIX = "/*"
+
+validate_prefix = RegexValidator(
+    # "-/" is reserved for Macau's own pages
+    _lazy_re_compile(r"^(?!-/)[-a-zA-Z0-9_]+(?:/[-a-zA-Z0-9_]+)*/\*\Z"),
+    _(
+        "Enter a valid prefix, consisting of slugs separated by slashes, and ending with /*."
+    ),
+    "invalid",
+)
+
+
+validate_host = RegexValidator(
+    _lazy_re_compile(
+        r"^[a-z0-9](?:[a-z0-9-]*[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)*\Z",
+        re.IGNORECASE,
+    ),
+    _("Enter a valid hostname, without a scheme or port."),
+    "invalid",
+)
+
+
+def validate_redirect_slug(value: str) -> None:
+    if value.endswith(PREFIX_SUFFIX):
+        validate_prefix(value)
+    else:
+        validate_slug(value)
+
+
+class RedirectSlugField(models.SlugField):
+    """
+    A slug, or a prefix (eg `docs/*`).
+    """
+
+    default_validators = [validate_redirect_slug]
+
+    def formfield(self, **kwargs: Any) -> Any:
+        # Skip `SlugField`'s form field, which only allows slugs
+        return models.CharField.formfield(self, **kwargs)
+
 
 class Redirect(models.Model):
-    slug = models.SlugField(_("slug"), primary_key=True)
+    # Indexed by `redirect_slug_host_unique`
+    slug = RedirectSlugField(_("slug"), db_index=False)
+
+    # Each host can have its own redirect for a slug, which takes priority over
+    # a redirect served on every host
+    host = models.CharField(
+        _("host"),
+        max_length=255,
+        blank=True,
+        validators=[validate_host],
+        help_text=_(
+            "Only serve this redirect on this host. Leave blank to serve it on every host."
+        ),
+    )
 
     is_enabled = models.BooleanField(_("enabled"), default=True)
 
+    # Scheduled redirects are only served between these times
+    active_from = models.DateTimeField(
+        _("active from"),
+        null=True,
+        blank=True,
+        help_text=_("Don't serve this redirect before this time."),
+    )
+    expires_at = models.DateTimeField(
+        _("expires at"),
+        null=True,
+        blank=True,
+        help_text=_(
+            "Stop serving this redirect at this time. Expired redirects are disabled by `./manage.py expire_redirects`."
+        ),
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
@@ -19,8 +95,102 @@ class Redirect(models.Model):
     basic_auth_username = models.CharField(max_length=64, blank=True)
     basic_auth_password = models.CharField(max_length=64, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["slug", "host"], name="redirect_slug_host_unique"
+            ),
+        ]
+        indexes = [
+            # Redirect lookups only need these columns, so can be answered from
+            # the index alone. SQLite doesn't support `INCLUDE`, so they're all
+            # part of the key.
+            models.Index(
+                fields=[
+                    "slug",
+                    "host",
+                    "destination",
+                    "is_permanent",
+                    "basic_auth_username",
+                    "basic_auth_password",
+                    "active_from",
+                    "expires_at",
+                ],
+                condition=models.Q(is_enabled=True),
+                name="redirect_enabled_lookup_idx",
+            ),
+            # Filtering the admin (ordered by slug) for the less common values.
+            # Otherwise, scanning the unique index finds matches quickly.
+            models.Index(
+                fields=["slug", "host"],
+                condition=models.Q(is_enabled=False),
+                name="redirect_disabled_slug_idx",
+            ),
+            models.Index(
+                fields=["slug", "host"],
+                condition=models.Q(is_permanent=True),
+                name="redirect_permanent_slug_idx",
+            ),
+            models.Index(fields=["created_at"], name="redirect_created_at_idx"),
+            # Finding redirects changed since a snapshot was compiled
+            models.Index(fields=["modified_at"], name="redirect_modified_at_idx"),
+            # Listing a host's redirects, by slug. Most redirects aren't
+            # restricted to a host, so they're left out.
+            models.Index(
+                fields=["host", "slug"],
+                condition=~models.Q(host=""),
+                name="redirect_host_slug_idx",
+            ),
+            # Finding enabled redirects which have expired
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(is_enabled=True, expires_at__isnull=False),
+                name="redirect_expires_at_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
+        if self.host:
+            return f"{self.host}/{self.slug}"
         return self.slug
 
     def get_absolute_url(self) -> str:
+        if self.is_prefix:
+            return "/" + self.slug.removesuffix("*")
         return reverse("redirects:redirect", args=[self.slug])
+
+    def clean(self) -> None:
+        # Matched against the request's host, which is case-insensitive
+        self.host = self.host.lower()
+
+        if self.basic_auth_username and not self.basic_auth_password:
+            raise ValidationError(
+                {
+                    "basic_auth_username": "Password must be specified (or only specified) when using basic auth"
+                }
+            )
+
+        if (
+            self.active_from is not None
+            and self.expires_at is not None
+            and self.expires_at <= self.active_from
+        ):
+            raise ValidationError(
+                {"expires_at": "Must be after the redirect becomes active"}
+            )
+
+    @property
+    def is_prefix(self) -> bool:
+        return self.slug.endswith(PREFIX_SUFFIX)
+
+
+class SlugCounter(models.Model):
+    """
+    A counter, from which blocks of values are reserved to generate slugs.
+    """
+
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return self.name
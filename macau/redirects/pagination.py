@@ -0,0 +1,220 @@
+"""
+Pagination for the redirects admin, which stays fast for large tables.
+
+Counting every row gets slower as the table grows, so once there are more than
+`REDIRECT_ADMIN_EXACT_COUNT_LIMIT` rows, counts are estimated instead. Later
+pages are found by slug and host ("keyset pagination"), rather than an `OFFSET`,
+which has to skip every row before the page.
+"""
+
+import hashlib
+from typing import Any
+
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+from .models import Redirect
+
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+
+# Neither slugs nor hosts can contain this
+KEY_SEPARATOR = ":"
+
+
+def get_keyset_value(redirect: Redirect) -> str:
+    if redirect.host:
+        return f"{redirect.slug}{KEY_SEPARATOR}{redirect.host}"
+    return redirect.slug
+
+
+def _keyset_q(value: str, lookup: str) -> Q:
+    """
+    Match redirects ordered after (`gt`) or before (`lt`) a keyset value.
+    """
+    slug, _, host = value.partition(KEY_SEPARATOR)
+    return Q(**{f"slug__{lookup}": slug}) | Q(slug=slug, **{f"host__{lookup}": host})
+
+
+def estimate_count(queryset: QuerySet) -> int | None:
+    """
+    Estimate the number of rows in `queryset`, using PostgreSQL's planner.
+
+    Returns `None` if there's no estimate, eg on SQLite, or before the table
+    has been analyzed.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            # Kept up to date by autovacuum, so doesn't need planning
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            estimate = cursor.fetchone()[0]
+        else:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            estimate = cursor.fetchone()[0][0]["Plan"]["Plan Rows"]
+
+    # Tables which have never been analyzed have an estimate of -1
+    return int(estimate) if estimate >= 0 else None
+
+
+def approximate_count(queryset: QuerySet) -> int:
+    """
+    Count the rows in `queryset`, using an estimate if possible, otherwise an
+    exact count cached for `REDIRECT_ADMIN_COUNT_CACHE_TTL` seconds.
+    """
+    if (estimate := estimate_count(queryset)) is not None:
+        return estimate
+
+    sql, params = queryset.query.sql_with_params()
+    cache_key = (
+        "redirects:count:"
+        + hashlib.md5(  # noqa: S324
+            f"{queryset.db}:{sql}:{params}".encode()
+        ).hexdigest()
+    )
+
+    if (count := cache.get(cache_key)) is None:
+        count = queryset.count()
+        cache.set(cache_key, count, timeout=settings.REDIRECT_ADMIN_COUNT_CACHE_TTL)
+    return int(count)
+
+
+def count_queryset(queryset: QuerySet) -> tuple[int, bool]:
+    """
+    Count the rows in `queryset`, and whether the count is approximate.
+
+    Rows are only counted exactly up to `REDIRECT_ADMIN_EXACT_COUNT_LIMIT`, so
+    counting stops early for large tables.
+    """
+    limit = settings.REDIRECT_ADMIN_EXACT_COUNT_LIMIT
+    queryset = queryset.order_by()
+
+    count = queryset[: limit + 1].count()
+    if count <= limit:
+        return count, False
+
+    # The estimate may be out of date, but there are at least this many rows
+    return max(approximate_count(queryset), count), True
+
+
+class EstimatedCountPaginator(Paginator):
+    object_list: QuerySet
+
+    count_is_approximate = False
+
+    @cached_property
+    def count(self) -> int:
+        count, self.count_is_approximate = count_queryset(self.object_list)
+        return count
+
+
+class RedirectChangeList(ChangeList):
+    """
+    A changelist which stays fast for large tables.
+
+    When ordered by slug (and host), `?after=` and `?before=` give the page
+    after or before a redirect (see `get_keyset_value`). These are used for
+    links to other pages once the count is approximate, since page numbers are
+    too.
+
+    The model admin should set `show_full_result_count = False`, since the
+    unfiltered redirects are counted here instead, with the same limit.
+    """
+
+    paginator: EstimatedCountPaginator
+    result_list: Any
+
+    def __init__(self, request: HttpRequest, *args: Any, **kwargs: Any) -> None:
+        self.after = request.GET.get(AFTER_VAR)
+        self.before = request.GET.get(BEFORE_VAR)
+        self.has_previous = self.has_next = False
+        self.previous_url = self.next_url = self.first_url = ""
+
+        super().__init__(request, *args, **kwargs)
+
+        # Changing the filters or ordering should start from the first page
+        for var in [AFTER_VAR, BEFORE_VAR]:
+            self.params.pop(var, None)
+
+    def get_filters_params(self, params: dict | None = None) -> dict:
+        lookup_params = super().get_filters_params(params)
+        for var in [AFTER_VAR, BEFORE_VAR]:
+            lookup_params.pop(var, None)
+        return lookup_params
+
+    @property
+    def is_slug_ordered(self) -> bool:
+        # The ordering may repeat fields, to make it deterministic
+        return set(self.queryset.query.order_by) == {"slug", "host"}
+
+    def get_results(self, request: HttpRequest) -> None:
+        super().get_results(request)
+
+        # Only count the unfiltered redirects if they're different
+        if self.has_active_filters or self.query:
+            self.full_result_count = count_queryset(self.root_queryset)[0]
+        else:
+            self.full_result_count = self.result_count
+        self.show_full_result_count = True
+        self.show_admin_actions = bool(self.full_result_count)
+
+        self.keyset_pagination = (
+            self.is_slug_ordered
+            and self.paginator.count_is_approximate
+            and not self.show_all
+        )
+
+        if self.is_slug_ordered and (self.after is not None or self.before is not None):
+            self.get_keyset_results()
+        else:
+            self.has_previous = self.page_num > 1
+            self.has_next = self.multi_page and self.page_num < self.paginator.num_pages
+
+        if self.keyset_pagination:
+            self.result_list = list(self.result_list)
+
+            if self.result_list:
+                self.first_url = self.get_query_string(remove=[AFTER_VAR, BEFORE_VAR])
+                self.previous_url = self.get_query_string(
+                    {BEFORE_VAR: get_keyset_value(self.result_list[0])},
+                    remove=[AFTER_VAR],
+                )
+                self.next_url = self.get_query_string(
+                    {AFTER_VAR: get_keyset_value(self.result_list[-1])},
+                    remove=[BEFORE_VAR],
+                )
+
+    def get_keyset_results(self) -> None:
+        page_size = self.list_per_page
+
+        if self.before is not None:
+            rows: list[Redirect] = list(
+                self.queryset.filter(_keyset_q(self.before, "lt")).reverse()[
+                    : page_size + 1
+                ]
+            )
+            self.has_previous = len(rows) > page_size
+            self.has_next = True
+            self.result_list = rows[:page_size][::-1]
+        elif self.after is not None:
+            rows = list(
+                self.queryset.filter(_keyset_q(self.after, "gt"))[: page_size + 1]
+            )
+            self.has_previous = True
+            self.has_next = len(rows) > page_size
+            self.result_list = rows[:page_size]
+
+        self.multi_page = True
@@ -0,0 +1,183 @@
+"""
+Prefix redirects, which match every path under a prefix.
+
+A redirect with a slug ending in `/*` (eg `docs/*`) matches any path starting
+with that prefix (eg `/docs/`, or `/docs/guide/intro`). If its destination ends
+in `*`, that's replaced with the rest of the path.
+
+Each worker keeps enabled prefixes in a trie of path segments for each host, so
+matching takes time proportional to the length of the path, rather than the
+number of prefixes. The longest matching prefix is used (preferring one
+restricted to the request's host), and exact slugs always take priority.
+"""
+
+import logging
+from threading import Lock
+from typing import Generic, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.utils.encoding import escape_uri_path
+
+from .cache import LOOKUP_FIELDS, CachedRedirect
+from .invalidation import ensure_listening, register
+from .models import PREFIX_SUFFIX, Redirect
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Node(Generic[T]):
+    __slots__ = ["children", "value"]
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node[T]] = {}
+        self.value: tuple[str, T] | None = None
+
+
+class PrefixTrie(Generic[T]):
+    """
+    Values keyed by path prefix, eg `docs/*`.
+    """
+
+    def __init__(self) -> None:
+        self._root: _Node[T] = _Node()
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, prefix: str, value: T) -> None:
+        node = self._root
+        for segment in prefix.removesuffix(PREFIX_SUFFIX).split("/"):
+            node = node.children.setdefault(segment, _Node())
+
+        if node.value is None:
+            self._len += 1
+        node.value = (prefix, value)
+
+    def match(self, path: str) -> tuple[str, T, str] | None:
+        """
+        Find the longest prefix matching `path`, returning the prefix, its
+        value, and the rest of the path.
+        """
+        segments = path.split("/")
+        node = self._root
+        match = None
+
+        # The last segment isn't followed by a slash, so can't match a prefix
+        for depth, segment in enumerate(segments[:-1]):
+            if (child := node.children.get(segment)) is None:
+                break
+            node = child
+            if node.value is not None:
+                match = (node.value, depth)
+
+        if match is None:
+            return None
+
+        (prefix, value), depth = match
+        return prefix, value, "/".join(segments[depth + 1 :])
+
+
+def get_destination(destination: str, rest: str) -> str:
+    """
+    Pass the rest of the path through to destinations ending in `*`.
+    """
+    if destination.endswith("*"):
+        return destination[:-1] + escape_uri_path(rest)
+    return destination
+
+
+HostTries = dict[str, PrefixTrie[CachedRedirect]]
+
+
+def _match(
+    tries: HostTries, path: str, host: str
+) -> tuple[str, CachedRedirect, str] | None:
+    matches = [
+        match
+        for trie in [tries.get(host) if host else None, tries.get("")]
+        if trie is not None and (match := trie.match(path)) is not None
+    ]
+    # Ties go to the host's own prefix, since it's first
+    return max(matches, key=lambda match: len(match[0]), default=None)
+
+
+class PrefixRedirects:
+    """
+    Per-process tries of enabled prefix redirects, one for each host (and `""`
+    for prefixes served on every host).
+
+    The tries are built on first use, and rebuilt after prefix redirects change.
+    """
+
+    def __init__(self) -> None:
+        self._tries: HostTries | None = None
+        self._generation = 0
+        self._lock = Lock()
+
+    def build(self) -> HostTries:
+        with self._lock:
+            generation = self._generation
+
+        tries: HostTries = {}
+        rows = (
+            Redirect.objects.filter(is_enabled=True, slug__endswith=PREFIX_SUFFIX)
+            .values_list("slug", *LOOKUP_FIELDS)
+            .iterator()
+        )
+        for slug, *values in rows:
+            redirect = CachedRedirect.from_row(*values)
+            tries.setdefault(redirect.host, PrefixTrie()).add(slug, redirect)
+
+        with self._lock:
+            # If prefixes changed whilst building, they may already be stale
+            if generation == self._generation:
+                self._tries = tries
+
+        logger.debug(
+            "Built prefix tries with %d prefixes",
+            sum(len(trie) for trie in tries.values()),
+        )
+        return tries
+
+    def match(
+        self, path: str, host: str = ""
+    ) -> tuple[str, CachedRedirect, str] | None:
+        """
+        Find the redirect for `path` on `host`, returning its slug, the
+        redirect and the rest of the path.
+
+        This may query the database, to build the tries.
+        """
+        ensure_listening()
+
+        if (tries := self._tries) is None:
+            tries = self.build()
+        return _match(tries, path, host)
+
+    async def amatch(
+        self, path: str, host: str = ""
+    ) -> tuple[str, CachedRedirect, str] | None:
+        """
+        Async version of `match`.
+        """
+        ensure_listening()
+
+        if (tries := self._tries) is None:
+            tries = await sync_to_async(self.build)()
+        return _match(tries, path, host)
+
+    def invalidate(self, slug: str) -> None:
+        if slug.endswith(PREFIX_SUFFIX):
+            self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tries = None
+            self._generation += 1
+
+
+prefix_redirects = PrefixRedirects()
+register(prefix_redirects)
@@ -0,0 +1,296 @@
+import copy
+import math
+import re
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from functools import cache
+from hashlib import sha256
+from importlib.metadata import version
+from io import BytesIO, RawIOBase
+from typing import NamedTuple
+
+import qrcode
+import qrcode.constants
+import qrcode.image.svg
+from django.conf import settings
+from django.core.cache import caches
+from django.http import QueryDict
+
+from .cache import RedirectCache
+from .invalidation import register
+
+CONTENT_TYPE = {"svg": "image/svg+xml", "png": "image/png"}
+
+# Bump when the rendered output changes, to invalidate caches and ETags
+RENDER_VERSION = f"2-{version('qrcode')}"
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+COLOUR_RE = re.compile(r"^[0-9a-f]{6}$")
+
+# Size of each module, in pixels (PNG) or tenths of a millimetre (SVG)
+DEFAULT_SCALE = {"png": 1, "svg": 10}
+MAX_SCALE = 40
+MAX_BORDER = 10
+
+
+class QRCodeOptions(NamedTuple):
+    scale: int | None = None
+    border: int = 0
+    error_correction: str = "M"
+    foreground: str = "000000"
+    background: str = "transparent"
+
+    @classmethod
+    def from_query(cls, query: QueryDict) -> "QRCodeOptions":
+        """
+        Parse options from query parameters.
+
+        Raises `ValueError` if any are invalid.
+        """
+        defaults = cls()
+
+        scale = defaults.scale
+        if scale_param := query.get("scale", ""):
+            scale = int(scale_param)
+            if not 1 <= scale <= MAX_SCALE:
+                raise ValueError(f"scale must be between 1 and {MAX_SCALE}")
+
+        border = int(query.get("border", defaults.border))
+        if not 0 <= border <= MAX_BORDER:
+            raise ValueError(f"border must be between 0 and {MAX_BORDER}")
+
+        error_correction = query.get("ec", defaults.error_correction).upper()
+        if error_correction not in ERROR_CORRECTION:
+            raise ValueError(f"ec must be one of {', '.join(ERROR_CORRECTION.keys())}")
+
+        foreground = query.get("fg", defaults.foreground).lower()
+        if not COLOUR_RE.match(foreground):
+            raise ValueError("fg must be a hex colour")
+
+        background = query.get("bg", defaults.background).lower()
+        if background != "transparent" and not COLOUR_RE.match(background):
+            raise ValueError("bg must be a hex colour or 'transparent'")
+
+        return cls(scale, border, error_correction, foreground, background)
+
+
+def get_etag(data: str, image_format: str, options: QRCodeOptions) -> str:
+    """
+    Get a strong ETag for a QR code.
+
+    Rendering is deterministic, so the ETag can be calculated without rendering.
+    """
+    key = "\0".join([data, image_format, *map(str, options), RENDER_VERSION])
+    return '"' + sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def make_qrcode(data: str, error_correction: str) -> qrcode.QRCode:
+    """
+    Create a QR code, and compute its modules.
+
+    Computing the modules (fitting the version, and choosing the mask) is the
+    expensive part, and doesn't depend on how it's rendered.
+    """
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECTION[error_correction])
+    qr.add_data(data)
+    qr.make()
+    return qr
+
+
+@cache
+def _svg_image_factory(
+    foreground: str, background: str
+) -> type[qrcode.image.svg.SvgPathImage]:
+    return type(
+        "SvgPathImage",
+        (qrcode.image.svg.SvgPathImage,),
+        {
+            "QR_PATH_STYLE": {
+                **qrcode.image.svg.SvgPathImage.QR_PATH_STYLE,
+                "fill": f"#{foreground}",
+            },
+            "background": None if background == "transparent" else f"#{background}",
+        },
+    )
+
+
+def render_qrcode(
+    qr: qrcode.QRCode, image_format: str, options: QRCodeOptions
+) -> bytes:
+    if image_format not in CONTENT_TYPE:
+        raise ValueError(f"Unknown format {image_format!r}")
+
+    # Copy, so the modules can be shared between renders
+    qr = copy.copy(qr)
+    qr.box_size = options.scale or DEFAULT_SCALE[image_format]
+    qr.border = options.border
+
+    background = (
+        options.background
+        if options.background == "transparent"
+        else f"#{options.background}"
+    )
+
+    match image_format:
+        case "png":
+            img = qr.make_image(
+                fill_color=f"#{options.foreground}", back_color=background
+            )
+        case "svg":
+            img = qr.make_image(
+                image_factory=_svg_image_factory(options.foreground, options.background)
+            )
+
+    buffer = BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+class SlugQRCodes:
+    def __init__(self) -> None:
+        self.qrcodes: dict[tuple[str, str], qrcode.QRCode] = {}
+        self.renders: dict[str, bytes] = {}
+
+
+class QRCodeCache:
+    """
+    Cache QR codes, keyed by slug.
+
+    Each slug may have multiple QR codes (eg for different hostnames), each
+    with multiple renders (eg for different formats or sizes). Renders are also
+    optionally stored in a shared Django cache, keyed by their ETag. Renders
+    only depend on their data and options, so shared entries can't be stale,
+    and are left to expire.
+    """
+
+    # Limit QR codes and renders for each slug, since they may vary by hostname
+    MAX_RENDERS_PER_SLUG = 16
+
+    def __init__(self, maxsize: int, shared_cache_alias: str = "") -> None:
+        self.slugs: RedirectCache[SlugQRCodes] = RedirectCache(
+            maxsize=maxsize, ttl=math.inf
+        )
+        self.shared_cache_alias = shared_cache_alias
+
+    def _get_qrcode(
+        self, slug_qrcodes: SlugQRCodes, data: str, error_correction: str
+    ) -> qrcode.QRCode:
+        key = (data, error_correction)
+
+        if (qr := slug_qrcodes.qrcodes.get(key)) is None:
+            if len(slug_qrcodes.qrcodes) >= self.MAX_RENDERS_PER_SLUG:
+                slug_qrcodes.qrcodes.clear()
+            qr = slug_qrcodes.qrcodes[key] = make_qrcode(data, error_correction)
+
+        return qr
+
+    def get(
+        self,
+        slug: str,
+        data: str,
+        image_format: str,
+        options: QRCodeOptions = QRCodeOptions(),  # noqa: B008
+    ) -> bytes:
+        etag = get_etag(data, image_format, options)
+
+        slug_qrcodes = self.slugs.get(slug)
+        if slug_qrcodes is None:
+            slug_qrcodes = SlugQRCodes()
+            self.slugs.set(slug, slug_qrcodes)
+        elif (content := slug_qrcodes.renders.get(etag)) is not None:
+            return content
+
+        shared_cache = (
+            caches[self.shared_cache_alias] if self.shared_cache_alias else None
+        )
+        shared_cache_key = f"macau:qrcode:{etag}"
+
+        content = shared_cache.get(shared_cache_key) if shared_cache else None
+
+        if content is None:
+            qr = self._get_qrcode(slug_qrcodes, data, options.error_correction)
+            content = render_qrcode(qr, image_format, options)
+            if shared_cache is not None:
+                shared_cache.set(shared_cache_key, content)
+
+        if len(slug_qrcodes.renders) >= self.MAX_RENDERS_PER_SLUG:
+            slug_qrcodes.renders.clear()
+        slug_qrcodes.renders[etag] = content
+
+        return content
+
+    def invalidate(self, slug: str) -> None:
+        self.slugs.invalidate(slug)
+
+    def clear(self) -> None:
+        self.slugs.clear()
+
+    def __len__(self) -> int:
+        return len(self.slugs)
+
+
+qrcode_cache = QRCodeCache(
+    maxsize=settings.REDIRECT_QRCODE_CACHE_SIZE,
+    shared_cache_alias=settings.REDIRECT_QRCODE_SHARED_CACHE,
+)
+register(qrcode_cache)
+
+
+class _ZipStream(RawIOBase):
+    """
+    An unseekable file, which collects written data until it's read.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:  # type: ignore[override]
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_qrcode_zip(
+    names: Iterable[str],
+    get_data: Callable[[str], str],
+    image_format: str,
+    options: QRCodeOptions = QRCodeOptions(),  # noqa: B008
+) -> Iterator[bytes]:
+    """
+    Render a QR code for each name (with the data from `get_data`) into a ZIP
+    archive, as `<name>.<image_format>`, yielding it in chunks.
+
+    QR codes are rendered one at a time, as the archive is read, so only one is
+    held in memory. Rendering is mostly Python, so rendering in threads isn't
+    any faster (because of the GIL), and isn't worth starting processes for.
+    """
+    # PNGs are already compressed
+    compression = zipfile.ZIP_STORED if image_format == "png" else zipfile.ZIP_DEFLATED
+
+    stream = _ZipStream()
+
+    with zipfile.ZipFile(stream, mode="w", compression=compression) as archive:
+        for name in names:
+            content = render_qrcode(
+                make_qrcode(get_data(name), options.error_correction),
+                image_format,
+                options,
+            )
+            archive.writestr(f"{name}.{image_format}", content)
+            yield stream.pop()
+
+    # The central directory is written on close
+    yield stream.pop()
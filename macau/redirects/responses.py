@@ -0,0 +1,72 @@
+"""
+Redirect responses, prepared ahead of time.
+
+Creating a redirect response validates its destination, and preventing it being
+cached parses and formats its headers. Those are the same for every request, so
+they're done once when a redirect is cached, and each request copies the
+headers. Redirects which aren't cached (eg prefix redirects, whose destination
+depends on the path) build their response directly.
+"""
+
+import time
+from functools import lru_cache
+
+from django.http import (
+    HttpResponse,
+    HttpResponsePermanentRedirect,
+    HttpResponseRedirect,
+)
+from django.http.response import HttpResponseRedirectBase
+from django.utils.cache import add_never_cache_headers
+from django.utils.http import http_date
+
+
+class PreparedRedirectResponse(HttpResponseRedirectBase):
+    """
+    A redirect response with headers from a `RedirectResponseTemplate`.
+    """
+
+    def __init__(self, status: int, headers: dict[str, str]) -> None:
+        # The destination was validated when the template was created
+        HttpResponse.__init__(self, status=status, headers=headers)
+
+
+@lru_cache(maxsize=1)
+def _http_date(epoch_seconds: int) -> str:
+    return http_date(epoch_seconds)
+
+
+def build_redirect_response(
+    destination: str, is_permanent: bool
+) -> HttpResponseRedirectBase:
+    redirect_class = (
+        HttpResponsePermanentRedirect if is_permanent else HttpResponseRedirect
+    )
+    response = redirect_class(destination, preserve_request=True)
+
+    # Prevent the redirect from being cached
+    add_never_cache_headers(response)
+
+    # Prevent search engines from indexing redirects
+    response.headers["X-Robots-Tag"] = "noindex"
+
+    return response
+
+
+class RedirectResponseTemplate:
+    """
+    The status and headers of a redirect response.
+    """
+
+    def __init__(self, destination: str, is_permanent: bool) -> None:
+        response = build_redirect_response(destination, is_permanent)
+        self.status_code = response.status_code
+        self.headers = dict(response.headers.items())
+
+    def render(self) -> PreparedRedirectResponse:
+        # `add_never_cache_headers` sets `Expires` to the current time, which
+        # only changes once a second
+        return PreparedRedirectResponse(
+            self.status_code,
+            {**self.headers, "Expires": _http_date(int(time.time()))},
+        )
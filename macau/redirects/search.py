@@ -0,0 +1,248 @@
+"""
+Indexed search for redirects, for the admin.
+
+The default admin search (`icontains` on each field) can't use an index, so
+scans the whole table. Instead:
+
+- PostgreSQL: `slug` and `destination` have `pg_trgm` GIN indexes, which
+  `icontains` can use.
+- SQLite: An FTS5 table, using the trigram tokenizer, shadows the redirects
+  table, kept in sync by triggers. It's keyed by `id`, an alias of the rowid,
+  which (unlike an implicit rowid) `VACUUM` never changes.
+
+Trigrams need at least 3 characters, so shorter terms only match slug prefixes.
+PostgreSQL's trigram indexes can match prefixes too. SQLite can't use an index
+for `LIKE`, so instead uses a range on an index of the lowercased slug.
+"""
+
+import logging
+from typing import Any
+
+from django.db import DatabaseError, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.utils.text import smart_split, unescape_string_literal
+
+from .models import Redirect
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_LENGTH = 3
+
+TABLE = Redirect._meta.db_table
+SEARCH_TABLE = f"{TABLE}_search"
+
+TRIGRAM_INDEXES = {
+    f"{TABLE}_slug_trgm": "slug",
+    f"{TABLE}_destination_trgm": "destination",
+}
+
+SQLITE_SEARCH_TABLE = (
+    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(slug, destination, "
+    f"content='{TABLE}', content_rowid='id', tokenize='trigram')"
+)
+
+SQLITE_TRIGGERS = {
+    f"{SEARCH_TABLE}_insert": f"""
+        CREATE TRIGGER {{name}} AFTER INSERT ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, slug, destination)
+            VALUES (new.id, new.slug, new.destination);
+        END
+    """,
+    f"{SEARCH_TABLE}_delete": f"""
+        CREATE TRIGGER {{name}} AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, slug, destination)
+            VALUES ('delete', old.id, old.slug, old.destination);
+        END
+    """,
+    f"{SEARCH_TABLE}_update": f"""
+        CREATE TRIGGER {{name}} AFTER UPDATE OF slug, destination ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, slug, destination)
+            VALUES ('delete', old.id, old.slug, old.destination);
+            INSERT INTO {SEARCH_TABLE}(rowid, slug, destination)
+            VALUES (new.id, new.slug, new.destination);
+        END
+    """,
+}
+
+SQLITE_INDEXES = {
+    f"{TABLE}_slug_lower": f"CREATE INDEX {{name}} ON {TABLE} (lower(slug))",
+}
+
+# Aliases of databases known to have the SQLite search table
+_sqlite_search_ready: set[str] = set()
+
+
+def _normalize_sql(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def _get_sqlite_schema() -> dict[str, str]:
+    schema = {SEARCH_TABLE: SQLITE_SEARCH_TABLE}
+    for name, sql in (SQLITE_TRIGGERS | SQLITE_INDEXES).items():
+        schema[name] = sql.format(name=name)
+    return {name: _normalize_sql(sql) for name, sql in schema.items()}
+
+
+def _get_outdated_sqlite_schema(connection: BaseDatabaseWrapper) -> list[str]:
+    """
+    Get the search table and triggers which are missing, or defined differently.
+    """
+    schema = _get_sqlite_schema()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE name IN "
+            f"({', '.join(['%s'] * len(schema))})",
+            list(schema),
+        )
+        existing = {name: _normalize_sql(sql) for name, sql in cursor.fetchall()}
+    return [name for name, sql in schema.items() if existing.get(name) != sql]
+
+
+def create_search_index(connection: BaseDatabaseWrapper) -> None:
+    """
+    Create (or repair) the search index.
+    """
+    with connection.cursor() as cursor:
+        match connection.vendor:
+            case "postgresql":
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for name, column in TRIGRAM_INDEXES.items():
+                    # Matches `UPPER(column::text) LIKE ...`, used by `icontains`
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} "
+                        f"USING gin (UPPER({column}) gin_trgm_ops)"
+                    )
+
+            case "sqlite":
+                # Rebuilding a table (eg in a migration) drops its triggers, so
+                # they, and the index, need rebuilding too
+                if not (outdated := _get_outdated_sqlite_schema(connection)):
+                    return
+
+                for name in outdated:
+                    if name in SQLITE_INDEXES:
+                        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+                        cursor.execute(SQLITE_INDEXES[name].format(name=name))
+
+                # The search table only needs rebuilding if it or its triggers changed
+                if all(name in SQLITE_INDEXES for name in outdated):
+                    return
+
+                if SEARCH_TABLE in outdated:
+                    cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+                    try:
+                        cursor.execute(SQLITE_SEARCH_TABLE)
+                    except DatabaseError:
+                        logger.warning(
+                            "SQLite doesn't support FTS5 trigram indexes, so searching redirects will be slow"
+                        )
+                        return
+
+                for name in outdated:
+                    if name in SQLITE_TRIGGERS:
+                        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                        cursor.execute(SQLITE_TRIGGERS[name].format(name=name))
+
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"
+                )
+
+
+def drop_search_index(connection: BaseDatabaseWrapper) -> None:
+    with connection.cursor() as cursor:
+        match connection.vendor:
+            case "postgresql":
+                for name in TRIGRAM_INDEXES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+            case "sqlite":
+                for name in SQLITE_TRIGGERS:
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+                for name in SQLITE_INDEXES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    _sqlite_search_ready.discard(connection.alias)
+
+
+def has_sqlite_search_index(connection: BaseDatabaseWrapper) -> bool:
+    if connection.alias in _sqlite_search_ready:
+        return True
+
+    if not _get_outdated_sqlite_schema(connection):
+        _sqlite_search_ready.add(connection.alias)
+        return True
+
+    return False
+
+
+def _match_query(term: str) -> str:
+    # Quote the term, so it's matched as a literal string
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _slug_prefix_q(connection: BaseDatabaseWrapper, term: str) -> Q:
+    if connection.vendor == "sqlite":
+        # Lowercase the bounds with SQLite too, so they match the index
+        return Q(
+            GreaterThanOrEqual(Lower("slug"), Lower(Value(term))),
+            LessThan(Lower("slug"), Lower(Value(term + "\U0010ffff"))),
+        )
+    return Q(slug__istartswith=term)
+
+
+def search_redirects(
+    queryset: QuerySet[Redirect], search_term: str
+) -> QuerySet[Redirect]:
+    """
+    Filter redirects to those matching every term in `search_term`.
+
+    Terms match slugs which start with them, and (if long enough) slugs or
+    destinations which contain them, ignoring case.
+    """
+    connection = connections[queryset.db]
+
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+
+        q = _slug_prefix_q(connection, bit)
+
+        if len(bit) >= TRIGRAM_LENGTH:
+            if connection.vendor == "sqlite" and has_sqlite_search_index(connection):
+                q |= Q(
+                    pk__in=RawSQL(
+                        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                        [_match_query(bit)],
+                    )
+                )
+            else:
+                q |= Q(slug__icontains=bit) | Q(destination__icontains=bit)
+
+        queryset = queryset.filter(q)
+
+    return queryset
+
+
+def ensure_search_index(using: str, **kwargs: Any) -> None:
+    """
+    Repair the search index after migrations, which may have rebuilt the table
+    or changed how it's indexed.
+    """
+    connection = connections[using]
+    if (
+        connection.vendor != "sqlite"
+        or TABLE not in connection.introspection.table_names()
+    ):
+        return
+
+    # Before `id` was added (eg after migrating backwards), the migrations'
+    # index is left as it is
+    with connection.cursor() as cursor:
+        columns = connection.introspection.get_table_description(cursor, TABLE)
+    if any(column.name == "id" for column in columns):
+        create_search_index(connection)
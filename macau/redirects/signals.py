@@ -0,0 +1,81 @@
+from collections.abc import Iterable
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from import_export.signals import post_import
+
+from .cache import redirect_cache, redirect_snapshot, slug_filter
+from .edge import edge_map_regenerator
+from .invalidation import notify_redirect_changed, notify_redirects_changed
+from .models import Redirect
+from .prefixes import prefix_redirects
+from .qrcodes import qrcode_cache
+
+
+def _regenerate_edge_map() -> None:
+    if edge_map_regenerator.enabled:
+        transaction.on_commit(edge_map_regenerator.schedule)
+
+
+def invalidate_all_redirects() -> None:
+    redirect_cache.clear()
+    slug_filter.clear()
+    qrcode_cache.clear()
+    redirect_snapshot.clear()
+    prefix_redirects.clear()
+    notify_redirect_changed()
+    _regenerate_edge_map()
+
+
+def _invalidate_saved_redirect(redirect: Redirect) -> None:
+    redirect_cache.invalidate(redirect.slug)
+    redirect_snapshot.invalidate(redirect.slug)
+    prefix_redirects.invalidate(redirect.slug)
+    if redirect.is_enabled:
+        slug_filter.add(redirect.slug)
+    else:
+        slug_filter.discard(redirect.slug)
+        qrcode_cache.invalidate(redirect.slug)
+
+
+@receiver(post_save, sender=Redirect)
+def invalidate_saved_redirect(
+    sender: type[Redirect], instance: Redirect, **kwargs: Any
+) -> None:
+    _invalidate_saved_redirect(instance)
+    notify_redirect_changed(instance.slug)
+    _regenerate_edge_map()
+
+
+def invalidate_saved_redirects(redirects: Iterable[Redirect]) -> None:
+    """
+    Invalidate redirects saved in bulk, which doesn't send `post_save`.
+    """
+    slugs = []
+    for redirect in redirects:
+        _invalidate_saved_redirect(redirect)
+        slugs.append(redirect.slug)
+    notify_redirects_changed(slugs)
+    _regenerate_edge_map()
+
+
+@receiver(post_delete, sender=Redirect)
+def invalidate_deleted_redirect(
+    sender: type[Redirect], instance: Redirect, **kwargs: Any
+) -> None:
+    redirect_cache.invalidate(instance.slug)
+    redirect_snapshot.invalidate(instance.slug)
+    prefix_redirects.invalidate(instance.slug)
+    slug_filter.discard(instance.slug)
+    qrcode_cache.invalidate(instance.slug)
+    notify_redirect_changed(instance.slug)
+    _regenerate_edge_map()
+
+
+@receiver(post_import)
+def invalidate_imported_redirects(model: type, **kwargs: Any) -> None:
+    # Imports may bypass model signals (eg bulk operations), so drop everything
+    if model is Redirect:
+        invalidate_all_redirects()
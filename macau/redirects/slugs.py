@@ -0,0 +1,136 @@
+import math
+import os
+import re
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Redirect, SlugCounter
+
+SLUG_CHARACTERS_RE = re.compile(r"^[-a-zA-Z0-9_]+$")
+
+COUNTER_NAME = "redirect-slug"
+
+
+class SlugGenerator:
+    """
+    Generate unique slugs from a shared counter.
+
+    Each process reserves a block of counter values at a time, so most slugs are
+    generated without touching the database, and concurrent processes never
+    generate the same slug. Values are scattered over the slug space before
+    being encoded, so consecutive slugs don't look sequential.
+    """
+
+    # Golden ratio, to spread consecutive values evenly over the slug space
+    SCATTER_RATIO = (math.sqrt(5) - 1) / 2
+
+    def __init__(self, alphabet: str, length: int, block_size: int) -> None:
+        if len(set(alphabet)) != len(alphabet) or len(alphabet) < 2:
+            raise ValueError("Alphabet must contain at least 2 unique characters")
+        if not SLUG_CHARACTERS_RE.match(alphabet):
+            raise ValueError("Alphabet must only contain characters valid in slugs")
+        if length < 1:
+            raise ValueError("Length must be at least 1")
+
+        self.alphabet = alphabet
+        self.length = length
+        self.block_size = max(block_size, 1)
+
+        self.space = len(alphabet) ** length
+
+        # Multiplying by a value coprime with the slug space is a bijection, so
+        # distinct values still produce distinct slugs
+        self.multiplier = int(self.space * self.SCATTER_RATIO) | 1
+        while math.gcd(self.multiplier, self.space) != 1:
+            self.multiplier += 2
+
+        self._lock = Lock()
+        self._next = 0
+        self._end = 0
+        self._pid: int | None = None
+
+    def encode(self, value: int) -> str:
+        if value >= self.space:
+            raise ValueError("Slug space exhausted, increase REDIRECT_SLUG_LENGTH")
+
+        value = (value * self.multiplier) % self.space
+
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(self.length):
+            value, remainder = divmod(value, base)
+            chars.append(self.alphabet[remainder])
+        return "".join(reversed(chars))
+
+    def _reserve(self, count: int) -> range:
+        """
+        Reserve `count` consecutive counter values.
+        """
+        counter = SlugCounter.objects.filter(name=COUNTER_NAME)
+
+        with transaction.atomic():
+            # Update first, so the row is locked before it's read
+            if not counter.update(value=F("value") + count):
+                SlugCounter.objects.get_or_create(name=COUNTER_NAME)
+                counter.update(value=F("value") + count)
+            end = counter.values_list("value", flat=True).get()
+
+        return range(end - count, end)
+
+    def _take(self, count: int) -> list[int]:
+        # Blocks can't be shared with forked processes
+        if self._pid != os.getpid():
+            self._next = self._end = 0
+            self._pid = os.getpid()
+
+        values = list(range(self._next, min(self._next + count, self._end)))
+        self._next += len(values)
+
+        if (remaining := count - len(values)) > 0:
+            if connection.in_atomic_block:
+                # The reservation is rolled back with the transaction, so other
+                # processes may reuse it. Only take what's needed right now.
+                values.extend(self._reserve(remaining))
+            else:
+                block = self._reserve(max(remaining, self.block_size))
+                values.extend(block[:remaining])
+                self._next = block.start + remaining
+                self._end = block.stop
+
+        return values
+
+    def generate(self, count: int = 1) -> list[str]:
+        """
+        Generate `count` slugs which aren't already used.
+        """
+        slugs: list[str] = []
+
+        with self._lock:
+            while len(slugs) < count:
+                candidates = [
+                    self.encode(value) for value in self._take(count - len(slugs))
+                ]
+
+                # Slugs chosen by hand may already be using some of the space
+                existing = set(
+                    Redirect.objects.filter(slug__in=candidates).values_list(
+                        "slug", flat=True
+                    )
+                )
+                slugs.extend(slug for slug in candidates if slug not in existing)
+
+        return slugs
+
+
+slug_generator = SlugGenerator(
+    alphabet=settings.REDIRECT_SLUG_ALPHABET,
+    length=settings.REDIRECT_SLUG_LENGTH,
+    block_size=settings.REDIRECT_SLUG_BLOCK_SIZE,
+)
+
+
+def generate_slug() -> str:
+    return slug_generator.generate()[0]
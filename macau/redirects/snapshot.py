@@ -0,0 +1,440 @@
+"""
+Compiled snapshots of enabled redirects, shared between workers.
+
+`./manage.py compile_redirects` writes every enabled redirect to a binary file,
+which each worker memory-maps and binary-searches. The file's pages are shared
+between processes (and kept in the OS's page cache), so workers don't each need
+their own copy of the redirects.
+
+The file contains (little-endian):
+
+- A header: `MAGIC`, the format version, the number of redirects, and when the
+  snapshot was compiled.
+- An index: A fixed-size entry for each redirect, sorted by slug (then host),
+  locating its strings in the arena.
+- An arena: Each redirect's slug, destination, basic auth token and host, as
+  UTF-8.
+
+Snapshots are only used once they've been checked against the database. When
+redirects change, those slugs are looked up in the database instead, until
+a newer snapshot is compiled.
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from threading import Lock, Thread
+from typing import NamedTuple
+
+from django.db import connection
+
+from .models import Redirect
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MACAURDR"
+VERSION = 3
+
+# Magic, version, number of redirects, compiled at (as a UNIX timestamp)
+HEADER = struct.Struct("<8sIId")
+
+# Arena offset, slug length, destination length, token length, host length, is
+# permanent, active from and expires at (as UNIX timestamps, or NaN if unset).
+# The strings are stored consecutively, starting at the offset.
+ENTRY = struct.Struct("<IHHHBBdd")
+
+# Past this many changes since a snapshot was compiled, ignore it entirely
+MAX_CHANGED_SLUGS = 1000
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class SnapshotRecord(NamedTuple):
+    destination: str
+    is_permanent: bool
+    basic_auth_token: str
+    host: str
+    active_from: float | None
+    expires_at: float | None
+
+
+def _encode_time(value: float | None) -> float:
+    return math.nan if value is None else value
+
+
+def _decode_time(value: float) -> float | None:
+    return None if math.isnan(value) else value
+
+
+def write_snapshot(
+    path: str,
+    records: Iterable[
+        tuple[str, tuple[str, bool, str, str, float | None, float | None]]
+    ],
+    compiled_at: float,
+) -> int:
+    """
+    Write `records` of `(slug, (destination, is_permanent, basic_auth_token,
+    host, active_from, expires_at))` to a snapshot at `path`, returning the
+    number of redirects written.
+
+    The snapshot is written to a temporary file alongside `path`, then renamed,
+    so readers never see a partially written file.
+    """
+    encoded = sorted(
+        ((slug.encode(), SnapshotRecord._make(record)) for slug, record in records),
+        key=lambda item: (item[0], item[1].host),
+    )
+
+    index = bytearray(HEADER.pack(MAGIC, VERSION, len(encoded), compiled_at))
+    arena = bytearray()
+    for slug, record in encoded:
+        destination = record.destination.encode()
+        token = record.basic_auth_token.encode()
+        host = record.host.encode()
+        index += ENTRY.pack(
+            len(arena),
+            len(slug),
+            len(destination),
+            len(token),
+            len(host),
+            record.is_permanent,
+            _encode_time(record.active_from),
+            _encode_time(record.expires_at),
+        )
+        arena += slug + destination + token + host
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".snapshot.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(index)
+            f.write(arena)
+            f.flush()
+            os.fsync(f.fileno())
+        # The snapshot contains basic auth tokens, so only its owner may read it
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return len(encoded)
+
+
+class RedirectSnapshot:
+    """
+    A memory-mapped snapshot file.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER.size:
+                raise SnapshotError(f"{path} is too small to be a snapshot")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, version, count, compiled_at = HEADER.unpack_from(self._mmap, 0)
+        self.count: int = count
+        self.compiled_at: float = compiled_at
+
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f"{path} isn't a redirect snapshot")
+        if version != VERSION:
+            self.close()
+            raise SnapshotError(f"{path} has unsupported version {version}")
+
+        self._arena_start: int = HEADER.size + self.count * ENTRY.size
+        if self._arena_start > stat.st_size:
+            self.close()
+            raise SnapshotError(f"{path} is truncated")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _get_slug(self, index: int) -> bytes:
+        offset, slug_length, *_ = ENTRY.unpack_from(
+            self._mmap, HEADER.size + index * ENTRY.size
+        )
+        start = self._arena_start + offset
+        return self._mmap[start : start + slug_length]
+
+    def _find(self, slug: bytes) -> int:
+        """
+        Find the index of the first entry for `slug`, or where it would be.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_slug(middle) < slug:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, slug: object) -> bool:
+        if not isinstance(slug, str):
+            return False
+        encoded_slug = slug.encode()
+        index = self._find(encoded_slug)
+        return index < self.count and self._get_slug(index) == encoded_slug
+
+    def _get_record(self, index: int) -> SnapshotRecord:
+        (
+            offset,
+            slug_length,
+            destination_length,
+            token_length,
+            host_length,
+            is_permanent,
+            active_from,
+            expires_at,
+        ) = ENTRY.unpack_from(self._mmap, HEADER.size + index * ENTRY.size)
+        start = self._arena_start + offset + slug_length
+        destination = self._mmap[start : start + destination_length].decode()
+        start += destination_length
+        token = self._mmap[start : start + token_length].decode()
+        start += token_length
+        host = self._mmap[start : start + host_length].decode()
+
+        return SnapshotRecord(
+            destination,
+            bool(is_permanent),
+            token,
+            host,
+            _decode_time(active_from),
+            _decode_time(expires_at),
+        )
+
+    def get(self, slug: str) -> list[SnapshotRecord]:
+        """
+        Get the records for `slug` (one for each host).
+        """
+        encoded_slug = slug.encode()
+        records = []
+        index = self._find(encoded_slug)
+        while index < self.count and self._get_slug(index) == encoded_slug:
+            records.append(self._get_record(index))
+            index += 1
+        return records
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+class SnapshotReader:
+    """
+    Look up redirects in the snapshot at `path`, if there is one.
+
+    The file is checked for changes at most every `check_interval` seconds, and
+    a newer snapshot swapped in. Each snapshot is checked against the database
+    in the background (at most as often) before being used:
+
+    - Redirects modified since it was compiled are looked up in the database.
+    - If redirects have been removed or disabled without being modified (eg by
+      `QuerySet.update`), or too many have changed, the snapshot isn't used
+      at all.
+
+    Invalidated slugs are also looked up in the database. Clearing the reader
+    means the snapshot needs checking again, and until then every redirect is
+    looked up in the database.
+    """
+
+    def __init__(
+        self, path: str, check_interval: float, background: bool = True
+    ) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self.background = background
+
+        self._snapshot: RedirectSnapshot | None = None
+        self._stale_slugs: set[str] = set()
+        self._is_verified = False
+        self._next_check = 0.0
+        self._lock = Lock()
+
+        self._verifying = False
+        self._generation = 0
+
+        # Slugs invalidated whilst the snapshot is being checked
+        self._pending: set[str] = set()
+
+        # The last snapshot which didn't match the database. It only gets more
+        # out of date, so isn't checked again.
+        self._rejected: RedirectSnapshot | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @property
+    def snapshot(self) -> RedirectSnapshot | None:
+        return self._snapshot
+
+    def _load(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._snapshot is not None:
+                logger.warning("Snapshot %s was removed", self.path)
+            self._snapshot = None
+            return
+
+        if self._snapshot is not None and self._snapshot.stat_key == (
+            stat.st_ino,
+            stat.st_mtime_ns,
+            stat.st_size,
+        ):
+            return
+
+        try:
+            snapshot = RedirectSnapshot(self.path)
+        except (OSError, SnapshotError):
+            logger.exception("Unable to load snapshot %s", self.path)
+            self._snapshot = None
+            return
+
+        # Lookups which already have the previous snapshot can keep using it,
+        # so it's left to be unmapped once they're done with it.
+        self._snapshot = snapshot
+        self._is_verified = False
+        logger.info("Loaded snapshot %s with %d redirects", self.path, len(snapshot))
+
+    def _get_stale_slugs(self, snapshot: RedirectSnapshot) -> set[str] | None:
+        """
+        Check `snapshot` against the database, returning the slugs which have
+        changed since it was compiled, or `None` if it can't be used.
+        """
+        compiled_at = datetime.fromtimestamp(snapshot.compiled_at, tz=UTC)
+
+        changed = set(
+            Redirect.objects.filter(modified_at__gt=compiled_at).values_list(
+                "slug", "host"
+            )[: MAX_CHANGED_SLUGS + 1]
+        )
+        if len(changed) > MAX_CHANGED_SLUGS:
+            logger.warning("Snapshot %s is out of date", self.path)
+            return None
+
+        # Other hosts' redirects for a changed slug may be unchanged, so only
+        # the changed redirects are left out
+        unchanged_count = Redirect.objects.filter(
+            is_enabled=True, modified_at__lte=compiled_at
+        ).count()
+        expected_count = len(snapshot) - sum(
+            any(record.host == host for record in snapshot.get(slug))
+            for slug, host in changed
+        )
+        if unchanged_count != expected_count:
+            logger.warning("Snapshot %s doesn't match the database", self.path)
+            return None
+
+        return {slug for slug, _ in changed}
+
+    def _verify(self, snapshot: RedirectSnapshot, generation: int) -> None:
+        try:
+            stale_slugs = self._get_stale_slugs(snapshot)
+        except BaseException:
+            with self._lock:
+                self._verifying = False
+            raise
+
+        with self._lock:
+            self._verifying = False
+
+            # If the reader was cleared, or a newer snapshot loaded, whilst
+            # checking, the result may already be out of date
+            if generation != self._generation or snapshot is not self._snapshot:
+                return
+
+            if stale_slugs is None:
+                self._rejected = snapshot
+            else:
+                self._stale_slugs = stale_slugs | self._pending
+                self._is_verified = len(self._stale_slugs) <= MAX_CHANGED_SLUGS
+            self._pending = set()
+
+    def _verify_in_background(
+        self, snapshot: RedirectSnapshot, generation: int
+    ) -> None:
+        try:
+            self._verify(snapshot, generation)
+        except Exception:
+            logger.exception("Unable to check snapshot %s", self.path)
+        finally:
+            connection.close()
+
+    @property
+    def needs_refresh(self) -> bool:
+        return self.enabled and time.monotonic() >= self._next_check
+
+    def refresh(self) -> None:
+        """
+        Swap in a newer snapshot, and start checking it against the database,
+        if it's been `check_interval` seconds since the last check.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self.enabled or now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+
+            self._load()
+            snapshot = self._snapshot
+            if (
+                snapshot is None
+                or self._is_verified
+                or self._verifying
+                or snapshot is self._rejected
+            ):
+                return
+
+            self._verifying = True
+            self._pending = set()
+            generation = self._generation
+
+        if self.background:
+            Thread(
+                target=self._verify_in_background,
+                args=(snapshot, generation),
+                name=f"{self.__class__.__name__}Verify",
+                daemon=True,
+            ).start()
+        else:
+            self._verify(snapshot, generation)
+
+    def get_snapshot(self, slug: str) -> RedirectSnapshot | None:
+        """
+        Get the snapshot to look up `slug` in, or `None` if it should be looked
+        up in the database instead.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or not self._is_verified or slug in self._stale_slugs:
+            return None
+        return snapshot
+
+    def invalidate(self, slug: str) -> None:
+        with self._lock:
+            self._stale_slugs.add(slug)
+            if self._verifying:
+                self._pending.add(slug)
+            if len(self._stale_slugs) > MAX_CHANGED_SLUGS:
+                self._is_verified = False
+
+    def clear(self) -> None:
+        # Any redirect may have changed, so check the snapshot again. Until
+        # then, redirects are looked up in the database.
+        with self._lock:
+            self._is_verified = False
+            self._generation += 1
@@ -1,15 +1,135 @@
-from base64 import b64encode
+import csv
+import json
+import os
+import sqlite3
+import stat
+import sys
+import tempfile
+import time
+import zipfile
+from base64 import b64decode, b64encode
+from datetime import UTC, datetime, timedelta
+from inspect import isawaitable
+from io import BytesIO, StringIO
+from pathlib import Path
+from threading import Event
+from typing import Any
+from unittest import mock
 
+import tablib
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.http import HttpRequest
-from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.core.cache import cache
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import QuerySet
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponseBase,
+    HttpResponsePermanentRedirect,
+    HttpResponseRedirect,
+)
+from django.test import (
+    AsyncRequestFactory,
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.client import ClientHandler
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from django.views import View
+from import_export.signals import post_import
+from PIL import Image
 
-from .models import Redirect
-from .utils import check_basic_auth
+from .admin import BulkRedirectResource, RedirectAdmin, RedirectResource
+from .bloom import BloomFilter
+from .cache import (
+    LOOKUP_FIELDS,
+    CachedRedirect,
+    RedirectCache,
+    RedirectLookup,
+    SlugFilter,
+    SlugRedirects,
+    aget_redirect,
+    get_redirect,
+    redirect_cache,
+    slug_filter,
+)
+from .edge import (
+    EdgeMapRegenerator,
+    EdgeMapResult,
+    EdgeMapStats,
+    edge_map_regenerator,
+    get_edge_queryset,
+    iter_edge_map,
+    write_edge_map,
+)
+from .exports import get_export_fields, iter_export
+from .handlers import FastPathMiddlewareMixin, RedirectDispatcher
+from .imports import RejectedRow, import_redirects, iter_records, upsert_redirects
+from .invalidation import SqliteListener
+from .models import Redirect, SlugCounter
+from .prefixes import PrefixTrie, get_destination, prefix_redirects
+from .qrcodes import (
+    QRCodeCache,
+    QRCodeOptions,
+    get_etag,
+    make_qrcode,
+    qrcode_cache,
+    render_qrcode,
+)
+from .responses import RedirectResponseTemplate, build_redirect_response
+from .search import (
+    SEARCH_TABLE,
+    SQLITE_TRIGGERS,
+    _sqlite_search_ready,
+    ensure_search_index,
+    has_sqlite_search_index,
+    search_redirects,
+)
+from .slugs import SlugGenerator
+from .snapshot import (
+    RedirectSnapshot,
+    SnapshotError,
+    SnapshotReader,
+    SnapshotRecord,
+    write_snapshot,
+)
+from .throttle import (
+    CountMinSketch,
+    FailureThrottle,
+    auth_throttle,
+    slug_auth_throttle,
+)
+from .utils import (
+    check_basic_auth,
+    check_basic_auth_token,
+    get_basic_auth_token,
+    get_request_host,
+)
+from .views import (
+    AsyncHandleRedirectView,
+    AsyncPrefixRedirectView,
+    AsyncRedirectQRCodeView,
+    AsyncRootRedirectView,
+    HandleRedirectView,
+)
 
 
 class RedirectViewTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+        auth_throttle.clear()
+        slug_auth_throttle.clear()
+
     def test_absolute_url(self) -> None:
         redirect = Redirect.objects.create(
             slug="test", destination="https://example.com"
@@ -110,205 +230,3013 @@ class RedirectViewTestCase(TestCase):
         response = self.client.get(reverse("redirects:redirect", args=[redirect.slug]))
         self.assertEqual(response.status_code, 404)
 
+    def test_host(self) -> None:
+        Redirect.objects.create(
+            slug="hosted", destination="https://example.com", host="go.example.com"
+        )
+        Redirect.objects.create(slug="anywhere", destination="https://example.com")
 
-class CheckBasicAuthTestCase(SimpleTestCase):
-    def setUp(self) -> None:
-        self.factory = RequestFactory()
+        for host in ["go.example.com", "GO.example.com", "go.example.com:8000"]:
+            with self.subTest(host=host):
+                response = self.client.get("/hosted", headers={"host": host})
+                self.assertEqual(response.status_code, 307)
+                self.assertEqual(response.headers["Location"], "https://example.com")
 
-    def _get_request(self, credentials: str) -> HttpRequest:
-        return self.factory.get(
-            "/",
-            headers={
-                "Authorization": "Basic " + b64encode(credentials.encode()).decode()
-            },
+                response = self.client.get("/hosted.svg", headers={"host": host})
+                self.assertEqual(response.status_code, 200)
+
+        for host in ["example.com", "other.example.com", "testserver"]:
+            with self.subTest(host=host):
+                response = self.client.get("/hosted", headers={"host": host})
+                self.assertEqual(response.status_code, 404)
+
+                response = self.client.get("/hosted.svg", headers={"host": host})
+                self.assertEqual(response.status_code, 404)
+
+                response = self.client.get("/anywhere", headers={"host": host})
+                self.assertEqual(response.status_code, 307)
+
+    def test_response_prepared(self) -> None:
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        self.client.get("/test")
+
+        redirects = redirect_cache.get("test")
+        assert redirects is not None
+        template = redirects[""].response_template
+        assert template is not None
+
+        with mock.patch.object(template, "render", wraps=template.render) as render:
+            response = self.client.get("/test")
+        render.assert_called_once_with()
+        self.assertEqual(response.headers["Location"], "https://example.com")
+
+    def test_host_validation(self) -> None:
+        redirect = Redirect(
+            slug="hosted", destination="https://example.com", host="Go.Example.com"
         )
+        redirect.full_clean()
+        self.assertEqual(redirect.host, "go.example.com")
 
-    def test_no_header(self) -> None:
-        self.assertFalse(
-            check_basic_auth(self.factory.get("/"), "username", "password")
+        for host in [
+            "https://example.com",
+            "example.com:8000",
+            "example.com/",
+            "-a.com",
+        ]:
+            with (
+                self.subTest(host=host),
+                self.assertRaisesMessage(ValidationError, "valid hostname"),
+            ):
+                Redirect(
+                    slug="hosted", destination="https://example.com", host=host
+                ).full_clean()
+
+    def test_host_overlapping_slugs(self) -> None:
+        Redirect.objects.create(slug="shared", destination="https://example.com")
+        Redirect.objects.create(
+            slug="shared", destination="https://go.example.com", host="go.example.com"
+        )
+        Redirect.objects.create(slug="docs/*", destination="https://example.com/*")
+        Redirect.objects.create(
+            slug="docs/*",
+            destination="https://go.example.com/*",
+            host="go.example.com",
         )
 
-    def test_wrong_credentials(self) -> None:
-        self.assertFalse(
-            check_basic_auth(self._get_request("wrong:wrong"), "username", "password")
+        for host, destination in [
+            ("go.example.com", "https://go.example.com"),
+            ("example.com", "https://example.com"),
+            ("testserver", "https://example.com"),
+        ]:
+            with self.subTest(host=host):
+                response = self.client.get("/shared", headers={"host": host})
+                self.assertEqual(response.headers["Location"], destination)
+
+                response = self.client.get("/docs/guide", headers={"host": host})
+                self.assertEqual(response.headers["Location"], destination + "/guide")
+
+    def test_host_fallback(self) -> None:
+        Redirect.objects.create(slug="shared", destination="https://example.com")
+        hosted = Redirect.objects.create(
+            slug="shared",
+            destination="https://go.example.com",
+            host="go.example.com",
+            is_enabled=False,
         )
 
-    def test_correct_credentials(self) -> None:
-        self.assertTrue(
-            check_basic_auth(
-                self._get_request("username:password"), "username", "password"
-            )
+        response = self.client.get("/shared", headers={"host": "go.example.com"})
+        self.assertEqual(response.headers["Location"], "https://example.com")
+
+        hosted.is_enabled = True
+        hosted.save()
+
+        response = self.client.get("/shared", headers={"host": "go.example.com"})
+        self.assertEqual(response.headers["Location"], "https://go.example.com")
+
+    def test_host_unique(self) -> None:
+        Redirect.objects.create(slug="shared", destination="https://example.com")
+
+        Redirect(
+            slug="shared", destination="https://example.com", host="go.example.com"
+        ).full_clean()
+
+        with self.assertRaisesMessage(ValidationError, "already exists"):
+            Redirect(slug="shared", destination="https://example.com").full_clean()
+
+    def test_get_request_host(self) -> None:
+        for host, expected in [
+            ("example.com", "example.com"),
+            ("Example.COM:8000", "example.com"),
+            ("example.com.", "example.com"),
+            ("[::1]", "[::1]"),
+            ("[::1]:8000", "[::1]"),
+        ]:
+            with self.subTest(host=host):
+                request = RequestFactory().get("/", headers={"host": host})
+                self.assertEqual(get_request_host(request), expected)
+
+
+class PrefixRedirectViewTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+        prefix_redirects.clear()
+        auth_throttle.clear()
+        slug_auth_throttle.clear()
+
+        self.redirect = Redirect.objects.create(
+            slug="docs/*", destination="https://new.example.com/docs/*"
         )
 
-    def test_missing_credentials(self) -> None:
-        self.assertFalse(
-            check_basic_auth(
-                self.factory.get("/", headers={"Authorization": "Basic"}),
-                "username",
-                "password",
-            )
+    def test_prefix(self) -> None:
+        for path, destination in [
+            ("/docs/", "https://new.example.com/docs/"),
+            ("/docs/guide", "https://new.example.com/docs/guide"),
+            ("/docs/guide/intro/", "https://new.example.com/docs/guide/intro/"),
+            ("/docs/caf%C3%A9", "https://new.example.com/docs/caf%C3%A9"),
+        ]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 307)
+                self.assertEqual(response.headers["Location"], destination)
+                self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+
+    def test_absolute_url(self) -> None:
+        self.assertEqual(self.redirect.get_absolute_url(), "/docs/")
+
+        response = self.client.get(self.redirect.get_absolute_url())
+        self.assertEqual(response.status_code, 307)
+
+    def test_no_match(self) -> None:
+        for path in ["/docs", "/documents/guide", "/other/docs/guide"]:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+    def test_exact_slug_priority(self) -> None:
+        Redirect.objects.create(slug="docs", destination="https://example.com/docs")
+
+        response = self.client.get("/docs/")
+        self.assertEqual(response.headers["Location"], "https://example.com/docs")
+
+        response = self.client.get("/docs/guide")
+        self.assertEqual(
+            response.headers["Location"], "https://new.example.com/docs/guide"
         )
 
-    def test_multiple_credentials(self) -> None:
-        credentials = b64encode(b"username:password").decode()
-        self.assertTrue(
-            check_basic_auth(
-                self.factory.get(
-                    "/",
-                    headers={
-                        "Authorization": f"Basic {credentials}, Basic {credentials}"
-                    },
-                ),
-                "username",
-                "password",
-            )
+    def test_longest_prefix(self) -> None:
+        Redirect.objects.create(
+            slug="docs/v1/*", destination="https://old.example.com/*", is_permanent=True
         )
 
-    def test_not_base64(self) -> None:
-        self.assertFalse(
-            check_basic_auth(
-                self.factory.get(
-                    "/",
-                    headers={"Authorization": "Basic mypassword"},
-                ),
-                "username",
-                "password",
-            )
+        response = self.client.get("/docs/v1/guide")
+        self.assertEqual(response.status_code, 308)
+        self.assertEqual(response.headers["Location"], "https://old.example.com/guide")
+
+        response = self.client.get("/docs/v2/guide")
+        self.assertEqual(
+            response.headers["Location"], "https://new.example.com/docs/v2/guide"
         )
 
-    def test_not_basic(self) -> None:
-        self.assertFalse(
-            check_basic_auth(
-                self.factory.get(
-                    "/",
-                    headers={"Authorization": "Bearer mypassword"},
-                ),
-                "username",
-                "password",
-            )
+    def test_fixed_destination(self) -> None:
+        Redirect.objects.create(slug="blog/*", destination="https://example.com/")
+
+        response = self.client.get("/blog/2020/post")
+        self.assertEqual(response.headers["Location"], "https://example.com/")
+
+    def test_disabled(self) -> None:
+        self.redirect.is_enabled = False
+        self.redirect.save()
+
+        self.assertEqual(self.client.get("/docs/guide").status_code, 404)
+
+    def test_basic_auth(self) -> None:
+        Redirect.objects.create(
+            slug="private/*",
+            destination="https://example.com/*",
+            basic_auth_username="user",
+            basic_auth_password="password",
         )
 
+        self.assertEqual(self.client.get("/private/file").status_code, 401)
 
-class RedirectCreateViewTestCase(TestCase):
-    user: User
+        response = self.client.get(
+            "/private/file",
+            headers={"Authorization": f"Basic {b64encode(b'user:password').decode()}"},
+        )
+        self.assertEqual(response.headers["Location"], "https://example.com/file")
 
-    @classmethod
-    def setUpTestData(cls) -> None:
-        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+    def test_response_built(self) -> None:
+        # Each path has a different destination, so nothing is prepared
+        with mock.patch(
+            "macau.redirects.views.build_redirect_response",
+            wraps=build_redirect_response,
+        ) as build:
+            self.client.get("/docs/guide")
+        build.assert_called_once_with("https://new.example.com/docs/guide", False)
 
-    def setUp(self) -> None:
-        self.client.force_login(self.user)
+    def test_trie_cached(self) -> None:
+        self.client.get("/docs/guide")
 
-    def test_redirect_to_create(self) -> None:
-        response = self.client.get("/https://example.com", follow=True)
+        with self.assertNumQueries(0):
+            response = self.client.get("/docs/other")
+        self.assertEqual(response.status_code, 307)
 
-        self.assertEqual(response.status_code, 200)
-        self.assertContains(response, "Add redirect")
+    def test_reserved_paths(self) -> None:
+        self.assertEqual(self.client.get("/-/health/").status_code, 200)
+
+    def test_validation(self) -> None:
+        for slug in ["api/*", "docs/v1/*", "a/*"]:
+            with self.subTest(slug=slug):
+                Redirect(slug=slug, destination="https://example.com").full_clean()
+
+        for slug in ["/*", "docs/", "docs*", "docs/v1", "-/admin/*", "docs//*", "*"]:
+            with (
+                self.subTest(slug=slug),
+                self.assertRaisesMessage(ValidationError, "slug"),
+            ):
+                Redirect(slug=slug, destination="https://example.com").full_clean()
 
+    async def test_async(self) -> None:
+        response = await AsyncPrefixRedirectView.as_view()(  # type: ignore[misc]
+            AsyncRequestFactory().get("/docs/guide"), path="docs/guide"
+        )
+        self.assertEqual(response.status_code, 307)
         self.assertEqual(
-            response.context["adminform"].form.initial,
-            {"destination": "https://example.com"},
+            response.headers["Location"], "https://new.example.com/docs/guide"
         )
 
-    def test_unauthenticated(self) -> None:
-        self.client.logout()
-        response = self.client.get("/https://example.com")
-        self.assertEqual(response.status_code, 404)
+        response = await AsyncHandleRedirectView.as_view()(  # type: ignore[misc]
+            AsyncRequestFactory().get("/docs/"), slug="docs"
+        )
+        self.assertEqual(response.headers["Location"], "https://new.example.com/docs/")
 
 
-class RedirectAdminTestCase(TestCase):
-    user: User
+class PrefixTrieTestCase(SimpleTestCase):
+    def test_match(self) -> None:
+        trie: PrefixTrie[str] = PrefixTrie()
+        trie.add("docs/*", "docs")
+        trie.add("docs/v1/*", "v1")
 
-    @classmethod
-    def setUpTestData(cls) -> None:
-        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+        self.assertEqual(len(trie), 2)
+        self.assertEqual(trie.match("docs/"), ("docs/*", "docs", ""))
+        self.assertEqual(trie.match("docs/a/b"), ("docs/*", "docs", "a/b"))
+        self.assertEqual(trie.match("docs/v1/a"), ("docs/v1/*", "v1", "a"))
+        self.assertEqual(trie.match("docs/v1"), ("docs/*", "docs", "v1"))
+        self.assertIsNone(trie.match("docs"))
+        self.assertIsNone(trie.match("other/a"))
+        self.assertIsNone(trie.match(""))
+
+    def test_replace(self) -> None:
+        trie: PrefixTrie[str] = PrefixTrie()
+        trie.add("docs/*", "old")
+        trie.add("docs/*", "new")
+
+        self.assertEqual(len(trie), 1)
+        self.assertEqual(trie.match("docs/a"), ("docs/*", "new", "a"))
 
+    def test_get_destination(self) -> None:
+        self.assertEqual(
+            get_destination("https://example.com/*", "a b/c"),
+            "https://example.com/a%20b/c",
+        )
+        self.assertEqual(
+            get_destination("https://example.com/", "a"), "https://example.com/"
+        )
+
+
+class ScheduledRedirectTestCase(TestCase):
     def setUp(self) -> None:
-        self.client.force_login(self.user)
+        redirect_cache.clear()
+        slug_filter.clear()
+        prefix_redirects.clear()
 
-    def test_add_view(self) -> None:
-        response = self.client.get(reverse("admin:redirects_redirect_add"))
-        self.assertEqual(response.status_code, 200)
+        self.now = timezone.now()
 
-    def test_change_view(self) -> None:
-        redirect = Redirect.objects.create(
-            slug="disabled",
+    def test_not_yet_active(self) -> None:
+        Redirect.objects.create(
+            slug="test",
             destination="https://example.com",
+            active_from=self.now + timedelta(minutes=1),
         )
-        response = self.client.get(
-            reverse("admin:redirects_redirect_change", args=[redirect.slug])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/test").status_code, 404)
+            self.assertEqual(self.client.get("/test.svg").status_code, 404)
+
+        # The cached times are checked, without querying the database again
+        with (
+            mock.patch("time.time", return_value=self.now.timestamp() + 60),
+            self.assertNumQueries(0),
+        ):
+            self.assertEqual(self.client.get("/test").status_code, 307)
+            self.assertEqual(self.client.get("/test.svg").status_code, 200)
+
+    def test_expired(self) -> None:
+        Redirect.objects.create(
+            slug="test",
+            destination="https://example.com",
+            expires_at=self.now + timedelta(minutes=1),
         )
-        self.assertEqual(response.status_code, 200)
 
+        self.assertEqual(self.client.get("/test").status_code, 307)
 
-class RootRedirectViewTestCase(SimpleTestCase):
-    @override_settings(ROOT_REDIRECT_URL="https://example.com")
-    def test_custom_root_redirect_url(self) -> None:
-        response = self.client.get("/")
-        self.assertRedirects(
-            response, "https://example.com", fetch_redirect_response=False
+        with (
+            mock.patch("time.time", return_value=self.now.timestamp() + 60),
+            self.assertNumQueries(0),
+        ):
+            self.assertEqual(self.client.get("/test").status_code, 404)
+            self.assertEqual(self.client.get("/test.svg").status_code, 404)
+
+    async def test_async(self) -> None:
+        await Redirect.objects.acreate(
+            slug="test",
+            destination="https://example.com",
+            expires_at=self.now - timedelta(minutes=1),
         )
-        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
-        self.assertIn("no-cache", response.headers["Cache-Control"])
 
-    @override_settings(ROOT_REDIRECT_URL="admin")
-    def test_redirect_root_to_admin(self) -> None:
-        response = self.client.get("/")
-        self.assertRedirects(
-            response, reverse("admin:index"), fetch_redirect_response=False
+        with self.assertRaises(Http404):
+            await aget_redirect("test")
+
+    def test_cache_expires_at_boundary(self) -> None:
+        Redirect.objects.create(
+            slug="test",
+            destination="https://example.com",
+            active_from=self.now - timedelta(minutes=1),
+            expires_at=self.now + timedelta(seconds=30),
         )
-        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
-        self.assertIn("no-cache", response.headers["Cache-Control"])
 
-    @override_settings(ROOT_REDIRECT_URL="")
-    def test_no_root_redirect_url(self) -> None:
-        response = self.client.get("/")
-        self.assertEqual(response.status_code, 404)
+        with (
+            mock.patch("time.time", return_value=self.now.timestamp()),
+            mock.patch("time.monotonic", return_value=1000),
+        ):
+            get_redirect("test")
 
+        with mock.patch("time.monotonic", return_value=1029):
+            self.assertIsNotNone(redirect_cache.get("test"))
+        with mock.patch("time.monotonic", return_value=1030):
+            self.assertIsNone(redirect_cache.get("test"))
 
-class RedirectQRCodeSVGViewTestCase(TestCase):
-    def test_svg(self) -> None:
-        redirect = Redirect.objects.create(
-            slug="test", destination="https://example.com"
+    def test_prefix(self) -> None:
+        Redirect.objects.create(
+            slug="docs/*",
+            destination="https://example.com/*",
+            expires_at=self.now - timedelta(minutes=1),
         )
 
-        with self.assertNumQueries(1):
-            response = self.client.get(
-                reverse("redirects:qrcode", args=[redirect.slug])
+        self.assertEqual(self.client.get("/docs/guide").status_code, 404)
+
+    def test_validation(self) -> None:
+        with self.assertRaisesMessage(ValidationError, "Must be after"):
+            Redirect(
+                slug="test",
+                destination="https://example.com",
+                active_from=self.now,
+                expires_at=self.now,
+            ).full_clean()
+
+    def test_expire_redirects(self) -> None:
+        for i in range(3):
+            Redirect.objects.create(
+                slug=f"expired-{i}",
+                destination="https://example.com",
+                expires_at=self.now - timedelta(minutes=i),
             )
+        Redirect.objects.create(
+            slug="active",
+            destination="https://example.com",
+            expires_at=self.now + timedelta(minutes=1),
+        )
+        Redirect.objects.create(slug="unscheduled", destination="https://example.com")
 
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.headers["Content-Type"], "image/svg+xml")
-        self.assertIn(b"<svg", response.content)
+        self.assertEqual(self.client.get("/expired-0").status_code, 404)
+        self.assertIn("expired-0", redirect_cache._entries)
 
-    def test_png(self) -> None:
-        redirect = Redirect.objects.create(
-            slug="test", destination="https://example.com"
+        stdout = StringIO()
+        call_command("expire_redirects", "--batch-size=2", stdout=stdout)
+
+        self.assertIn("Disabled 3 expired redirects", stdout.getvalue())
+        self.assertEqual(
+            set(
+                Redirect.objects.filter(is_enabled=True).values_list("slug", flat=True)
+            ),
+            {"active", "unscheduled"},
         )
+        self.assertGreater(Redirect.objects.get(slug="expired-0").modified_at, self.now)
+        self.assertNotIn("expired-0", redirect_cache._entries)
 
-        with self.assertNumQueries(1):
-            response = self.client.get(
-                reverse("redirects:qrcode-png", args=[redirect.slug])
-            )
 
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.headers["Content-Type"], "image/png")
+class FastPathClientHandler(FastPathMiddlewareMixin, ClientHandler):
+    pass
 
-    def test_cant_access_disabled_redirect(self) -> None:
-        redirect = Redirect.objects.create(
-            slug="disabled",
+
+class FastPathClient(Client):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.handler = FastPathClientHandler(enforce_csrf_checks=False)
+
+
+class FastPathRedirectViewTestCase(RedirectViewTestCase):
+    """
+    Run the redirect tests through the fast path middleware stack.
+    """
+
+    client_class = FastPathClient
+
+    def test_same_response(self) -> None:
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        Redirect.objects.create(
+            slug="basic",
             destination="https://example.com",
+            basic_auth_username="username",
+            basic_auth_password="password",
         )
 
-        response = self.client.get(reverse("redirects:qrcode", args=[redirect.slug]))
-        self.assertEqual(response.status_code, 200)
+        for url in ["/test", "/test/", "/basic", "/unknown", "/test.svg"]:
+            with self.subTest(url=url):
+                redirect_cache.clear()
+                response = Client().get(url)
 
-        redirect.is_enabled = False
-        redirect.save()
+                redirect_cache.clear()
+                fast_response = self.client.get(url)
 
-        response = self.client.get(reverse("redirects:qrcode", args=[redirect.slug]))
-        self.assertEqual(response.status_code, 404)
+                self.assertEqual(fast_response.status_code, response.status_code)
+                self.assertEqual(dict(fast_response.headers), dict(response.headers))
+                self.assertEqual(fast_response.content, response.content)
 
-    def test_unknown_slug(self) -> None:
-        response = self.client.get(reverse("redirects:qrcode", args=["unknown"]))
-        self.assertEqual(response.status_code, 404)
+
+class RedirectResponseTemplateTestCase(SimpleTestCase):
+    destinations = [
+        "https://example.com",
+        "https://example.com/ünïcode path?q=a b#fragment",
+        "/relative",
+    ]
+
+    def build_response(
+        self, destination: str, is_permanent: bool
+    ) -> HttpResponseRedirect | HttpResponsePermanentRedirect:
+        # How redirect responses used to be built for each request
+        redirect_class = (
+            HttpResponsePermanentRedirect if is_permanent else HttpResponseRedirect
+        )
+        response = redirect_class(destination, preserve_request=True)
+        add_never_cache_headers(response)
+        response.headers["X-Robots-Tag"] = "noindex"
+        return response
+
+    def test_identical(self) -> None:
+        for destination in self.destinations:
+            for is_permanent in [True, False]:
+                with (
+                    self.subTest(destination=destination, is_permanent=is_permanent),
+                    mock.patch("time.time", return_value=1_700_000_000.5),
+                ):
+                    template = RedirectResponseTemplate(destination, is_permanent)
+                    response = template.render()
+                    expected = self.build_response(destination, is_permanent)
+
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response.reason_phrase, expected.reason_phrase)
+                    self.assertEqual(
+                        response.serialize_headers(), expected.serialize_headers()
+                    )
+                    self.assertEqual(response.content, expected.content)
+                    self.assertEqual(response.url, expected.url)
+
+    def test_view(self) -> None:
+        for is_permanent in [True, False]:
+            with (
+                self.subTest(is_permanent=is_permanent),
+                mock.patch("time.time", return_value=1_700_000_000.5),
+            ):
+                redirect = CachedRedirect(
+                    "https://example.com/ü",
+                    is_permanent=is_permanent,
+                    basic_auth_token="",
+                )
+                expected = self.build_response("https://example.com/ü", is_permanent)
+
+                prepared_redirect = redirect._replace(
+                    response_template=RedirectResponseTemplate(
+                        redirect.destination, is_permanent
+                    )
+                )
+
+                # Redirects which aren't cached don't have a template
+                for cached_redirect in [redirect, prepared_redirect]:
+                    response = HandleRedirectView()._handle_redirect(
+                        RequestFactory().get("/test"), "test", cached_redirect
+                    )
+                    self.assertEqual(
+                        response.serialize_headers(), expected.serialize_headers()
+                    )
+
+    def test_prepared_when_cached(self) -> None:
+        redirects = SlugRedirects(
+            {"": CachedRedirect("https://example.com", False, "")}
+        )
+        self.assertIsNone(redirects[""].response_template)
+
+        redirects.prepare_responses()
+
+        template = redirects[""].response_template
+        assert template is not None
+        self.assertEqual(template.headers["Location"], "https://example.com")
+
+    def test_expires_updated(self) -> None:
+        template = RedirectResponseTemplate("https://example.com", False)
+
+        for now in [1_700_000_000.0, 1_700_000_000.9, 1_700_000_001.0]:
+            with self.subTest(now=now), mock.patch("time.time", return_value=now):
+                self.assertEqual(
+                    template.render().headers["Expires"],
+                    self.build_response("https://example.com", False).headers[
+                        "Expires"
+                    ],
+                )
+
+    def test_copied(self) -> None:
+        template = RedirectResponseTemplate("https://example.com", False)
+
+        response = template.render()
+        response.headers["X-Test"] = "test"
+        response.write("content")
+
+        response = template.render()
+        self.assertNotIn("X-Test", response.headers)
+        self.assertEqual(response.content, b"")
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+        auth_throttle.clear()
+        slug_auth_throttle.clear()
+        self.factory = AsyncRequestFactory()
+
+    async def _call_view(
+        self, view_class: type[View], request: HttpRequest, **kwargs: Any
+    ) -> HttpResponseBase:
+        response = view_class.as_view()(request, **kwargs)
+        if not isawaitable(response):
+            self.fail(f"{view_class.__name__} isn't async")
+        return await response  # type: ignore[no-any-return]
+
+    async def test_redirect(self) -> None:
+        redirect = await Redirect.objects.acreate(
+            slug="test", destination="https://example.com", is_permanent=True
+        )
+
+        response = await self._call_view(
+            AsyncHandleRedirectView,
+            self.factory.get(redirect.get_absolute_url()),
+            slug=redirect.slug,
+        )
+
+        self.assertEqual(response.status_code, 308)
+        self.assertEqual(response.headers["Location"], redirect.destination)
+        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+
+    async def test_basic_auth(self) -> None:
+        redirect = await Redirect.objects.acreate(
+            slug="basic",
+            destination="https://example.com",
+            basic_auth_username="username",
+            basic_auth_password="password",
+        )
+
+        response = await self._call_view(
+            AsyncHandleRedirectView,
+            self.factory.get(redirect.get_absolute_url()),
+            slug=redirect.slug,
+        )
+        self.assertEqual(response.status_code, 401)
+
+    @mock.patch.object(auth_throttle, "limit", 1)
+    async def test_throttled(self) -> None:
+        redirect = await Redirect.objects.acreate(
+            slug="basic",
+            destination="https://example.com",
+            basic_auth_username="username",
+            basic_auth_password="password",
+        )
+        request = self.factory.get(
+            redirect.get_absolute_url(),
+            headers={"Authorization": f"Basic {b64encode(b'wrong:wrong').decode()}"},
+        )
+
+        response = await self._call_view(
+            AsyncHandleRedirectView, request, slug=redirect.slug
+        )
+        self.assertEqual(response.status_code, 401)
+
+        response = await self._call_view(
+            AsyncHandleRedirectView, request, slug=redirect.slug
+        )
+        self.assertEqual(response.status_code, 429)
+
+    async def test_unknown_slug(self) -> None:
+        with self.assertRaises(Http404):
+            await self._call_view(
+                AsyncHandleRedirectView, self.factory.get("/unknown"), slug="unknown"
+            )
+
+    async def test_qrcode(self) -> None:
+        redirect = await Redirect.objects.acreate(
+            slug="test", destination="https://example.com"
+        )
+
+        for image_format, content_type in AsyncRedirectQRCodeView.CONTENT_TYPE.items():
+            with self.subTest(image_format=image_format):
+                response = await self._call_view(
+                    AsyncRedirectQRCodeView,
+                    self.factory.get(f"/test.{image_format}"),
+                    slug=redirect.slug,
+                    image_format=image_format,
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.headers["Content-Type"], content_type)
+
+    async def test_qrcode_disabled_redirect(self) -> None:
+        redirect = await Redirect.objects.acreate(
+            slug="disabled", destination="https://example.com", is_enabled=False
+        )
+
+        with self.assertRaises(Http404):
+            await self._call_view(
+                AsyncRedirectQRCodeView,
+                self.factory.get("/disabled.svg"),
+                slug=redirect.slug,
+                image_format="svg",
+            )
+
+    @override_settings(ROOT_REDIRECT_URL="https://example.com")
+    async def test_root_redirect(self) -> None:
+        for method in ["get", "head", "options"]:
+            with self.subTest(method=method):
+                response = await self._call_view(
+                    AsyncRootRedirectView, getattr(self.factory, method)("/")
+                )
+                self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+                self.assertIn("no-cache", response.headers["Cache-Control"])
+
+    @override_settings(ROOT_REDIRECT_URL="")
+    async def test_no_root_redirect_url(self) -> None:
+        with self.assertRaises(Http404):
+            await self._call_view(AsyncRootRedirectView, self.factory.get("/"))
+
+
+class RedirectDispatcherTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.application = mock.Mock(return_value=[b"full"])
+        self.fast_application = mock.Mock(return_value=[b"fast"])
+        self.dispatcher = RedirectDispatcher(self.application, self.fast_application)
+
+    def test_routing(self) -> None:
+        for method, path, is_fast_path in [
+            ("GET", "/test", True),
+            ("GET", "/test/", True),
+            ("HEAD", "/test", True),
+            ("GET", "/test.svg", True),
+            ("GET", "/test.png", True),
+            ("POST", "/test", False),
+            ("GET", "/", False),
+            ("GET", "/-/admin/", False),
+            ("GET", "/-/health/", False),
+            ("GET", "/static/macau/admin.css", False),
+            ("GET", "/https://example.com", False),
+        ]:
+            with self.subTest(method=method, path=path):
+                environ = {"REQUEST_METHOD": method, "PATH_INFO": path}
+                self.assertEqual(
+                    self.dispatcher(environ, mock.Mock()),
+                    [b"fast"] if is_fast_path else [b"full"],
+                )
+
+
+class RedirectCacheInvalidationTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+
+        self.redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+        self.url = reverse("redirects:redirect", args=[self.redirect.slug])
+
+    def test_cached(self) -> None:
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 307)
+        self.assertEqual(response.headers["Location"], self.redirect.destination)
+
+    def test_save_invalidates(self) -> None:
+        self.client.get(self.url)
+
+        self.redirect.destination = "https://example.org"
+        self.redirect.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.headers["Location"], "https://example.org")
+
+    def test_delete_invalidates(self) -> None:
+        self.client.get(self.url)
+
+        self.redirect.delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_queryset_delete_invalidates(self) -> None:
+        self.client.get(self.url)
+
+        Redirect.objects.filter(slug=self.redirect.slug).delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_import_invalidates(self) -> None:
+        self.client.get(self.url)
+        self.assertEqual(len(redirect_cache), 1)
+
+        post_import.send(sender=None, model=Redirect)
+
+        self.assertEqual(len(redirect_cache), 0)
+
+
+class RedirectCacheTestCase(SimpleTestCase):
+    redirect = CachedRedirect(
+        destination="https://example.com",
+        is_permanent=False,
+        basic_auth_token="",
+    )
+
+    def test_get_set(self) -> None:
+        cache: RedirectCache[CachedRedirect] = RedirectCache(maxsize=10, ttl=60)
+        self.assertIsNone(cache.get("test"))
+
+        cache.set("test", self.redirect)
+        self.assertEqual(cache.get("test"), self.redirect)
+
+        cache.invalidate("test")
+        self.assertIsNone(cache.get("test"))
+
+    def test_lru_eviction(self) -> None:
+        cache: RedirectCache[CachedRedirect] = RedirectCache(maxsize=2, ttl=60)
+
+        cache.set("a", self.redirect)
+        cache.set("b", self.redirect)
+
+        # Mark "a" as recently used
+        cache.get("a")
+
+        cache.set("c", self.redirect)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_ttl_expiry(self) -> None:
+        cache: RedirectCache[CachedRedirect] = RedirectCache(maxsize=10, ttl=60)
+
+        with mock.patch("time.monotonic", return_value=1000):
+            cache.set("test", self.redirect)
+
+        with mock.patch("time.monotonic", return_value=1059):
+            self.assertIsNotNone(cache.get("test"))
+
+        with mock.patch("time.monotonic", return_value=1060):
+            self.assertIsNone(cache.get("test"))
+
+        self.assertEqual(len(cache), 0)
+
+    def test_entry_ttl(self) -> None:
+        cache: RedirectCache[CachedRedirect] = RedirectCache(maxsize=10, ttl=60)
+
+        with mock.patch("time.monotonic", return_value=1000):
+            cache.set("short", self.redirect, ttl=10)
+            cache.set("long", self.redirect, ttl=600)
+
+        with mock.patch("time.monotonic", return_value=1010):
+            self.assertIsNone(cache.get("short"))
+            self.assertIsNotNone(cache.get("long"))
+
+        with mock.patch("time.monotonic", return_value=1060):
+            self.assertIsNone(cache.get("long"))
+
+    def test_disabled(self) -> None:
+        cache: RedirectCache[CachedRedirect] = RedirectCache(maxsize=0, ttl=60)
+        cache.set("test", self.redirect)
+        self.assertIsNone(cache.get("test"))
+
+
+class RedirectLookupTestCase(TestCase):
+    def test_lookup(self) -> None:
+        Redirect.objects.create(
+            slug="test",
+            destination="https://example.com",
+            is_permanent=True,
+            basic_auth_username="user",
+            basic_auth_password="password",
+        )
+        lookup = RedirectLookup()
+
+        with self.assertNumQueries(1):
+            redirects = lookup("test")
+
+        self.assertEqual(
+            redirects,
+            {
+                "": CachedRedirect(
+                    destination="https://example.com",
+                    is_permanent=True,
+                    basic_auth_token=b64encode(b"user:password").decode(),
+                )
+            },
+        )
+        assert redirects is not None
+        self.assertIs(redirects[""].is_permanent, True)
+
+    def test_hosts(self) -> None:
+        for host in ["", "go.example.com", "other.example.com"]:
+            Redirect.objects.create(
+                slug="test", host=host, destination=f"https://example.com/{host}"
+            )
+
+        with self.assertNumQueries(1):
+            redirects = RedirectLookup()("test")
+
+        assert redirects is not None
+        self.assertEqual(
+            {host: redirect.destination for host, redirect in redirects.items()},
+            {
+                "": "https://example.com/",
+                "go.example.com": "https://example.com/go.example.com",
+                "other.example.com": "https://example.com/other.example.com",
+            },
+        )
+
+    def test_schedule(self) -> None:
+        active_from = datetime(2030, 1, 1, 12, 30, tzinfo=UTC)
+        expires_at = datetime(2030, 2, 1, tzinfo=UTC)
+        Redirect.objects.create(
+            slug="test",
+            destination="https://example.com",
+            active_from=active_from,
+            expires_at=expires_at,
+        )
+
+        redirects = RedirectLookup()("test")
+
+        assert redirects is not None
+        redirect = redirects[""]
+        self.assertEqual(redirect.active_from, active_from.timestamp())
+        self.assertEqual(redirect.expires_at, expires_at.timestamp())
+
+    def test_missing(self) -> None:
+        Redirect.objects.create(
+            slug="disabled", destination="https://example.com", is_enabled=False
+        )
+        lookup = RedirectLookup()
+
+        self.assertIsNone(lookup("disabled"))
+        self.assertIsNone(lookup("missing"))
+
+    def test_query_matches_orm(self) -> None:
+        queryset = Redirect.objects.filter(slug="test", is_enabled=True).values_list(
+            *LOOKUP_FIELDS
+        )
+        sql, params = queryset.query.sql_with_params()
+
+        self.assertEqual(RedirectLookup().get_query(DEFAULT_DB_ALIAS), sql)
+        self.assertEqual(params, ("test",))
+
+
+class RedirectSnapshotTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = str(Path(tmpdir.name) / "redirects.snapshot")
+
+        self.redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+        Redirect.objects.create(
+            slug="basic",
+            destination="https://example.com/basic",
+            is_permanent=True,
+            basic_auth_username="user",
+            basic_auth_password="password",
+        )
+        Redirect.objects.create(
+            slug="disabled", destination="https://example.com", is_enabled=False
+        )
+
+        stdout = StringIO()
+        call_command("compile_redirects", output=self.path, stdout=stdout)
+        self.assertIn("Compiled 2 redirects", stdout.getvalue())
+
+        self.reader = SnapshotReader(self.path, check_interval=0, background=False)
+        for target in ["cache", "signals"]:
+            patcher = mock.patch(
+                f"macau.redirects.{target}.redirect_snapshot", self.reader
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_compiled(self) -> None:
+        snapshot = RedirectSnapshot(self.path)
+        self.addCleanup(snapshot.close)
+
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(
+            snapshot.get("test"),
+            [SnapshotRecord("https://example.com", False, "", "", None, None)],
+        )
+        self.assertEqual(
+            snapshot.get("basic"),
+            [
+                SnapshotRecord(
+                    "https://example.com/basic",
+                    True,
+                    get_basic_auth_token("user", "password"),
+                    "",
+                    None,
+                    None,
+                )
+            ],
+        )
+        self.assertEqual(snapshot.get("disabled"), [])
+        self.assertEqual(snapshot.get("missing"), [])
+
+    def test_permissions(self) -> None:
+        write_snapshot(self.path, [], compiled_at=0)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_binary_search(self) -> None:
+        slugs = [f"slug-{i}" for i in range(0, 1000, 2)] + ["ünïcode", "emoji-🍊"]
+        write_snapshot(
+            self.path,
+            [
+                (slug, (f"https://example.com/{slug}", False, "", "", None, None))
+                for slug in slugs
+            ],
+            compiled_at=0,
+        )
+        snapshot = RedirectSnapshot(self.path)
+        self.addCleanup(snapshot.close)
+
+        for slug in slugs:
+            [record] = snapshot.get(slug)
+            self.assertEqual(record.destination, f"https://example.com/{slug}")
+
+        for i in range(1, 1000, 2):
+            self.assertNotIn(f"slug-{i}", snapshot)
+        self.assertNotIn("", snapshot)
+        self.assertNotIn("zzz", snapshot)
+
+    def test_fields(self) -> None:
+        write_snapshot(
+            self.path,
+            [
+                (
+                    "hosted",
+                    ("https://example.com", True, "", "go.example.com", None, None),
+                ),
+                (
+                    "ünïcode",
+                    ("https://example.com/ü", False, "token", "", 1000.5, 2000.0),
+                ),
+            ],
+            compiled_at=0,
+        )
+        snapshot = RedirectSnapshot(self.path)
+        self.addCleanup(snapshot.close)
+
+        self.assertEqual(
+            snapshot.get("hosted"),
+            [
+                SnapshotRecord(
+                    "https://example.com", True, "", "go.example.com", None, None
+                )
+            ],
+        )
+        self.assertEqual(
+            snapshot.get("ünïcode"),
+            [
+                SnapshotRecord(
+                    "https://example.com/ü", False, "token", "", 1000.5, 2000.0
+                )
+            ],
+        )
+
+    def test_hosts(self) -> None:
+        write_snapshot(
+            self.path,
+            [
+                (slug, (f"https://example.com/{host}", False, "", host, None, None))
+                for slug in ["a", "b", "c"]
+                for host in ["z.example.com", "", "a.example.com"]
+            ],
+            compiled_at=0,
+        )
+        snapshot = RedirectSnapshot(self.path)
+        self.addCleanup(snapshot.close)
+
+        self.assertEqual(len(snapshot), 9)
+        for slug in ["a", "b", "c"]:
+            self.assertEqual(
+                [record.host for record in snapshot.get(slug)],
+                ["", "a.example.com", "z.example.com"],
+            )
+
+    def test_invalid(self) -> None:
+        Path(self.path).write_bytes(b"not a snapshot")
+        with self.assertRaisesMessage(SnapshotError, "too small"):
+            RedirectSnapshot(self.path)
+
+        Path(self.path).write_bytes(b"not a snapshot" * 10)
+        with self.assertRaisesMessage(SnapshotError, "isn't a redirect snapshot"):
+            RedirectSnapshot(self.path)
+
+        write_snapshot(
+            self.path, [("test", ("https://example.com", False, "", "", None, None))], 0
+        )
+        Path(self.path).write_bytes(Path(self.path).read_bytes()[:30])
+        with self.assertRaisesMessage(SnapshotError, "is truncated"):
+            RedirectSnapshot(self.path)
+
+        with self.assertLogs("macau.redirects.snapshot", "ERROR"):
+            self.reader.refresh()
+        self.assertIsNone(self.reader.snapshot)
+
+    def test_get_redirect(self) -> None:
+        self.reader.check_interval = 60
+        with self.assertNumQueries(2):
+            self.reader.refresh()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_redirect("test").destination, "https://example.com")
+            self.assertEqual(
+                get_redirect("basic").basic_auth_token,
+                get_basic_auth_token("user", "password"),
+            )
+            with self.assertRaises(Http404):
+                get_redirect("disabled")
+            with self.assertRaises(Http404):
+                get_redirect("missing")
+
+        # Snapshot lookups aren't cached per-process
+        self.assertEqual(len(redirect_cache), 0)
+
+    def test_view(self) -> None:
+        self.reader.refresh()
+        self.reader.check_interval = 60
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/test")
+        self.assertRedirects(
+            response, "https://example.com", 307, fetch_redirect_response=False
+        )
+
+    async def test_aget_redirect(self) -> None:
+        redirect = await aget_redirect("test")
+        self.assertEqual(redirect.destination, "https://example.com")
+        self.assertIsNotNone(self.reader.snapshot)
+
+        with self.assertRaises(Http404):
+            await aget_redirect("missing")
+
+    def test_changed_redirect(self) -> None:
+        self.redirect.destination = "https://example.com/changed"
+        self.redirect.save()
+
+        self.reader.refresh()
+        self.assertIsNone(self.reader.get_snapshot("test"))
+        self.assertIsNotNone(self.reader.get_snapshot("basic"))
+
+        self.assertEqual(
+            get_redirect("test").destination, "https://example.com/changed"
+        )
+
+    def test_created_redirect(self) -> None:
+        Redirect.objects.create(slug="new", destination="https://example.com/new")
+
+        self.assertEqual(get_redirect("new").destination, "https://example.com/new")
+
+    def test_deleted_redirect(self) -> None:
+        self.reader.refresh()
+        self.reader.check_interval = 60
+
+        self.redirect.delete()
+
+        with self.assertRaises(Http404):
+            get_redirect("test")
+        self.assertIsNotNone(self.reader.get_snapshot("basic"))
+
+    def test_disabled_without_modifying(self) -> None:
+        Redirect.objects.filter(slug="basic").update(is_enabled=False)
+
+        with self.assertLogs("macau.redirects.snapshot", "WARNING"):
+            self.reader.refresh()
+        self.assertIsNone(self.reader.get_snapshot("test"))
+
+        with self.assertRaises(Http404):
+            get_redirect("basic")
+
+    def test_invalidate(self) -> None:
+        self.reader.refresh()
+
+        self.reader.invalidate("test")
+        self.assertIsNone(self.reader.get_snapshot("test"))
+        self.assertIsNotNone(self.reader.get_snapshot("basic"))
+
+    def test_clear(self) -> None:
+        self.reader.refresh()
+
+        self.reader.clear()
+        self.assertIsNone(self.reader.get_snapshot("test"))
+
+        # The snapshot is still usable, once it's checked again
+        self.reader.refresh()
+        self.assertIsNotNone(self.reader.get_snapshot("test"))
+
+    def test_invalidate_whilst_verifying(self) -> None:
+        def get_stale_slugs(snapshot: RedirectSnapshot) -> set[str]:
+            self.reader.invalidate("basic")
+            return set()
+
+        with mock.patch.object(
+            self.reader, "_get_stale_slugs", side_effect=get_stale_slugs
+        ):
+            self.reader.refresh()
+
+        self.assertIsNone(self.reader.get_snapshot("basic"))
+        self.assertIsNotNone(self.reader.get_snapshot("test"))
+
+    def test_clear_whilst_verifying(self) -> None:
+        def get_stale_slugs(snapshot: RedirectSnapshot) -> set[str]:
+            self.reader.clear()
+            return set()
+
+        with mock.patch.object(
+            self.reader, "_get_stale_slugs", side_effect=get_stale_slugs
+        ):
+            self.reader.refresh()
+        self.assertIsNone(self.reader.get_snapshot("test"))
+
+        self.reader.refresh()
+        self.assertIsNotNone(self.reader.get_snapshot("test"))
+
+    def test_verify_in_background(self) -> None:
+        reader = SnapshotReader(self.path, check_interval=0, background=True)
+        release = Event()
+        verified = Event()
+        verify = reader._verify
+
+        def get_stale_slugs(snapshot: RedirectSnapshot) -> set[str]:
+            release.wait(timeout=5)
+            return set()
+
+        def verify_and_notify(snapshot: RedirectSnapshot, generation: int) -> None:
+            verify(snapshot, generation)
+            verified.set()
+
+        with (
+            mock.patch.object(reader, "_get_stale_slugs", side_effect=get_stale_slugs),
+            mock.patch.object(
+                reader, "_verify", side_effect=verify_and_notify
+            ) as verify_mock,
+        ):
+            reader.refresh()
+
+            # Redirects are looked up in the database until it's checked
+            self.assertIsNone(reader.get_snapshot("test"))
+            reader.refresh()
+
+            release.set()
+            self.assertTrue(verified.wait(timeout=5))
+
+        # It's only checked once at a time
+        verify_mock.assert_called_once()
+        self.assertIsNotNone(reader.get_snapshot("test"))
+
+    def test_swap(self) -> None:
+        self.reader.refresh()
+        original = self.reader.snapshot
+        assert original is not None
+
+        Redirect.objects.create(slug="new", destination="https://example.com/new")
+        call_command("compile_redirects", output=self.path, stdout=StringIO())
+
+        self.reader.refresh()
+        snapshot = self.reader.snapshot
+        assert snapshot is not None
+        self.assertIsNot(snapshot, original)
+        self.assertEqual(len(snapshot), 3)
+        self.assertIs(self.reader.get_snapshot("new"), snapshot)
+
+        # Lookups using the previous snapshot still work
+        self.assertIsNotNone(original.get("test"))
+
+    def test_missing_file(self) -> None:
+        self.reader.refresh()
+        Path(self.path).unlink()
+
+        with self.assertLogs("macau.redirects.snapshot", "WARNING"):
+            self.reader.refresh()
+        self.assertIsNone(self.reader.snapshot)
+
+        self.assertEqual(get_redirect("test").destination, "https://example.com")
+
+    def test_disabled(self) -> None:
+        reader = SnapshotReader("", check_interval=0)
+
+        self.assertFalse(reader.needs_refresh)
+        reader.refresh()
+        self.assertIsNone(reader.get_snapshot("test"))
+
+    def test_compile_without_path(self) -> None:
+        with self.assertRaisesMessage(CommandError, "REDIRECT_SNAPSHOT_PATH"):
+            call_command("compile_redirects", output="")
+
+
+class SlugFilterTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+
+        for name, value in [("MIN_REBUILD_INTERVAL", 0), ("_last_rebuild_at", 0)]:
+            patcher = mock.patch.object(slug_filter, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+
+    def test_unknown_slug_builds_filter(self) -> None:
+        self.assertFalse(slug_filter.is_ready)
+
+        response = self.client.get(reverse("redirects:redirect", args=["unknown"]))
+        self.assertEqual(response.status_code, 404)
+
+        self.assertTrue(slug_filter.is_ready)
+        self.assertIn(self.redirect.slug, slug_filter)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("redirects:redirect", args=["unknown"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_created_redirect_added(self) -> None:
+        slug_filter.rebuild()
+
+        redirect = Redirect.objects.create(
+            slug="new", destination="https://example.com"
+        )
+
+        self.assertIn(redirect.slug, slug_filter)
+
+        response = self.client.get(redirect.get_absolute_url())
+        self.assertEqual(response.status_code, 307)
+
+    def test_disabled_redirect_not_included(self) -> None:
+        Redirect.objects.create(
+            slug="disabled", destination="https://example.com", is_enabled=False
+        )
+
+        slug_filter.rebuild()
+
+        self.assertNotIn("disabled", slug_filter)
+
+    def test_removals_mark_stale(self) -> None:
+        slug_filter.rebuild()
+
+        self.redirect.delete()
+
+        self.assertFalse(slug_filter.is_ready)
+
+    def test_invalidate_adds_slug(self) -> None:
+        slug_filter.rebuild()
+
+        slug_filter.invalidate("other-worker")
+
+        self.assertIn("other-worker", slug_filter)
+
+    def test_cleared_during_rebuild(self) -> None:
+        original_add = BloomFilter.add
+
+        def add(bloom: BloomFilter, item: str) -> None:
+            slug_filter.clear()
+            original_add(bloom, item)
+
+        with mock.patch.object(BloomFilter, "add", add):
+            slug_filter.rebuild()
+
+        self.assertFalse(slug_filter.is_ready)
+
+    def test_rebuild_rate_limited(self) -> None:
+        slug_filter.MIN_REBUILD_INTERVAL = 60
+        now = time.monotonic() + 1000
+
+        with mock.patch("time.monotonic", return_value=now):
+            slug_filter.schedule_rebuild()
+        self.assertTrue(slug_filter.is_ready)
+
+        # Eg another worker changed a redirect
+        slug_filter.clear()
+        with (
+            mock.patch("time.monotonic", return_value=now + 59),
+            self.assertNumQueries(0),
+        ):
+            slug_filter.schedule_rebuild()
+        self.assertFalse(slug_filter.is_ready)
+
+        with mock.patch("time.monotonic", return_value=now + 60):
+            slug_filter.schedule_rebuild()
+        self.assertTrue(slug_filter.is_ready)
+
+    def test_rebuild_in_background(self) -> None:
+        background_filter = SlugFilter(error_rate=0.01, background=True)
+        rebuilt = Event()
+
+        with mock.patch.object(
+            background_filter, "rebuild", side_effect=rebuilt.set
+        ) as rebuild:
+            background_filter.schedule_rebuild()
+            self.assertTrue(rebuilt.wait(timeout=5))
+
+        rebuild.assert_called_once_with()
+
+
+class SlugGeneratorTestCase(TestCase):
+    def test_encode_is_unique(self) -> None:
+        generator = SlugGenerator("abc", 4, block_size=10)
+
+        slugs = {generator.encode(value) for value in range(generator.space)}
+
+        self.assertEqual(len(slugs), 3**4)
+        self.assertTrue(all(len(slug) == 4 for slug in slugs))
+
+    def test_encode_scatters(self) -> None:
+        generator = SlugGenerator(settings.REDIRECT_SLUG_ALPHABET, 6, block_size=10)
+        self.assertNotEqual(generator.encode(1)[:5], generator.encode(2)[:5])
+
+    def test_space_exhausted(self) -> None:
+        generator = SlugGenerator("ab", 2, block_size=10)
+        with self.assertRaisesMessage(ValueError, "Slug space exhausted"):
+            generator.encode(4)
+
+    def test_invalid_alphabet(self) -> None:
+        for alphabet in ["a", "aab", "ab/"]:
+            with self.subTest(alphabet=alphabet), self.assertRaises(ValueError):
+                SlugGenerator(alphabet, 6, block_size=10)
+
+    def test_generate(self) -> None:
+        generator = SlugGenerator("abc", 4, block_size=10)
+
+        slugs = generator.generate(5) + generator.generate(5)
+
+        self.assertEqual(len(set(slugs)), 10)
+        self.assertEqual(SlugCounter.objects.get().value, 10)
+
+    def test_skips_existing_slugs(self) -> None:
+        generator = SlugGenerator("abc", 4, block_size=10)
+        Redirect.objects.create(
+            slug=generator.encode(1), destination="https://example.com"
+        )
+
+        slugs = generator.generate(3)
+
+        self.assertEqual(len(slugs), 3)
+        self.assertNotIn(generator.encode(1), slugs)
+        self.assertEqual(SlugCounter.objects.get().value, 4)
+
+    def test_admin_generates_slug(self) -> None:
+        user = User.objects.create_superuser("user", "user@example.com", "password")
+        self.client.force_login(user)
+
+        response = self.client.post(
+            reverse("admin:redirects_redirect_add"),
+            {"slug": "", "destination": "https://example.com"},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        redirect = Redirect.objects.get()
+        self.assertEqual(len(redirect.slug), settings.REDIRECT_SLUG_LENGTH)
+
+
+class SlugGeneratorBlockTestCase(TransactionTestCase):
+    def test_reserves_blocks(self) -> None:
+        generator = SlugGenerator("abc", 4, block_size=10)
+
+        generator.generate()
+
+        # The rest of the block is used, only checking the slugs are unused
+        with self.assertNumQueries(1):
+            generator.generate(9)
+
+        # Another block is reserved
+        with self.assertNumQueries(5):
+            generator.generate()
+
+        self.assertEqual(SlugCounter.objects.get().value, 20)
+
+    def test_separate_generators(self) -> None:
+        # eg in different processes
+        generators = [SlugGenerator("abc", 4, block_size=10) for _ in range(3)]
+
+        slugs = [slug for generator in generators for slug in generator.generate(5)]
+
+        self.assertEqual(len(set(slugs)), 15)
+        self.assertEqual(SlugCounter.objects.get().value, 30)
+
+
+class SearchRedirectsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        Redirect.objects.bulk_create(
+            [
+                Redirect(slug="github", destination="https://github.com/RealOrangeOne"),
+                Redirect(slug="blog", destination="https://theorangeone.net/posts"),
+                Redirect(slug="gh", destination="https://example.com"),
+            ]
+        )
+
+    def search(self, search_term: str) -> list[str]:
+        return sorted(
+            search_redirects(Redirect.objects.all(), search_term).values_list(
+                "slug", flat=True
+            )
+        )
+
+    def test_slug_prefix(self) -> None:
+        self.assertEqual(self.search("g"), ["gh", "github"])
+        self.assertEqual(self.search("gh"), ["gh"])
+
+    def test_slug_prefix_ignores_case(self) -> None:
+        Redirect.objects.create(slug="S1", destination="https://example.com/s1")
+        Redirect.objects.create(slug="s2", destination="https://example.com/s2")
+
+        self.assertEqual(self.search("s"), ["S1", "s2"])
+        self.assertEqual(self.search("S2"), ["s2"])
+        self.assertEqual(self.search("Gh"), ["gh"])
+
+    def test_contains(self) -> None:
+        self.assertEqual(self.search("orange"), ["blog", "github"])
+        self.assertEqual(self.search("HUB"), ["github"])
+        self.assertEqual(self.search("posts"), ["blog"])
+
+    def test_multiple_terms(self) -> None:
+        self.assertEqual(self.search("orange posts"), ["blog"])
+        self.assertEqual(self.search('"orange posts"'), [])
+
+    def test_special_characters(self) -> None:
+        for search_term in ['"', "'", 'a"b', "*", "a OR b", "NEAR(a b)"]:
+            with self.subTest(search_term=search_term):
+                self.search(search_term)
+
+    def test_changes_are_indexed(self) -> None:
+        redirect = Redirect.objects.get(slug="gh")
+        redirect.destination = "https://example.org/changed"
+        redirect.save()
+        Redirect.objects.filter(slug="blog").delete()
+        upsert_redirects(
+            [Redirect(slug="github", destination="https://example.net/upserted")]
+        )
+
+        self.assertEqual(self.search("changed"), ["gh"])
+        self.assertEqual(self.search("posts"), [])
+        self.assertEqual(self.search("upserted"), ["github"])
+        self.assertEqual(self.search("orange"), [])
+
+    def test_repairs_index(self) -> None:
+        # Rebuilding the table (eg in a migration) drops its triggers
+        with connection.cursor() as cursor:
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {name}")
+        _sqlite_search_ready.clear()
+
+        Redirect.objects.create(slug="new", destination="https://example.com/new")
+        self.assertFalse(has_sqlite_search_index(connection))
+        self.assertEqual(self.search("new"), ["new"])
+
+        ensure_search_index(DEFAULT_DB_ALIAS)
+        self.assertTrue(has_sqlite_search_index(connection))
+        self.assertEqual(self.search("new"), ["new"])
+        self.assertEqual(self.search("posts"), ["blog"])
+
+    def test_uses_index(self) -> None:
+        plan = search_redirects(Redirect.objects.all(), "orange").explain()
+        self.assertIn(f"SCAN {SEARCH_TABLE} VIRTUAL TABLE INDEX", plan)
+        self.assertNotIn("SCAN redirects_redirect\n", plan + "\n")
+
+        plan = search_redirects(Redirect.objects.all(), "G").explain()
+        self.assertIn("USING INDEX redirects_redirect_slug_lower", plan)
+
+    def test_admin_search(self) -> None:
+        user = User.objects.create_superuser("user", "user@example.com", "password")
+        self.client.force_login(user)
+
+        response = self.client.get(
+            reverse("admin:redirects_redirect_changelist"), {"q": "orange"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [redirect.slug for redirect in response.context["cl"].result_list],
+            ["blog", "github"],
+        )
+
+
+# Replacing the search table can't be rolled back with a test's transaction
+class SearchIndexRepairTestCase(TransactionTestCase):
+    def test_repairs_outdated_index(self) -> None:
+        # The index used to be keyed by the implicit rowid
+        Redirect.objects.create(slug="blog", destination="https://example.com/posts")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {SEARCH_TABLE}")
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(slug, destination, "
+                "content='redirects_redirect', tokenize='trigram')"
+            )
+        _sqlite_search_ready.clear()
+
+        self.assertFalse(has_sqlite_search_index(connection))
+
+        ensure_search_index(DEFAULT_DB_ALIAS)
+        self.assertTrue(has_sqlite_search_index(connection))
+        self.assertEqual(
+            list(
+                search_redirects(Redirect.objects.all(), "posts").values_list(
+                    "slug", flat=True
+                )
+            ),
+            ["blog"],
+        )
+
+
+class BloomFilterTestCase(SimpleTestCase):
+    def test_membership(self) -> None:
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+
+        for i in range(1000):
+            bloom.add(f"slug-{i}")
+
+        self.assertEqual(len(bloom), 1000)
+
+        for i in range(1000):
+            self.assertIn(f"slug-{i}", bloom)
+
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.02)
+
+    def test_false_positive_rate(self) -> None:
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        self.assertEqual(bloom.false_positive_rate, 0)
+
+        for i in range(1000):
+            bloom.add(f"slug-{i}")
+
+        self.assertAlmostEqual(bloom.false_positive_rate, 0.01, delta=0.002)
+
+    def test_memory_footprint(self) -> None:
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+
+        # ~9.6 bits per item
+        self.assertGreater(bloom.memory_footprint, 1000 * 9.5 / 8)
+        self.assertLess(bloom.memory_footprint, 1000 * 10 / 8 + 100)
+
+    def test_is_full(self) -> None:
+        bloom = BloomFilter(capacity=1, error_rate=0.01)
+        bloom.add("a")
+        self.assertFalse(bloom.is_full)
+        bloom.add("b")
+        self.assertTrue(bloom.is_full)
+
+
+class AuthThrottleViewTestCase(TestCase):
+    redirect: Redirect
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.redirect = Redirect.objects.create(
+            slug="basic",
+            destination="https://example.com",
+            basic_auth_username="username",
+            basic_auth_password="password",
+        )
+
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        auth_throttle.clear()
+        slug_auth_throttle.clear()
+
+        patcher = mock.patch.object(auth_throttle, "limit", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, credentials: bytes | None, **extra: Any) -> HttpResponseBase:
+        headers = (
+            {"Authorization": f"Basic {b64encode(credentials).decode()}"}
+            if credentials is not None
+            else {}
+        )
+        return self.client.get(
+            self.redirect.get_absolute_url(), headers=headers, **extra
+        )
+
+    def test_throttled(self) -> None:
+        for _ in range(2):
+            self.assertEqual(self.get(b"username:wrong").status_code, 401)
+
+        # Rejected before looking up the redirect
+        redirect_cache.clear()
+        with self.assertNumQueries(0):
+            response = self.get(b"username:password")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], str(auth_throttle.window))
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+
+        # Other clients aren't affected
+        self.assertEqual(
+            self.get(b"username:password", REMOTE_ADDR="10.0.0.1").status_code, 307
+        )
+
+    def test_prompt_not_counted(self) -> None:
+        for _ in range(3):
+            self.assertEqual(self.get(None).status_code, 401)
+
+        self.assertEqual(self.get(b"username:password").status_code, 307)
+
+    def test_other_redirects(self) -> None:
+        for _ in range(2):
+            self.get(b"username:wrong")
+
+        Redirect.objects.create(slug="other", destination="https://example.com")
+        response = self.client.get(reverse("redirects:redirect", args=["other"]))
+        self.assertEqual(response.status_code, 307)
+
+    @mock.patch.object(slug_auth_throttle, "limit", 3)
+    def test_slug_throttled(self) -> None:
+        # Each attempt comes from a different address
+        for i in range(3):
+            self.assertEqual(
+                self.get(b"username:wrong", REMOTE_ADDR=f"10.0.0.{i}").status_code,
+                401,
+            )
+
+        self.assertEqual(
+            self.get(b"username:password", REMOTE_ADDR="10.0.1.1").status_code, 429
+        )
+
+        # Other redirects aren't affected
+        Redirect.objects.create(slug="other", destination="https://example.com")
+        response = self.client.get(reverse("redirects:redirect", args=["other"]))
+        self.assertEqual(response.status_code, 307)
+
+    @override_settings(REDIRECT_AUTH_THROTTLE_CLIENT_IP_HEADER="HTTP_X_FORWARDED_FOR")
+    def test_client_ip_header(self) -> None:
+        for _ in range(2):
+            self.get(b"username:wrong", HTTP_X_FORWARDED_FOR="10.0.0.1, 10.0.0.2")
+
+        self.assertEqual(
+            self.get(b"username:password", HTTP_X_FORWARDED_FOR="10.0.0.2").status_code,
+            429,
+        )
+        self.assertEqual(
+            self.get(b"username:password", HTTP_X_FORWARDED_FOR="10.0.0.1").status_code,
+            307,
+        )
+
+
+class FailureThrottleTestCase(SimpleTestCase):
+    def test_sliding_window(self) -> None:
+        with mock.patch("time.time", return_value=1000):
+            throttle = FailureThrottle(limit=2, window=100, width=1024)
+            for _ in range(4):
+                throttle.add_failure("key")
+
+            self.assertTrue(throttle.is_throttled("key"))
+            self.assertFalse(throttle.is_throttled("other"))
+
+        # The previous window's failures count less, as the window slides on
+        for now, is_throttled in [(1100, True), (1149, True), (1151, False)]:
+            with self.subTest(now=now), mock.patch("time.time", return_value=now):
+                self.assertEqual(throttle.is_throttled("key"), is_throttled)
+
+        with mock.patch("time.time", return_value=1300):
+            self.assertFalse(throttle.is_throttled("key"))
+            throttle.add_failure("key")
+            self.assertFalse(throttle.is_throttled("key"))
+
+    def test_disabled(self) -> None:
+        throttle = FailureThrottle(limit=0, window=100, width=1024)
+        throttle.add_failure("key")
+        self.assertFalse(throttle.is_throttled("key"))
+
+    def test_shared_cache(self) -> None:
+        cache.clear()
+        throttles = [
+            FailureThrottle(
+                limit=3, window=100, width=1024, shared_cache_alias="default"
+            )
+            for _ in range(2)
+        ]
+
+        throttles[0].add_failure("key")
+        throttles[0].add_failure("key")
+        self.assertFalse(throttles[1].is_throttled("key"))
+
+        # Failures from other workers are seen when a failure is counted
+        throttles[1].add_failure("key")
+        self.assertTrue(throttles[1].is_throttled("key"))
+
+
+class CountMinSketchTestCase(SimpleTestCase):
+    def test_counts(self) -> None:
+        sketch = CountMinSketch(width=1024, depth=4)
+
+        for i in range(10):
+            for _ in range(i):
+                sketch.add(f"item-{i}")
+
+        for i in range(10):
+            self.assertEqual(sketch[f"item-{i}"], i)
+
+    def test_never_underestimates(self) -> None:
+        # Too small, so items share counters
+        sketch = CountMinSketch(width=8, depth=2)
+
+        for i in range(100):
+            sketch.add(f"item-{i}")
+
+        for i in range(100):
+            self.assertGreaterEqual(sketch[f"item-{i}"], 1)
+
+    def test_raise_to(self) -> None:
+        sketch = CountMinSketch(width=1024, depth=4)
+        sketch.add("item")
+
+        sketch.raise_to("item", 5)
+        self.assertEqual(sketch["item"], 5)
+
+        sketch.raise_to("item", 2)
+        self.assertEqual(sketch["item"], 5)
+
+    def test_clear(self) -> None:
+        sketch = CountMinSketch(width=1024, depth=4)
+        sketch.add("item")
+        sketch.clear()
+        self.assertEqual(sketch["item"], 0)
+        self.assertEqual(sketch.memory_footprint, sys.getsizeof(sketch._counters))
+
+
+class SqliteListenerTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.database_path = str(Path(tmpdir.name) / "db.sqlite3")
+
+        self.conn = sqlite3.connect(self.database_path)
+        self.addCleanup(self.conn.close)
+        self.conn.execute("CREATE TABLE redirects (slug TEXT)")
+        self.conn.commit()
+
+        self.cache: RedirectCache[CachedRedirect] = RedirectCache(maxsize=10, ttl=60)
+        self.cache.set("test", RedirectCacheTestCase.redirect)
+
+        self.listener = SqliteListener((self.cache,), self.database_path, interval=1)
+
+    def tearDown(self) -> None:
+        if self.listener._conn is not None:
+            self.listener._conn.close()
+
+    def test_unchanged(self) -> None:
+        self.assertFalse(self.listener.poll())
+        self.assertFalse(self.listener.poll())
+        self.assertEqual(len(self.cache), 1)
+
+    def test_change_clears_cache(self) -> None:
+        self.listener.poll()
+
+        self.conn.execute("INSERT INTO redirects VALUES ('test')")
+        self.conn.commit()
+
+        self.assertTrue(self.listener.poll())
+        self.assertEqual(len(self.cache), 0)
+
+        # The change is only seen once
+        self.assertFalse(self.listener.poll())
+
+
+class CheckBasicAuthTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        self.factory = RequestFactory()
+
+    def _get_request(self, credentials: str) -> HttpRequest:
+        return self.factory.get(
+            "/",
+            headers={
+                "Authorization": "Basic " + b64encode(credentials.encode()).decode()
+            },
+        )
+
+    def test_no_header(self) -> None:
+        self.assertFalse(
+            check_basic_auth(self.factory.get("/"), "username", "password")
+        )
+
+    def test_wrong_credentials(self) -> None:
+        self.assertFalse(
+            check_basic_auth(self._get_request("wrong:wrong"), "username", "password")
+        )
+
+    def test_correct_credentials(self) -> None:
+        self.assertTrue(
+            check_basic_auth(
+                self._get_request("username:password"), "username", "password"
+            )
+        )
+
+    def test_missing_credentials(self) -> None:
+        self.assertFalse(
+            check_basic_auth(
+                self.factory.get("/", headers={"Authorization": "Basic"}),
+                "username",
+                "password",
+            )
+        )
+
+    def test_multiple_credentials(self) -> None:
+        credentials = b64encode(b"username:password").decode()
+        self.assertTrue(
+            check_basic_auth(
+                self.factory.get(
+                    "/",
+                    headers={
+                        "Authorization": f"Basic {credentials}, Basic {credentials}"
+                    },
+                ),
+                "username",
+                "password",
+            )
+        )
+
+    def test_not_base64(self) -> None:
+        self.assertFalse(
+            check_basic_auth(
+                self.factory.get(
+                    "/",
+                    headers={"Authorization": "Basic mypassword"},
+                ),
+                "username",
+                "password",
+            )
+        )
+
+    def test_token(self) -> None:
+        token = get_basic_auth_token("username", "pass:word")
+        self.assertEqual(b64decode(token), b"username:pass:word")
+
+        self.assertTrue(
+            check_basic_auth_token(self._get_request("username:pass:word"), token)
+        )
+        self.assertFalse(
+            check_basic_auth_token(self._get_request("username:password"), token)
+        )
+
+    def test_unicode_credentials(self) -> None:
+        self.assertTrue(
+            check_basic_auth(
+                self._get_request("usér:pässword"),
+                "usér",
+                "pässword",
+            )
+        )
+
+    def test_not_basic(self) -> None:
+        self.assertFalse(
+            check_basic_auth(
+                self.factory.get(
+                    "/",
+                    headers={"Authorization": "Bearer mypassword"},
+                ),
+                "username",
+                "password",
+            )
+        )
+
+
+class RedirectCreateViewTestCase(TestCase):
+    user: User
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+
+    def test_redirect_to_create(self) -> None:
+        response = self.client.get("/https://example.com", follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Add redirect")
+
+        self.assertEqual(
+            response.context["adminform"].form.initial,
+            {"destination": "https://example.com"},
+        )
+
+    def test_unauthenticated(self) -> None:
+        self.client.logout()
+        response = self.client.get("/https://example.com")
+        self.assertEqual(response.status_code, 404)
+
+
+class RedirectAdminTestCase(TestCase):
+    user: User
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+
+    def test_add_view(self) -> None:
+        response = self.client.get(reverse("admin:redirects_redirect_add"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_view(self) -> None:
+        redirect = Redirect.objects.create(
+            slug="disabled",
+            destination="https://example.com",
+        )
+        response = self.client.get(
+            reverse("admin:redirects_redirect_change", args=[redirect.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_basic_auth_without_password(self) -> None:
+        response = self.client.post(
+            reverse("admin:redirects_redirect_add"),
+            {
+                "slug": "test",
+                "destination": "https://example.com",
+                "basic_auth_username": "user",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response.context["adminform"].form,
+            "basic_auth_username",
+            "Password must be specified (or only specified) when using basic auth",
+        )
+        self.assertFalse(Redirect.objects.exists())
+
+    def test_download_qrcodes(self) -> None:
+        slugs = [f"test-{i}" for i in range(20)]
+        Redirect.objects.bulk_create(
+            [Redirect(slug=slug, destination="https://example.com") for slug in slugs]
+        )
+        Redirect.objects.create(slug="not-selected", destination="https://example.com")
+        selected = list(
+            Redirect.objects.filter(slug__in=slugs).values_list("pk", flat=True)
+        )
+
+        for image_format in ["svg", "png"]:
+            with self.subTest(image_format=image_format):
+                response = self.client.post(
+                    reverse("admin:redirects_redirect_changelist"),
+                    {
+                        "action": f"download_qrcodes_{image_format}",
+                        "_selected_action": selected,
+                    },
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.headers["Content-Type"], "application/zip")
+
+                archive = zipfile.ZipFile(BytesIO(response.getvalue()))
+                self.assertEqual(
+                    sorted(archive.namelist()),
+                    sorted(f"{slug}.{image_format}" for slug in slugs),
+                )
+                self.assertEqual(
+                    archive.read(f"test-0.{image_format}"),
+                    render_qrcode(
+                        make_qrcode("http://testserver/test-0", "M"),
+                        image_format,
+                        RedirectAdmin.download_qrcode_options,
+                    ),
+                )
+
+    def test_stream_export(self) -> None:
+        slugs = [f"test-{i}" for i in range(5)]
+        Redirect.objects.bulk_create(
+            [Redirect(slug=slug, destination="https://example.com") for slug in slugs]
+        )
+        Redirect.objects.create(slug="not-selected", destination="https://example.com")
+        selected = list(
+            Redirect.objects.filter(slug__in=slugs).values_list("pk", flat=True)
+        )
+
+        response = self.client.post(
+            reverse("admin:redirects_redirect_changelist"),
+            {"action": "stream_export_jsonl", "_selected_action": selected},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.headers["Content-Type"], "application/jsonl")
+
+        rows = [json.loads(line) for line in response.getvalue().splitlines()]
+        self.assertEqual([row["slug"] for row in rows], slugs)
+
+
+class RedirectChangeListTestCase(TestCase):
+    user: User
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+        Redirect.objects.bulk_create(
+            [
+                Redirect(
+                    slug=f"r{i:02}",
+                    destination="https://example.com",
+                    is_enabled=i % 2 == 0,
+                )
+                for i in range(12)
+            ]
+        )
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def get_changelist(self, query_string: str = "") -> Any:
+        response = self.client.get(
+            reverse("admin:redirects_redirect_changelist") + query_string
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def test_exact_count(self) -> None:
+        cl = self.get_changelist()
+
+        self.assertEqual(cl.result_count, 12)
+        self.assertEqual(cl.full_result_count, 12)
+        self.assertFalse(cl.paginator.count_is_approximate)
+        self.assertFalse(cl.keyset_pagination)
+
+    def test_filtered_count(self) -> None:
+        cl = self.get_changelist("?is_enabled__exact=1")
+
+        self.assertEqual(cl.result_count, 6)
+        self.assertEqual(cl.full_result_count, 12)
+
+    @override_settings(REDIRECT_ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_approximate_count(self) -> None:
+        cl = self.get_changelist()
+        self.assertEqual(cl.result_count, 12)
+        self.assertTrue(cl.paginator.count_is_approximate)
+        self.assertTrue(cl.keyset_pagination)
+
+        # SQLite can't estimate counts, so they're cached
+        Redirect.objects.create(slug="new", destination="https://example.com")
+        self.assertEqual(self.get_changelist().result_count, 12)
+
+        cache.clear()
+        self.assertEqual(self.get_changelist().result_count, 13)
+
+    @override_settings(REDIRECT_ADMIN_EXACT_COUNT_LIMIT=5)
+    @mock.patch.object(RedirectAdmin, "list_per_page", 5)
+    def test_keyset_pagination(self) -> None:
+        pages = []
+        cl = self.get_changelist()
+        pages.append([redirect.slug for redirect in cl.result_list])
+        while cl.has_next and len(pages) < 5:
+            cl = self.get_changelist(cl.next_url)
+            pages.append([redirect.slug for redirect in cl.result_list])
+
+        self.assertEqual(
+            pages,
+            [
+                ["r00", "r01", "r02", "r03", "r04"],
+                ["r05", "r06", "r07", "r08", "r09"],
+                ["r10", "r11"],
+            ],
+        )
+
+        cl = self.get_changelist(cl.previous_url)
+        self.assertEqual([redirect.slug for redirect in cl.result_list], pages[1])
+        self.assertTrue(cl.has_previous)
+
+        cl = self.get_changelist(cl.previous_url)
+        self.assertEqual([redirect.slug for redirect in cl.result_list], pages[0])
+        self.assertFalse(cl.has_previous)
+
+        self.assertNotIn("after", cl.get_query_string({"is_enabled__exact": 1}))
+
+    @override_settings(REDIRECT_ADMIN_EXACT_COUNT_LIMIT=5)
+    @mock.patch.object(RedirectAdmin, "list_per_page", 5)
+    def test_keyset_pagination_filtered(self) -> None:
+        cl = self.get_changelist("?is_enabled__exact=1&after=r04")
+
+        self.assertEqual(
+            [redirect.slug for redirect in cl.result_list], ["r06", "r08", "r10"]
+        )
+        self.assertIn("is_enabled__exact=1", cl.next_url)
+
+    @override_settings(REDIRECT_ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_other_ordering(self) -> None:
+        # Keyset pagination only works when ordered by slug
+        cl = self.get_changelist("?o=-4")
+        self.assertFalse(cl.keyset_pagination)
+        self.assertEqual(len(cl.result_list), 12)
+
+
+class RedirectQueryPlanTestCase(TestCase):
+    """
+    Check the most common queries use an index, rather than scanning the table.
+    """
+
+    user: User
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_superuser("user", "user@example.com", "password")
+        Redirect.objects.bulk_create(
+            [
+                Redirect(
+                    slug=f"r{i:03}",
+                    destination="https://example.com",
+                    is_enabled=i % 3 > 0,
+                    is_permanent=i % 7 == 0,
+                )
+                for i in range(100)
+            ]
+        )
+
+    def explain(self, queryset: QuerySet) -> str:
+        if connection.vendor == "postgresql":
+            # Otherwise, small tables are scanned since it's quicker
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def assert_uses_index(self, queryset: QuerySet, *index_names: str) -> None:
+        plan = self.explain(queryset)
+
+        self.assertTrue(
+            any(index_name in plan for index_name in index_names),
+            f"None of {index_names} used:\n{plan}",
+        )
+        self.assertNotIn("Seq Scan", plan)
+        self.assertNotRegex(plan, r"SCAN redirects_redirect\s*$")
+
+    def get_changelist_queryset(self, query_string: str = "") -> QuerySet:
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("admin:redirects_redirect_changelist") + query_string
+        )
+        queryset: QuerySet = response.context["cl"].queryset
+        return queryset[:100]
+
+    def test_lookup(self) -> None:
+        self.assert_uses_index(
+            Redirect.objects.filter(slug="r001", is_enabled=True).values_list(
+                *LOOKUP_FIELDS
+            ),
+            "redirect_enabled_lookup_idx",
+            "redirects_redirect_pkey",
+            "sqlite_autoindex_redirects_redirect_1",
+        )
+
+    def test_admin_list(self) -> None:
+        self.assert_uses_index(
+            self.get_changelist_queryset(),
+            "redirects_redirect_pkey",
+            "sqlite_autoindex_redirects_redirect_1",
+        )
+
+    def test_admin_list_filtered(self) -> None:
+        for query_string, index_name in [
+            ("?is_enabled__exact=1", "redirect_enabled_lookup_idx"),
+            ("?is_enabled__exact=0", "redirect_disabled_slug_idx"),
+            ("?is_permanent__exact=1", "redirect_permanent_slug_idx"),
+        ]:
+            with self.subTest(query_string=query_string):
+                self.assert_uses_index(
+                    self.get_changelist_queryset(query_string), index_name
+                )
+
+    def test_expired(self) -> None:
+        self.assert_uses_index(
+            Redirect.objects.filter(is_enabled=True, expires_at__lte=timezone.now()),
+            "redirect_expires_at_idx",
+        )
+
+    def test_admin_list_ordered_by_created_at(self) -> None:
+        for query_string in ["?o=4", "?o=-4"]:
+            with self.subTest(query_string=query_string):
+                self.assert_uses_index(
+                    self.get_changelist_queryset(query_string),
+                    "redirect_created_at_idx",
+                )
+
+
+class ImportRedirectsTestCase(TestCase):
+    def import_csv(self, content: str) -> StringIO:
+        stdout = StringIO()
+        stderr = StringIO()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "redirects.csv"
+            path.write_text(content)
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    "import_redirects",
+                    path,
+                    "--batch-size=2",
+                    stdout=stdout,
+                    stderr=stderr,
+                )
+        self.assertIn("Imported", stdout.getvalue())
+        return stderr
+
+    def test_import(self) -> None:
+        existing = Redirect.objects.create(
+            slug="existing", destination="https://example.com"
+        )
+
+        stderr = self.import_csv(
+            "slug,destination,is_permanent,basic_auth_username,basic_auth_password\n"
+            "new,https://example.com/new,1,,\n"
+            "existing,https://example.com/updated,0,user,password\n"
+            "bad-url,not-a-url,0,,\n"
+            "no-password,https://example.com,0,user,\n"
+            "new,https://example.com/newer,0,,\n"
+        )
+
+        self.assertEqual(
+            stderr.getvalue().splitlines(),
+            [
+                "Row 3: destination: Enter a valid URL.",
+                "Row 4: basic_auth_username: Password must be specified (or only specified) when using basic auth",
+            ],
+        )
+
+        self.assertEqual(Redirect.objects.count(), 2)
+
+        new = Redirect.objects.get(slug="new")
+        self.assertEqual(new.destination, "https://example.com/newer")
+        self.assertFalse(new.is_permanent)
+        self.assertTrue(new.is_enabled)
+
+        updated = Redirect.objects.get(slug="existing")
+        self.assertEqual(updated.destination, "https://example.com/updated")
+        self.assertEqual(updated.basic_auth_username, "user")
+        self.assertEqual(updated.created_at, existing.created_at)
+        self.assertGreater(updated.modified_at, existing.modified_at)
+
+    def test_round_trip(self) -> None:
+        Redirect.objects.create(
+            slug="test",
+            destination="https://example.com",
+            is_permanent=True,
+            is_enabled=False,
+        )
+        exported = "".join(iter_export(Redirect.objects.all(), "csv"))
+        Redirect.objects.all().delete()
+
+        self.import_csv(exported)
+
+        redirect = Redirect.objects.get(slug="test")
+        self.assertTrue(redirect.is_permanent)
+        self.assertFalse(redirect.is_enabled)
+
+    def test_clears_caches(self) -> None:
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        Redirect.objects.create(slug="other", destination="https://example.com")
+        self.client.get("/test")
+        self.client.get("/other")
+        self.assertIsNotNone(redirect_cache.get("test"))
+
+        self.import_csv("slug,destination\ntest,https://example.com/updated\n")
+
+        self.assertIsNone(redirect_cache.get("test"))
+        self.assertEqual(
+            self.client.get("/test").headers["Location"], "https://example.com/updated"
+        )
+
+        # Only the imported slugs are invalidated
+        self.assertIsNotNone(redirect_cache.get("other"))
+
+    def test_clears_disabled(self) -> None:
+        Redirect.objects.create(slug="test", destination="https://example.com")
+        self.client.get("/test")
+
+        with mock.patch.object(slug_filter, "discard") as discard:
+            self.import_csv("slug,destination,is_enabled\ntest,https://example.com,0\n")
+
+        discard.assert_called_once_with("test")
+        self.assertEqual(self.client.get("/test").status_code, 404)
+
+    def test_jsonl(self) -> None:
+        records = iter_records(
+            StringIO('{"slug": "test", "destination": "https://example.com"}\n\n'),
+            "jsonl",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            results = list(import_redirects(records))
+
+        self.assertEqual(results[-1].imported, 1)
+        self.assertEqual(results[-1].rejected, [])
+        self.assertTrue(Redirect.objects.filter(slug="test").exists())
+
+    def test_jsonl_non_object(self) -> None:
+        records = iter_records(
+            StringIO(
+                '"test"\n'
+                '["test", "https://example.com"]\n'
+                '{"slug": "test", "destination": "https://example.com"}\n'
+            ),
+            "jsonl",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            results = list(import_redirects(records))
+
+        self.assertEqual(results[-1].imported, 1)
+        self.assertEqual(
+            results[-1].rejected,
+            [
+                RejectedRow(1, {NON_FIELD_ERRORS: ["Expected an object."]}),
+                RejectedRow(2, {NON_FIELD_ERRORS: ["Expected an object."]}),
+            ],
+        )
+        self.assertTrue(Redirect.objects.filter(slug="test").exists())
+
+    def test_bulk_resource(self) -> None:
+        Redirect.objects.create(slug="existing", destination="https://example.com")
+
+        dataset = tablib.Dataset(headers=["slug", "destination"])
+        dataset.append(["existing", "https://example.com/updated"])
+        dataset.append(["new", "https://example.com/new"])
+
+        result = BulkRedirectResource().import_data(dataset)
+
+        self.assertFalse(result.has_errors())
+        self.assertFalse(result.has_validation_errors())
+        self.assertEqual(
+            dict(Redirect.objects.values_list("slug", "destination")),
+            {
+                "existing": "https://example.com/updated",
+                "new": "https://example.com/new",
+            },
+        )
+
+    def test_resource_validation(self) -> None:
+        dataset = tablib.Dataset(headers=["slug", "destination", "basic_auth_username"])
+        dataset.append(["test", "https://example.com", "user"])
+
+        for resource_class in [RedirectResource, BulkRedirectResource]:
+            with self.subTest(resource_class=resource_class):
+                result = resource_class().import_data(dataset)
+                self.assertTrue(result.has_validation_errors())
+                self.assertFalse(Redirect.objects.exists())
+
+
+class ExportRedirectsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        Redirect.objects.create(
+            slug="test",
+            destination="https://example.com",
+            basic_auth_username="user",
+            basic_auth_password="password",
+        )
+        Redirect.objects.create(
+            slug="disabled", destination="https://example.com/2", is_enabled=False
+        )
+
+    def export(self, export_format: str, chunk_size: int = 2000) -> str:
+        return "".join(
+            iter_export(
+                Redirect.objects.order_by("slug"), export_format, chunk_size=chunk_size
+            )
+        )
+
+    def test_csv(self) -> None:
+        rows = list(csv.DictReader(StringIO(self.export("csv"))))
+
+        self.assertEqual(list(rows[0].keys()), get_export_fields())
+        self.assertEqual([row["slug"] for row in rows], ["disabled", "test"])
+        self.assertEqual(rows[0]["is_enabled"], "0")
+        self.assertEqual(rows[1]["is_enabled"], "1")
+        self.assertEqual(rows[1]["basic_auth_username"], "user")
+
+    def test_json(self) -> None:
+        for chunk_size in [1, 2000]:
+            with self.subTest(chunk_size=chunk_size):
+                rows = json.loads(self.export("json", chunk_size))
+
+                self.assertEqual([row["slug"] for row in rows], ["disabled", "test"])
+                self.assertIs(rows[0]["is_enabled"], False)
+                self.assertEqual(
+                    rows[1]["created_at"],
+                    Redirect.objects.get(slug="test").created_at.isoformat(),
+                )
+
+    def test_json_empty(self) -> None:
+        Redirect.objects.all().delete()
+        self.assertEqual(json.loads(self.export("json")), [])
+
+    def test_jsonl(self) -> None:
+        lines = self.export("jsonl", chunk_size=1).splitlines()
+
+        self.assertEqual(
+            [json.loads(line)["slug"] for line in lines], ["disabled", "test"]
+        )
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            self.export("xml")
+
+    def test_command_stdout(self) -> None:
+        stdout = StringIO()
+        call_command("export_redirects", format="jsonl", stdout=stdout)
+        self.assertEqual(stdout.getvalue(), self.export("jsonl"))
+
+    def test_command_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = Path(tmpdir) / "redirects.json"
+            call_command(
+                "export_redirects", "--format=json", "--enabled-only", "-o", output
+            )
+            rows = json.loads(output.read_text())
+
+        self.assertEqual([row["slug"] for row in rows], ["test"])
+
+
+class EdgeMapTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        Redirect.objects.bulk_create(
+            [
+                Redirect(slug="temporary", destination="https://example.com/a"),
+                Redirect(
+                    slug="permanent",
+                    destination="https://example.com/b",
+                    is_permanent=True,
+                ),
+                Redirect(
+                    slug="disabled", destination="https://example.com", is_enabled=False
+                ),
+                Redirect(
+                    slug="basic",
+                    destination="https://example.com",
+                    basic_auth_username="user",
+                    basic_auth_password="password",
+                ),
+                Redirect(slug="unsafe", destination="https://example.com/$uri"),
+                Redirect(slug="docs/*", destination="https://example.com/*"),
+                Redirect(
+                    slug="hosted",
+                    destination="https://example.com",
+                    host="go.example.com",
+                ),
+                Redirect(
+                    slug="scheduled",
+                    destination="https://example.com",
+                    expires_at=datetime(2030, 1, 1, tzinfo=UTC),
+                ),
+            ]
+        )
+
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = str(Path(tmpdir.name) / "redirects.map")
+
+    def render(self, map_format: str) -> tuple[str, EdgeMapStats]:
+        stats = EdgeMapStats()
+        output = "".join(
+            iter_edge_map(get_edge_queryset(), map_format, chunk_size=2, stats=stats)
+        )
+        return output, stats
+
+    def test_nginx(self) -> None:
+        output, stats = self.render("nginx")
+
+        self.assertEqual(
+            output.splitlines()[1:],
+            [
+                "map $uri $macau_redirect {",
+                '    "/permanent" "/permanent 308 https://example.com/b";',
+                '    "/permanent/" "/permanent/ 308 https://example.com/b";',
+                '    "/temporary" "/temporary 307 https://example.com/a";',
+                '    "/temporary/" "/temporary/ 307 https://example.com/a";',
+                "}",
+                'map "$uri $macau_redirect" $macau_permanent_redirect {',
+                r'    "~^(\S+) \1 308 (.+)$" $2;',
+                "}",
+                'map "$uri $macau_redirect" $macau_temporary_redirect {',
+                r'    "~^(\S+) \1 307 (.+)$" $2;',
+                "}",
+                "map $macau_permanent_redirect$macau_temporary_redirect $macau_redirect_robots_tag {",
+                '    "~." "noindex";',
+                "}",
+                "map $macau_permanent_redirect$macau_temporary_redirect $macau_redirect_cache_control {",
+                '    "~." "max-age=0, no-cache, no-store, must-revalidate, private";',
+                "}",
+            ],
+        )
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.skipped, ["unsafe"])
+
+    def test_nginx_case_conflicts(self) -> None:
+        Redirect.objects.create(slug="Temporary", destination="https://example.com/c")
+        Redirect.objects.create(slug="TEMPORARY", destination="https://example.com/d")
+
+        output, stats = self.render("nginx")
+
+        # nginx refuses to load keys which only differ by case
+        self.assertIn('"/TEMPORARY" "/TEMPORARY 307 https://example.com/d";', output)
+        self.assertNotIn('"/Temporary"', output)
+        self.assertNotIn('"/temporary"', output)
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(sorted(stats.skipped), ["Temporary", "temporary", "unsafe"])
+
+        # Other formats match case-sensitively
+        output, stats = self.render("haproxy")
+        self.assertIn("/Temporary 307 https://example.com/c", output)
+        self.assertEqual(stats.skipped, ["unsafe"])
+
+    def test_host_specific_slug(self) -> None:
+        Redirect.objects.create(slug="shared", destination="https://example.com/c")
+        Redirect.objects.create(
+            slug="shared", host="go.example.com", destination="https://example.com/d"
+        )
+
+        for map_format in ["nginx", "haproxy", "caddy"]:
+            with self.subTest(map_format):
+                output, stats = self.render(map_format)
+                self.assertNotIn("shared", output)
+                self.assertEqual(stats.count, 2)
+
+    def test_haproxy(self) -> None:
+        output, stats = self.render("haproxy")
+
+        self.assertEqual(
+            output.splitlines()[1:],
+            [
+                "/permanent 308 https://example.com/b",
+                "/permanent/ 308 https://example.com/b",
+                "/temporary 307 https://example.com/a",
+                "/temporary/ 307 https://example.com/a",
+            ],
+        )
+        self.assertEqual(stats.skipped, ["unsafe"])
+
+    def test_caddy(self) -> None:
+        output, stats = self.render("caddy")
+        lines = output.splitlines()
+
+        self.assertEqual(
+            lines[1:7],
+            [
+                "map {path} {macau_redirect} {macau_redirect_status} {",
+                '    /permanent "https://example.com/b" permanent',
+                '    /permanent/ "https://example.com/b" permanent',
+                '    /temporary "https://example.com/a" temporary',
+                '    /temporary/ "https://example.com/a" temporary',
+                "}",
+            ],
+        )
+        self.assertIn("redir @macau_permanent_redirect {macau_redirect} 308", lines)
+        self.assertIn("redir @macau_temporary_redirect {macau_redirect} 307", lines)
+        self.assertEqual(stats.skipped, ["unsafe"])
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaisesMessage(ValueError, "Unknown format"):
+            list(iter_edge_map(get_edge_queryset(), "apache"))
+
+    def test_write(self) -> None:
+        result = write_edge_map(self.path, "haproxy")
+        self.assertEqual(result, EdgeMapResult(written=2, skipped=1, changed=True))
+        self.assertIn("/temporary 307", Path(self.path).read_text())
+        mtime = Path(self.path).stat().st_mtime_ns
+
+        # Unchanged maps aren't rewritten
+        result = write_edge_map(self.path, "haproxy")
+        self.assertFalse(result.changed)
+        self.assertEqual(Path(self.path).stat().st_mtime_ns, mtime)
+
+        Redirect.objects.filter(slug="temporary").update(is_permanent=True)
+        self.assertTrue(write_edge_map(self.path, "haproxy").changed)
+        self.assertIn("/temporary 308", Path(self.path).read_text())
+
+        # No temporary files are left behind
+        self.assertEqual(os.listdir(Path(self.path).parent), ["redirects.map"])
+
+    def test_command(self) -> None:
+        stdout = StringIO()
+        stderr = StringIO()
+        call_command(
+            "export_edge_map",
+            format="nginx",
+            output=self.path,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        self.assertIn("Wrote 2 redirects", stdout.getvalue())
+        self.assertIn("Skipped 1 redirects", stderr.getvalue())
+        self.assertIn("$macau_permanent_redirect", Path(self.path).read_text())
+
+        stdout = StringIO()
+        call_command(
+            "export_edge_map",
+            format="nginx",
+            output=self.path,
+            stdout=stdout,
+            stderr=stderr,
+        )
+        self.assertIn("already up to date", stdout.getvalue())
+
+    def test_command_stdout(self) -> None:
+        stdout = StringIO()
+        call_command(
+            "export_edge_map",
+            format="caddy",
+            output="-",
+            stdout=stdout,
+            stderr=StringIO(),
+        )
+        self.assertIn("{macau_redirect}", stdout.getvalue())
+
+    def test_command_without_path(self) -> None:
+        with self.assertRaisesMessage(CommandError, "REDIRECT_EDGE_MAP_PATH"):
+            call_command("export_edge_map", output="")
+
+    def test_regenerate(self) -> None:
+        regenerator = EdgeMapRegenerator(
+            self.path, "nginx", enabled=True, reload_command="nginx -s reload"
+        )
+
+        with mock.patch("subprocess.run") as run:
+            regenerator.regenerate()
+            run.assert_called_once_with(
+                ["nginx", "-s", "reload"], check=True, timeout=60
+            )
+
+            # The proxy is only reloaded if the map changed
+            regenerator.regenerate()
+            run.assert_called_once()
+
+    def test_regenerate_on_change(self) -> None:
+        with (
+            mock.patch.object(edge_map_regenerator, "enabled", True),
+            mock.patch.object(edge_map_regenerator, "schedule") as schedule,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                redirect = Redirect.objects.create(
+                    slug="new", destination="https://example.com"
+                )
+            schedule.assert_called_once()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                redirect.delete()
+            self.assertEqual(schedule.call_count, 2)
+
+    def test_regenerate_disabled(self) -> None:
+        self.assertFalse(EdgeMapRegenerator("", "nginx", enabled=True).enabled)
+
+        with mock.patch("macau.redirects.edge.Timer") as timer:
+            EdgeMapRegenerator(self.path, "nginx", enabled=False).schedule()
+        timer.assert_not_called()
+
+    def test_schedule_batches_changes(self) -> None:
+        regenerator = EdgeMapRegenerator(self.path, "nginx", enabled=True)
+
+        with mock.patch("macau.redirects.edge.Timer") as timer:
+            regenerator.schedule()
+            regenerator.schedule()
+        timer.assert_called_once()
+
+
+class RootRedirectViewTestCase(SimpleTestCase):
+    @override_settings(ROOT_REDIRECT_URL="https://example.com")
+    def test_custom_root_redirect_url(self) -> None:
+        response = self.client.get("/")
+        self.assertRedirects(
+            response, "https://example.com", fetch_redirect_response=False
+        )
+        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+
+    @override_settings(ROOT_REDIRECT_URL="admin")
+    def test_redirect_root_to_admin(self) -> None:
+        response = self.client.get("/")
+        self.assertRedirects(
+            response, reverse("admin:index"), fetch_redirect_response=False
+        )
+        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+
+    @override_settings(ROOT_REDIRECT_URL="")
+    def test_no_root_redirect_url(self) -> None:
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 404)
+
+
+class RedirectQRCodeSVGViewTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+        qrcode_cache.clear()
+
+    def test_svg(self) -> None:
+        redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("redirects:qrcode", args=[redirect.slug])
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/svg+xml")
+        self.assertIn(b"<svg", response.content)
+
+    def test_png(self) -> None:
+        redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("redirects:qrcode-png", args=[redirect.slug])
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+
+    def test_cant_access_disabled_redirect(self) -> None:
+        redirect = Redirect.objects.create(
+            slug="disabled",
+            destination="https://example.com",
+        )
+
+        response = self.client.get(reverse("redirects:qrcode", args=[redirect.slug]))
+        self.assertEqual(response.status_code, 200)
+
+        redirect.is_enabled = False
+        redirect.save()
+
+        response = self.client.get(reverse("redirects:qrcode", args=[redirect.slug]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_slug(self) -> None:
+        response = self.client.get(reverse("redirects:qrcode", args=["unknown"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class RedirectQRCodeCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+        qrcode_cache.clear()
+
+        self.redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+        self.url = reverse("redirects:qrcode", args=[self.redirect.slug])
+
+    def test_cached(self) -> None:
+        response = self.client.get(self.url)
+
+        with (
+            self.assertNumQueries(0),
+            mock.patch("macau.redirects.qrcodes.render_qrcode") as render_qrcode,
+        ):
+            cached_response = self.client.get(self.url)
+
+        render_qrcode.assert_not_called()
+        self.assertEqual(cached_response.content, response.content)
+
+    def test_etag(self) -> None:
+        response = self.client.get(self.url)
+
+        etag = response.headers["ETag"]
+        self.assertEqual(
+            etag,
+            get_etag(f"http://testserver/{self.redirect.slug}", "svg", QRCodeOptions()),
+        )
+
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertIn("max-age=300", response.headers["Cache-Control"])
+
+        response = self.client.get(self.url, headers={"If-None-Match": '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_varies(self) -> None:
+        etags = {
+            self.client.get(self.url).headers["ETag"],
+            self.client.get(
+                reverse("redirects:qrcode-png", args=[self.redirect.slug])
+            ).headers["ETag"],
+            self.client.get(self.url, headers={"Host": "example.com"}).headers["ETag"],
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_disabled_not_modified(self) -> None:
+        etag = self.client.get(self.url).headers["ETag"]
+
+        self.redirect.is_enabled = False
+        self.redirect.save()
+
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalidation(self) -> None:
+        self.client.get(self.url)
+        self.assertEqual(len(qrcode_cache), 1)
+
+        # Changing the destination doesn't change the QR code
+        self.redirect.destination = "https://example.org"
+        self.redirect.save()
+        self.assertEqual(len(qrcode_cache), 1)
+
+        self.redirect.is_enabled = False
+        self.redirect.save()
+        self.assertEqual(len(qrcode_cache), 0)
+
+        self.redirect.is_enabled = True
+        self.redirect.save()
+        self.client.get(self.url)
+
+        self.redirect.delete()
+        self.assertEqual(len(qrcode_cache), 0)
+
+
+class QRCodeCacheTestCase(SimpleTestCase):
+    def test_renders_per_slug(self) -> None:
+        cache = QRCodeCache(maxsize=10)
+
+        for i in range(QRCodeCache.MAX_RENDERS_PER_SLUG + 1):
+            cache.get("test", f"https://example{i}.com/test", "png")
+
+        self.assertEqual(len(cache), 1)
+        slug_qrcodes = cache.slugs.get("test")
+        assert slug_qrcodes is not None
+        self.assertEqual(len(slug_qrcodes.qrcodes), 1)
+        self.assertEqual(len(slug_qrcodes.renders), 1)
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "qrcodes": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "qrcodes",
+            },
+        }
+    )
+    def test_shared_cache(self) -> None:
+        data = "https://example.com/test"
+        cache = QRCodeCache(maxsize=10, shared_cache_alias="qrcodes")
+        content = cache.get("test", data, "svg")
+
+        self.assertEqual(
+            content, render_qrcode(make_qrcode(data, "M"), "svg", QRCodeOptions())
+        )
+
+        # Another process's cache uses the shared cache
+        other_cache = QRCodeCache(maxsize=10, shared_cache_alias="qrcodes")
+        with mock.patch("macau.redirects.qrcodes.render_qrcode") as render:
+            self.assertEqual(other_cache.get("test", data, "svg"), content)
+
+        render.assert_not_called()
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            render_qrcode(
+                make_qrcode("https://example.com", "M"), "gif", QRCodeOptions()
+            )
+
+
+class RedirectQRCodeOptionsTestCase(TestCase):
+    def setUp(self) -> None:
+        redirect_cache.clear()
+        slug_filter.clear()
+        qrcode_cache.clear()
+
+        self.redirect = Redirect.objects.create(
+            slug="test", destination="https://example.com"
+        )
+        self.url = reverse("redirects:qrcode-png", args=[self.redirect.slug])
+
+    def test_scale_and_border(self) -> None:
+        response = self.client.get(self.url)
+        default_size = Image.open(BytesIO(response.content)).size
+
+        response = self.client.get(self.url, {"scale": 10, "border": 4})
+        self.assertEqual(response.status_code, 200)
+
+        size = Image.open(BytesIO(response.content)).size
+        self.assertEqual(size, ((default_size[0] + 8) * 10,) * 2)
+
+    def test_colours(self) -> None:
+        response = self.client.get(self.url, {"fg": "FF0000", "bg": "00ff00"})
+        self.assertEqual(response.status_code, 200)
+
+        image = Image.open(BytesIO(response.content)).convert("RGB")
+        self.assertEqual(
+            {colour for _, colour in image.getcolors()},  # type: ignore[union-attr]
+            {(255, 0, 0), (0, 255, 0)},
+        )
+
+        response = self.client.get(
+            reverse("redirects:qrcode", args=[self.redirect.slug]),
+            {"fg": "ff0000", "bg": "00ff00"},
+        )
+        self.assertContains(response, "#ff0000")
+        self.assertContains(response, "#00ff00")
+
+    def test_error_correction(self) -> None:
+        sizes = [
+            Image.open(BytesIO(self.client.get(self.url, {"ec": ec}).content)).size[0]
+            for ec in ["l", "H"]
+        ]
+        self.assertLess(sizes[0], sizes[1])
+
+    def test_invalid_options(self) -> None:
+        invalid_params: list[dict[str, str | int]] = [
+            {"scale": 0},
+            {"scale": 41},
+            {"scale": "big"},
+            {"border": -1},
+            {"border": 11},
+            {"ec": "X"},
+            {"fg": "red"},
+            {"bg": "#ffffff"},
+        ]
+
+        for params in invalid_params:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_qrcode_shared_between_renders(self) -> None:
+        with mock.patch(
+            "macau.redirects.qrcodes.make_qrcode", wraps=make_qrcode
+        ) as mock_make_qrcode:
+            all_params: list[dict[str, str | int]] = [
+                {},
+                {"scale": 5},
+                {"border": 2},
+                {"fg": "ff0000"},
+            ]
+            for params in all_params:
+                self.client.get(self.url, params)
+            self.client.get(reverse("redirects:qrcode", args=[self.redirect.slug]))
+
+        mock_make_qrcode.assert_called_once()
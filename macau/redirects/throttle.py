@@ -0,0 +1,208 @@
+import sys
+import time
+from array import array
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+from .bloom import hash_positions
+
+
+class CountMinSketch:
+    """
+    Approximate counts of strings, in a fixed amount of memory.
+
+    Counts may be overestimated (if items share counters), but never
+    underestimated.
+    """
+
+    def __init__(self, width: int, depth: int) -> None:
+        self.width = max(width, 1)
+        self.depth = max(depth, 1)
+        self._counters = array("I", bytes(4 * self.width * self.depth))
+        self.total = 0
+
+    def _positions(self, item: str) -> list[int]:
+        return [
+            row * self.width + position
+            for row, position in enumerate(hash_positions(item, self.depth, self.width))
+        ]
+
+    def add(self, item: str) -> int:
+        """
+        Increment the count of `item`, returning the new count.
+        """
+        positions = self._positions(item)
+        counters = self._counters
+
+        # Only increment the smallest counters ("conservative update"), which
+        # reduces overestimates from other items
+        count = min(counters[position] for position in positions) + 1
+        for position in positions:
+            if counters[position] < count:
+                counters[position] = count
+
+        self.total += 1
+        return count
+
+    def raise_to(self, item: str, count: int) -> None:
+        """
+        Ensure the count of `item` is at least `count`.
+        """
+        counters = self._counters
+        for position in self._positions(item):
+            if counters[position] < count:
+                counters[position] = count
+        self.total = max(self.total, count)
+
+    def __getitem__(self, item: str) -> int:
+        if not self.total:
+            return 0
+        counters = self._counters
+        return min(counters[position] for position in self._positions(item))
+
+    def clear(self) -> None:
+        self._counters = array("I", bytes(4 * self.width * self.depth))
+        self.total = 0
+
+    @property
+    def memory_footprint(self) -> int:
+        """
+        The size of the counters, in bytes.
+        """
+        return sys.getsizeof(self._counters)
+
+
+class FailureThrottle:
+    """
+    Count failures per key, and throttle keys with too many recent failures.
+
+    Failures are counted in a sliding window of `window` seconds, approximated
+    from counts for the current and previous fixed windows. Counts are kept in
+    fixed-size sketches, so memory doesn't grow with the number of keys.
+
+    If `shared_cache_alias` is set, failures are also counted in that cache,
+    so they're limited across workers. Each worker only checks the shared count
+    when it sees a failure, so workers may allow 1 extra attempt each.
+    """
+
+    DEPTH = 4
+
+    def __init__(
+        self, limit: int, window: int, width: int, shared_cache_alias: str = ""
+    ) -> None:
+        self.limit = limit
+        self.window = max(window, 1)
+        self.shared_cache_alias = shared_cache_alias
+
+        self._current = CountMinSketch(width, self.DEPTH)
+        self._previous = CountMinSketch(width, self.DEPTH)
+        self._window_index = self._get_window_index(time.time())
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def _get_window_index(self, now: float) -> int:
+        return int(now // self.window)
+
+    def _rotate(self, now: float) -> None:
+        window_index = self._get_window_index(now)
+        if window_index == self._window_index:
+            return
+
+        if window_index == self._window_index + 1:
+            self._current, self._previous = self._previous, self._current
+        else:
+            self._previous.clear()
+        self._current.clear()
+        self._window_index = window_index
+
+    def _get_count(self, key: str, now: float) -> float:
+        # Assume failures in the previous window were spread evenly
+        overlap = 1 - (now % self.window) / self.window
+        return self._current[key] + self._previous[key] * overlap
+
+    def is_throttled(self, key: str) -> bool:
+        # Most of the time, nothing has failed recently
+        if not self.enabled or not (self._current.total or self._previous.total):
+            return False
+
+        now = time.time()
+        with self._lock:
+            self._rotate(now)
+            return self._get_count(key, now) >= self.limit
+
+    def add_failure(self, key: str) -> None:
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._rotate(now)
+            self._current.add(key)
+            window_index = self._window_index
+
+        if self.shared_cache_alias:
+            shared_cache = caches[self.shared_cache_alias]
+            shared_cache_key = f"macau:auth-failures:{window_index}:{key}"
+
+            shared_cache.add(shared_cache_key, 0, timeout=self.window * 2)
+            shared_count = shared_cache.incr(shared_cache_key)
+
+            with self._lock:
+                if self._window_index == window_index:
+                    self._current.raise_to(key, shared_count)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._current.clear()
+            self._previous.clear()
+
+
+def get_client_ip(request: HttpRequest) -> str:
+    """
+    Get the client's IP address, from `REDIRECT_AUTH_THROTTLE_CLIENT_IP_HEADER`.
+
+    If the header contains multiple addresses (eg `X-Forwarded-For`), the last
+    one was added by the closest proxy, so is used. The header is only
+    trustworthy if it's set by a proxy clients can't bypass - otherwise
+    clients can send a different address with each attempt.
+    """
+    value = request.META.get(settings.REDIRECT_AUTH_THROTTLE_CLIENT_IP_HEADER, "")
+    return str(value).rsplit(",", 1)[-1].strip()
+
+
+def get_throttle_key(request: HttpRequest, slug: str) -> str:
+    return f"{slug}:{get_client_ip(request)}"
+
+
+auth_throttle = FailureThrottle(
+    limit=settings.REDIRECT_AUTH_THROTTLE_LIMIT,
+    window=settings.REDIRECT_AUTH_THROTTLE_WINDOW,
+    width=settings.REDIRECT_AUTH_THROTTLE_SIZE,
+    shared_cache_alias=settings.REDIRECT_AUTH_THROTTLE_SHARED_CACHE,
+)
+
+# Failures for each redirect, from all clients. Limits guessing by clients
+# which can change their address.
+slug_auth_throttle = FailureThrottle(
+    limit=settings.REDIRECT_AUTH_THROTTLE_SLUG_LIMIT,
+    window=settings.REDIRECT_AUTH_THROTTLE_WINDOW,
+    width=settings.REDIRECT_AUTH_THROTTLE_SIZE,
+    shared_cache_alias=settings.REDIRECT_AUTH_THROTTLE_SHARED_CACHE,
+)
+
+
+def is_auth_throttled(request: HttpRequest, slug: str) -> bool:
+    return slug_auth_throttle.is_throttled(slug) or auth_throttle.is_throttled(
+        get_throttle_key(request, slug)
+    )
+
+
+def add_auth_failure(request: HttpRequest, slug: str) -> None:
+    auth_throttle.add_failure(get_throttle_key(request, slug))
+    slug_auth_throttle.add_failure(slug)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.validators import URLValidator
 from django.urls import path, re_path
 
@@ -5,10 +6,21 @@ from . import views
 
 app_name = "redirects"
 
+if settings.ASYNC_VIEWS:
+    redirect_view = views.AsyncHandleRedirectView.as_view()
+    prefix_redirect_view = views.AsyncPrefixRedirectView.as_view()
+    qrcode_view = views.AsyncRedirectQRCodeView.as_view()
+    root_redirect_view = views.AsyncRootRedirectView.as_view()
+else:
+    redirect_view = views.HandleRedirectView.as_view()
+    prefix_redirect_view = views.PrefixRedirectView.as_view()
+    qrcode_view = views.RedirectQRCodeView.as_view()
+    root_redirect_view = views.RootRedirectView.as_view()
+
 urlpatterns = [
-    path("<slug:slug>", views.HandleRedirectView.as_view(), name="redirect"),
+    path("<slug:slug>", redirect_view, name="redirect"),
     # Duplicate the URL definition to allow for optional trailing slash
-    path("<slug:slug>/", views.HandleRedirectView.as_view()),
+    path("<slug:slug>/", redirect_view),
     re_path(
         f"({URLValidator.regex.pattern})",  # type: ignore[union-attr]
         views.RedirectCreateView.as_view(),
@@ -16,15 +28,21 @@ urlpatterns = [
     ),
     path(
         "<slug:slug>.svg",
-        views.RedirectQRCodeView.as_view(),
+        qrcode_view,
         name="qrcode",
         kwargs={"image_format": "svg"},
     ),
     path(
         "<slug:slug>.png",
-        views.RedirectQRCodeView.as_view(),
+        qrcode_view,
         name="qrcode-png",
         kwargs={"image_format": "png"},
     ),
-    path("", views.RootRedirectView.as_view(), name="index"),
+    path("", root_redirect_view, name="index"),
+    # Paths under a prefix redirect. "-/" is reserved for Macau's own pages.
+    re_path(
+        r"^(?!-/)(?P<path>[-a-zA-Z0-9_]+/.*)$",
+        prefix_redirect_view,
+        name="prefix-redirect",
+    ),
 ]
@@ -1,8 +1,7 @@
+import time
+from inspect import isawaitable
 from typing import Any
 
-import qrcode
-import qrcode.image.svg
-from django import shortcuts
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import (
@@ -10,56 +9,169 @@ from django.http import (
     HttpRequest,
     HttpResponse,
     HttpResponseBase,
-    HttpResponsePermanentRedirect,
-    HttpResponseRedirect,
 )
 from django.urls import reverse
-from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.utils.cache import (
+    add_never_cache_headers,
+    get_conditional_response,
+    patch_cache_control,
+)
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.common import no_append_slash
 from django.views.generic import RedirectView
 
-from .models import Redirect
-from .utils import check_basic_auth
+from .cache import CachedRedirect, aget_redirect, get_redirect
+from .prefixes import get_destination, prefix_redirects
+from .qrcodes import CONTENT_TYPE, QRCodeOptions, get_etag, qrcode_cache
+from .responses import build_redirect_response
+from .throttle import add_auth_failure, auth_throttle, is_auth_throttled
+from .utils import check_basic_auth_token, get_request_host
 
 
 class HandleRedirectView(View):
     def _handle_redirect(
-        self, request: HttpRequest, redirect: Redirect
+        self, request: HttpRequest, slug: str, redirect: CachedRedirect
     ) -> HttpResponse:
-        if redirect.basic_auth_password:
-            if not check_basic_auth(
-                request, redirect.basic_auth_username, redirect.basic_auth_password
-            ):
-                return HttpResponse(
-                    status=401,
-                    content="Authentication required",
-                    headers={"WWW-Authenticate": "Basic"},
-                    content_type="text/plain",
+        if redirect.basic_auth_token:
+            if not check_basic_auth_token(request, redirect.basic_auth_token):
+                # Only count guesses, not requests prompting for credentials
+                if "Authorization" in request.headers:
+                    add_auth_failure(request, slug)
+
+                return self._patch_response(
+                    HttpResponse(
+                        status=401,
+                        content="Authentication required",
+                        headers={"WWW-Authenticate": "Basic"},
+                        content_type="text/plain",
+                    )
                 )
 
-        redirect_class = (
-            HttpResponsePermanentRedirect
-            if redirect.is_permanent
-            else HttpResponseRedirect
+        # The response's headers are already patched
+        if redirect.response_template is not None:
+            return redirect.response_template.render()
+        return build_redirect_response(redirect.destination, redirect.is_permanent)
+
+    def _patch_response(self, response: HttpResponse) -> HttpResponse:
+        # Prevent the redirect from being cached
+        add_never_cache_headers(response)
+
+        # Prevent search engines from indexing redirects
+        response.headers["X-Robots-Tag"] = "noindex"
+
+        return response
+
+    def _get_throttled_response(
+        self, request: HttpRequest, slug: str
+    ) -> HttpResponse | None:
+        """
+        Reject clients making too many failed attempts at basic auth, before
+        looking up the redirect.
+        """
+        if not is_auth_throttled(request, slug):
+            return None
+
+        return self._patch_response(
+            HttpResponse(
+                status=429,
+                content="Too many failed attempts",
+                headers={"Retry-After": str(auth_throttle.window)},
+                content_type="text/plain",
+            )
+        )
+
+    def _get_prefix_redirect(
+        self, match: tuple[str, CachedRedirect, str] | None
+    ) -> tuple[str, CachedRedirect]:
+        if match is None:
+            raise Http404
+
+        slug, redirect, rest = match
+        if not redirect.is_active(time.time()):
+            raise Http404
+
+        return slug, redirect._replace(
+            destination=get_destination(redirect.destination, rest),
+            response_template=None,
         )
 
-        return redirect_class(redirect.destination, preserve_request=True)
+    def _handle_prefix_redirect(
+        self, request: HttpRequest, slug: str, redirect: CachedRedirect
+    ) -> HttpResponse:
+        if (response := self._get_throttled_response(request, slug)) is not None:
+            return response
+
+        return self._handle_redirect(request, slug, redirect)
 
     @method_decorator(no_append_slash)
     def dispatch(self, request: HttpRequest, slug: str) -> HttpResponse:
-        redirect = shortcuts.get_object_or_404(Redirect, slug=slug, is_enabled=True)
+        if (response := self._get_throttled_response(request, slug)) is not None:
+            return response
 
-        response = self._handle_redirect(request, redirect)
+        host = get_request_host(request)
+        try:
+            redirect = get_redirect(slug, host)
+        except Http404:
+            # Exact slugs take priority, but `/<slug>/` may match a prefix
+            if not request.path_info.endswith("/"):
+                raise
+            return self._handle_prefix_redirect(
+                request,
+                *self._get_prefix_redirect(prefix_redirects.match(slug + "/", host)),
+            )
 
-        # Prevent the redirect from being cached
-        add_never_cache_headers(response)
+        return self._handle_redirect(request, slug, redirect)
 
-        # Prevent search engines from indexing redirects
-        response.headers["X-Robots-Tag"] = "noindex"
 
-        return response
+class AsyncHandleRedirectView(HandleRedirectView):
+    view_is_async = True
+
+    @method_decorator(no_append_slash)
+    async def dispatch(self, request: HttpRequest, slug: str) -> HttpResponse:  # type: ignore[override]
+        if (response := self._get_throttled_response(request, slug)) is not None:
+            return response
+
+        host = get_request_host(request)
+        try:
+            redirect = await aget_redirect(slug, host)
+        except Http404:
+            if not request.path_info.endswith("/"):
+                raise
+            return self._handle_prefix_redirect(
+                request,
+                *self._get_prefix_redirect(
+                    await prefix_redirects.amatch(slug + "/", host)
+                ),
+            )
+
+        return self._handle_redirect(request, slug, redirect)
+
+
+class PrefixRedirectView(HandleRedirectView):
+    """
+    Redirect paths under a prefix (eg `/docs/guide`), if one matches.
+    """
+
+    def dispatch(self, request: HttpRequest, path: str) -> HttpResponse:
+        return self._handle_prefix_redirect(
+            request,
+            *self._get_prefix_redirect(
+                prefix_redirects.match(path, get_request_host(request))
+            ),
+        )
+
+
+class AsyncPrefixRedirectView(PrefixRedirectView):
+    view_is_async = True
+
+    async def dispatch(self, request: HttpRequest, path: str) -> HttpResponse:  # type: ignore[override]
+        return self._handle_prefix_redirect(
+            request,
+            *self._get_prefix_redirect(
+                await prefix_redirects.amatch(path, get_request_host(request))
+            ),
+        )
 
 
 class RedirectCreateView(LoginRequiredMixin, RedirectView):
@@ -80,11 +192,7 @@ class RootRedirectView(RedirectView):
             return redirect_url  # type: ignore[no-any-return]
         raise Http404
 
-    def dispatch(
-        self, request: HttpRequest, *args: Any, **kwargs: Any
-    ) -> HttpResponseBase:
-        response = super().dispatch(request, *args, **kwargs)
-
+    def _patch_response(self, response: HttpResponseBase) -> HttpResponseBase:
         # Prevent the redirect from being cached
         add_never_cache_headers(response)
 
@@ -93,31 +201,71 @@ class RootRedirectView(RedirectView):
 
         return response
 
+    def dispatch(
+        self, request: HttpRequest, *args: Any, **kwargs: Any
+    ) -> HttpResponseBase:
+        return self._patch_response(super().dispatch(request, *args, **kwargs))
+
+
+class AsyncRootRedirectView(RootRedirectView):
+    view_is_async = True
+
+    async def dispatch(  # type: ignore[override]
+        self, request: HttpRequest, *args: Any, **kwargs: Any
+    ) -> HttpResponseBase:
+        # Determining the URL doesn't need any IO, so the sync handlers are fine.
+        # Skip the sync `dispatch`, since some handlers (eg `options`) return
+        # coroutines for async views.
+        response = super(RootRedirectView, self).dispatch(request, *args, **kwargs)
+        if isawaitable(response):
+            response = await response
+        return self._patch_response(response)
+
 
 class RedirectQRCodeView(View):
-    CONTENT_TYPE = {"svg": "image/svg+xml", "png": "image/png"}
+    CONTENT_TYPE = CONTENT_TYPE
 
-    @method_decorator(no_append_slash)
-    def get(self, request: HttpRequest, slug: str, image_format: str) -> HttpResponse:
-        redirect = shortcuts.get_object_or_404(Redirect, slug=slug, is_enabled=True)
-
-        data = request.build_absolute_uri(redirect.get_absolute_url())
-
-        match image_format:
-            case "png":
-                qr = qrcode.QRCode(border=0, box_size=1)
-                qr.add_data(data)
-                img = qr.make_image(back_color="transparent")
-            case "svg":
-                qr = qrcode.QRCode(
-                    border=0, image_factory=qrcode.image.svg.SvgPathImage
-                )
-                qr.add_data(data)
-                img = qr.make_image(back_color="transparent")
-            case _:
-                return HttpResponse("Unknown format", status=400)
+    def _render(
+        self, request: HttpRequest, slug: str, image_format: str
+    ) -> HttpResponseBase:
+        if image_format not in self.CONTENT_TYPE:
+            return HttpResponse("Unknown format", status=400)
+
+        try:
+            options = QRCodeOptions.from_query(request.GET)
+        except ValueError as e:
+            return HttpResponse(str(e), status=400, content_type="text/plain")
 
-        response = HttpResponse(content_type=self.CONTENT_TYPE[image_format])
-        img.save(response)
+        data = request.build_absolute_uri(reverse("redirects:redirect", args=[slug]))
+        etag = get_etag(data, image_format, options)
+
+        response = get_conditional_response(request, etag=etag)
+
+        if response is None:
+            response = HttpResponse(
+                qrcode_cache.get(slug, data, image_format, options),
+                content_type=self.CONTENT_TYPE[image_format],
+            )
+
+        response.headers["ETag"] = etag
         patch_cache_control(response, max_age=300)
         return response
+
+    @method_decorator(no_append_slash)
+    def get(
+        self, request: HttpRequest, slug: str, image_format: str
+    ) -> HttpResponseBase:
+        # Ensure the redirect exists and is enabled
+        get_redirect(slug, get_request_host(request))
+
+        return self._render(request, slug, image_format)
+
+
+class AsyncRedirectQRCodeView(RedirectQRCodeView):
+    @method_decorator(no_append_slash)
+    async def get(  # type: ignore[override]
+        self, request: HttpRequest, slug: str, image_format: str
+    ) -> HttpResponseBase:
+        await aget_redirect(slug, get_request_host(request))
+
+        return self._render(request, slug, image_format)
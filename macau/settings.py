@@ -16,6 +16,43 @@ env = environ.Env(
     TEST=(bool, False),
     ROOT_REDIRECT_URL=(str, ""),
     TZ=(str, "UTC"),
+    REDIRECT_CACHE_SIZE=(int, 10000),
+    REDIRECT_CACHE_TTL=(int, 300),
+    REDIRECT_CACHE_INVALIDATION=(bool, True),
+    REDIRECT_CACHE_POLL_INTERVAL=(float, 0.05),
+    REDIRECT_SLUG_FILTER=(bool, True),
+    REDIRECT_FAST_PATH=(bool, True),
+    GRANIAN_INTERFACE=(str, "wsgi"),
+    TRUSTED_PROXY_HOSTS=(list, ["*"]),
+    REDIRECT_QRCODE_CACHE_SIZE=(int, 1000),
+    REDIRECT_QRCODE_SHARED_CACHE=(str, ""),
+    DB_CONN_MAX_AGE=(int, 600),
+    DB_CONN_HEALTH_CHECKS=(bool, True),
+    DB_POOL=(bool, False),
+    DB_POOL_MIN_SIZE=(int, 2),
+    DB_POOL_MAX_SIZE=(int, 10),
+    DB_POOL_TIMEOUT=(float, 10),
+    REDIRECT_SLUG_FILTER_ERROR_RATE=(float, 0.001),
+    REDIRECT_SLUG_ALPHABET=(
+        str,
+        "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    ),
+    REDIRECT_SLUG_LENGTH=(int, 6),
+    REDIRECT_SLUG_BLOCK_SIZE=(int, 100),
+    REDIRECT_ADMIN_EXACT_COUNT_LIMIT=(int, 10000),
+    REDIRECT_ADMIN_COUNT_CACHE_TTL=(int, 60),
+    REDIRECT_AUTH_THROTTLE_LIMIT=(int, 10),
+    REDIRECT_AUTH_THROTTLE_SLUG_LIMIT=(int, 100),
+    REDIRECT_AUTH_THROTTLE_WINDOW=(int, 300),
+    REDIRECT_AUTH_THROTTLE_SIZE=(int, 16384),
+    REDIRECT_AUTH_THROTTLE_CLIENT_IP_HEADER=(str, "REMOTE_ADDR"),
+    REDIRECT_AUTH_THROTTLE_SHARED_CACHE=(str, ""),
+    REDIRECT_SNAPSHOT_PATH=(str, ""),
+    REDIRECT_SNAPSHOT_CHECK_INTERVAL=(float, 1.0),
+    REDIRECT_EDGE_MAP_PATH=(str, ""),
+    REDIRECT_EDGE_MAP_FORMAT=(str, "nginx"),
+    REDIRECT_EDGE_MAP_AUTO_REGENERATE=(bool, False),
+    REDIRECT_EDGE_MAP_RELOAD_COMMAND=(str, ""),
 )
 
 # Quick-start development settings - unsuitable for production
@@ -31,6 +68,8 @@ TEST = env("TEST")
 
 ALLOWED_HOSTS = env("ALLOWED_HOSTS")
 
+TRUSTED_PROXY_HOSTS = env("TRUSTED_PROXY_HOSTS")
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -49,6 +88,7 @@ INSTALLED_APPS = [
     "import_export",
     "macau.users",
     "macau.redirects",
+    "macau.api",
 ]
 
 
@@ -64,6 +104,16 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
 ]
 
+# Public redirects skip the rest of the stack, since they don't need sessions,
+# CSRF, authentication etc
+REDIRECT_FAST_PATH = env("REDIRECT_FAST_PATH")
+REDIRECT_FAST_PATH_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "django_permissions_policy.PermissionsPolicyMiddleware",
+]
+
 ROOT_URLCONF = "macau.urls"
 
 TEMPLATES = [
@@ -83,6 +133,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "macau.wsgi.application"
+ASGI_APPLICATION = "macau.asgi.application"
+
+# When served over ASGI, use async views so waiting on the database doesn't
+# block a thread.
+ASYNC_VIEWS = env("GRANIAN_INTERFACE") == "asgi"
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -103,6 +158,28 @@ if "sqlite" in DATABASES["default"]["ENGINE"]:
     """
     DATABASES["default"]["OPTIONS"] = {"init_command": db_init_command}
 
+# Reuse connections between requests, so the cost of connecting (and for SQLite,
+# running the above PRAGMAs) is only paid once per connection.
+DATABASES["default"]["CONN_MAX_AGE"] = env("DB_CONN_MAX_AGE")
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env("DB_CONN_HEALTH_CHECKS")
+
+if "postgresql" in DATABASES["default"]["ENGINE"] and env("DB_POOL"):
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": env("DB_POOL_MIN_SIZE"),
+        "max_size": env("DB_POOL_MAX_SIZE"),
+        "timeout": env("DB_POOL_TIMEOUT"),
+    }
+
+    # Connections are returned to the pool instead
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+elif ASYNC_VIEWS:
+    # Under ASGI, persistent connections aren't reused between requests, and
+    # are never closed (see Django ticket #33497), so without a pool, connect
+    # for each request instead
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+CACHES = {"default": env.cache_url(default="locmemcache://")}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -168,7 +245,7 @@ LOGGING = {
         },
         "macau": {
             "handlers": ["console"],
-            "level": "INFO",
+            "level": "WARNING" if TEST else "INFO",
             "propagate": False,
         },
     },
@@ -207,3 +284,50 @@ SECURE_REFERRER_POLICY = "same-origin"
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
 ROOT_REDIRECT_URL = env("ROOT_REDIRECT_URL")
+
+# Per-process cache of redirects, keyed by slug
+REDIRECT_CACHE_SIZE = env("REDIRECT_CACHE_SIZE")
+REDIRECT_CACHE_TTL = env("REDIRECT_CACHE_TTL")
+
+# Listen for changes made by other workers. Not needed when testing, since
+# there's only 1 process.
+REDIRECT_CACHE_INVALIDATION = env("REDIRECT_CACHE_INVALIDATION") and not TEST
+REDIRECT_CACHE_POLL_INTERVAL = env("REDIRECT_CACHE_POLL_INTERVAL")
+
+# Reject unknown slugs without querying the database
+REDIRECT_SLUG_FILTER = env("REDIRECT_SLUG_FILTER")
+REDIRECT_SLUG_FILTER_ERROR_RATE = env("REDIRECT_SLUG_FILTER_ERROR_RATE")
+
+# Generated slugs. Each worker reserves a block of slugs at a time.
+REDIRECT_SLUG_ALPHABET = env("REDIRECT_SLUG_ALPHABET")
+REDIRECT_SLUG_LENGTH = env("REDIRECT_SLUG_LENGTH")
+REDIRECT_SLUG_BLOCK_SIZE = env("REDIRECT_SLUG_BLOCK_SIZE")
+
+# Counts in the admin changelist are estimated above this limit
+REDIRECT_ADMIN_EXACT_COUNT_LIMIT = env("REDIRECT_ADMIN_EXACT_COUNT_LIMIT")
+REDIRECT_ADMIN_COUNT_CACHE_TTL = env("REDIRECT_ADMIN_COUNT_CACHE_TTL")
+
+# Rendered QR codes, cached per-process and optionally in a shared cache (from
+# `CACHES`)
+REDIRECT_QRCODE_CACHE_SIZE = env("REDIRECT_QRCODE_CACHE_SIZE")
+REDIRECT_QRCODE_SHARED_CACHE = env("REDIRECT_QRCODE_SHARED_CACHE")
+
+# Failed basic auth attempts allowed per redirect and client, in a sliding window
+REDIRECT_AUTH_THROTTLE_LIMIT = env("REDIRECT_AUTH_THROTTLE_LIMIT")
+REDIRECT_AUTH_THROTTLE_SLUG_LIMIT = env("REDIRECT_AUTH_THROTTLE_SLUG_LIMIT")
+REDIRECT_AUTH_THROTTLE_WINDOW = env("REDIRECT_AUTH_THROTTLE_WINDOW")
+REDIRECT_AUTH_THROTTLE_SIZE = env("REDIRECT_AUTH_THROTTLE_SIZE")
+REDIRECT_AUTH_THROTTLE_CLIENT_IP_HEADER = env("REDIRECT_AUTH_THROTTLE_CLIENT_IP_HEADER")
+REDIRECT_AUTH_THROTTLE_SHARED_CACHE = env("REDIRECT_AUTH_THROTTLE_SHARED_CACHE")
+
+# Compiled snapshot of enabled redirects (from `compile_redirects`), shared
+# between workers
+REDIRECT_SNAPSHOT_PATH = env("REDIRECT_SNAPSHOT_PATH")
+REDIRECT_SNAPSHOT_CHECK_INTERVAL = env("REDIRECT_SNAPSHOT_CHECK_INTERVAL")
+
+# Map of redirects for a reverse proxy (from `export_edge_map`), optionally
+# regenerated whenever redirects change
+REDIRECT_EDGE_MAP_PATH = env("REDIRECT_EDGE_MAP_PATH")
+REDIRECT_EDGE_MAP_FORMAT = env("REDIRECT_EDGE_MAP_FORMAT")
+REDIRECT_EDGE_MAP_AUTO_REGENERATE = env("REDIRECT_EDGE_MAP_AUTO_REGENERATE")
+REDIRECT_EDGE_MAP_RELOAD_COMMAND = env("REDIRECT_EDGE_MAP_RELOAD_COMMAND")
@@ -5,5 +5,6 @@ from .core import admin
 urlpatterns = [
     path("", include("macau.redirects.urls")),
     path("-/admin/", admin.admin_site.urls),
+    path("-/api/", include("macau.api.urls")),
     path("-/health/", include("health_check.urls")),
 ]
@@ -1,8 +1,22 @@
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 from granian.utils.proxies import wrap_wsgi_with_proxy_headers
 
+from macau.redirects.handlers import (
+    FastPathHandler,
+    RedirectDispatcher,
+    WSGIApplication,
+)
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "macau.settings")
 
-application = wrap_wsgi_with_proxy_headers(get_wsgi_application(), trusted_hosts="*")
+django_application: WSGIApplication = get_wsgi_application()
+
+if settings.REDIRECT_FAST_PATH:
+    django_application = RedirectDispatcher(django_application, FastPathHandler())
+
+application = wrap_wsgi_with_proxy_headers(
+    django_application, trusted_hosts=settings.TRUSTED_PROXY_HOSTS
+)